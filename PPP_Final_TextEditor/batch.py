@@ -0,0 +1,193 @@
+"""
+    여러 파일 찾기/바꾸기 (Qt 없이 실행, 편집기의 replace all과 같은 규칙)
+
+    python batch.py "old" "new" src/ notes.txt            # 디렉터리는 재귀
+    python batch.py -r "(\\w+)@old\\.com" "\\1@new.com" . --include "*.txt" --include "*.md"
+    python batch.py "TODO" "" . --dry-run                  # 바꾸지 않고 개수만
+
+    종료 코드: 0 바뀐(찾은) 곳 있음, 1 없음, 2 오류가 난 파일 있음
+"""
+from __future__ import annotations
+import argparse
+import fnmatch
+import os
+import re
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+from core import CHUNK_LINES, TextBuffer
+from fileio import write_atomic
+from patterns import SearchOptions, compile_pattern
+from textio import SAMPLE_BYTES, TextFormat, read_document
+
+
+# files in flight per worker process (bounds memory on huge trees)
+PENDING_PER_WORKER = 4
+
+
+@dataclass
+class FileResult:
+    path: str
+    count: int = 0
+    error: str = ""
+
+
+def iter_files(paths: Iterable[str], include: List[str], exclude: List[str]) -> Iterator[str]:
+    # files given directly are always taken; directories are walked, hidden ones skipped
+    def excluded(name: str) -> bool:
+        return any(fnmatch.fnmatch(name, p) for p in exclude)
+
+    def wanted(name: str) -> bool:
+        if include and not any(fnmatch.fnmatch(name, p) for p in include):
+            return False
+        return not excluded(name)
+
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith(".") and not excluded(d))
+            for name in sorted(files):
+                if wanted(name):
+                    yield os.path.join(root, name)
+
+
+def _is_binary(path: str) -> bool:
+    with open(path, "rb") as f:
+        head = f.read(SAMPLE_BYTES)
+    # UTF-16/32 text has NULs too, but starts with a BOM
+    return b"\0" in head and not head.startswith((b"\xff\xfe", b"\xfe\xff"))
+
+
+def _line_endings(path: str, fmt: TextFormat) -> Optional[List[str]]:
+    # each line's terminator as in the file ("" after the last line), None if all are fmt.newline
+    with open(path, "rb") as f:
+        text = f.read().decode(fmt.encoding)
+    ends = re.findall(r"\r\n|\r|\n", text)
+    if all(end == fmt.newline for end in ends):
+        return None
+    ends.append("")
+    return ends
+
+
+def _edit_endings(ends: List[str], edits, newline: str) -> List[str]:
+    # terminators after apply_line_edits(edits): untouched lines keep theirs, a replaced
+    # span reuses its own in order, and its last line keeps the span's last one
+    out = []
+    pos = 0
+    for row, count, new in edits:
+        out += ends[pos:row]
+        old = ends[row:row + count]
+        keep = old[:-1][:len(new) - 1]
+        out += keep + [newline] * (len(new) - 1 - len(keep)) + old[-1:]
+        pos = row + count
+    out += ends[pos:]
+    return out
+
+
+def _chunks_with_endings(lines, ends: List[str]) -> Iterator[str]:
+    batch = []
+    for line, end in zip(lines, ends):
+        batch.append(line)
+        batch.append(end)
+        if len(batch) >= 2 * CHUNK_LINES:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def replace_in_file(path: str, query: str, repl: str, opts: SearchOptions,
+                    dry_run: bool = False, backend: str = "list") -> FileResult:
+    # runs in a worker process; never raises
+    try:
+        if _is_binary(path):
+            return FileResult(path)
+        lines, fmt = read_document(path)
+        buf = TextBuffer(backend=backend)
+        buf.set_lines(lines, fmt)
+        edits, count = buf.plan_replace_all(query, repl, opts)
+        if count and not dry_run:
+            # mixed line endings are written back as they were, not as the dominant one
+            ends = _line_endings(path, fmt)
+            buf.apply_line_edits(edits)
+            if ends is None:
+                write_atomic(path, buf.iter_chunks(), encoding=fmt.encoding, newline=fmt.newline, bom=fmt.bom)
+            else:
+                ends = _edit_endings(ends, edits, fmt.newline)
+                write_atomic(path, _chunks_with_endings(buf.iter_lines(), ends),
+                             encoding=fmt.encoding, newline="", bom=fmt.bom)
+        return FileResult(path, count)
+    except (OSError, UnicodeError, ValueError, re.error) as e:
+        return FileResult(path, error=str(e) or type(e).__name__)
+
+
+def run(files: Iterable[str], query: str, repl: str, opts: SearchOptions,
+        dry_run: bool = False, jobs: Optional[int] = None) -> Iterator[FileResult]:
+    # results as files finish (not in input order)
+    jobs = jobs or os.cpu_count() or 1
+    files = iter(files)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = set()
+        while True:
+            while len(pending) < jobs * PENDING_PER_WORKER:
+                path = next(files, None)
+                if path is None:
+                    break
+                pending.add(pool.submit(replace_in_file, path, query, repl, opts, dry_run))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="find/replace over files and directory trees")
+    ap.add_argument("query")
+    ap.add_argument("replacement")
+    ap.add_argument("paths", nargs="+")
+    ap.add_argument("-r", "--regex", action="store_true", help="query is a regular expression (\\1 in the replacement)")
+    ap.add_argument("-i", "--ignore-case", action="store_true")
+    ap.add_argument("-w", "--word", action="store_true", help="whole words only")
+    ap.add_argument("--include", action="append", default=[], metavar="GLOB", help="only file names matching GLOB")
+    ap.add_argument("--exclude", action="append", default=[], metavar="GLOB")
+    ap.add_argument("-n", "--dry-run", action="store_true", help="count matches, change nothing")
+    ap.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    ap.add_argument("-q", "--quiet", action="store_true", help="summary only")
+    args = ap.parse_args(argv)
+
+    opts = SearchOptions(regex=args.regex, case_sensitive=not args.ignore_case, whole_word=args.word)
+    if args.regex:
+        try:
+            compile_pattern(args.query, opts)
+        except re.error as e:
+            print(f"invalid pattern: {e}", file=sys.stderr)
+            return 2
+
+    files = changed = total = errors = 0
+    for res in run(iter_files(args.paths, args.include, args.exclude),
+                   args.query, args.replacement, opts, args.dry_run, args.jobs):
+        files += 1
+        if res.error:
+            errors += 1
+            print(f"{res.path}: error: {res.error}", file=sys.stderr)
+        elif res.count:
+            changed += 1
+            total += res.count
+            if not args.quiet:
+                print(f"{res.path}: {res.count}", flush=True)
+
+    verb = "would replace" if args.dry_run else "replaced"
+    print(f"{files} files, {changed} {'matched' if args.dry_run else 'changed'}, "
+          f"{verb} {total}, {errors} errors", file=sys.stderr)
+    if errors:
+        return 2
+    return 0 if total else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""
+    core.TextBuffer / UndoStack 벤치마크 (Qt 없이 실행)
+
+    python bench.py                                # 기본 문서 크기 전부 실행
+    python bench.py --sizes 100000x80 --backends rope
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --compare bench_baseline.json  # 느려진 항목이 있으면 exit 1
+
+    bench_baseline.json: 기본 옵션으로 한 번 돌린 기준값 (다른 기계에서는 수치만 참고,
+    회귀 확인은 같은 기계에서 --save-baseline 으로 새로 저장한 파일과 비교)
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, List, Tuple
+
+from core import (TextBuffer, Cursor, UndoStack, InsertCommand, DeleteCommand,
+                  ReplaceLinesCommand, BatchCommand, BACKENDS)
+from line_index import LineIndex
+from perf import percentile
+
+
+# (lines, chars per line)
+DEFAULT_SIZES = [(1_000, 80), (100_000, 80), (2_000, 5_000)]
+WORDS = ("alpha", "beta", "gamma", "delta", "error", "info", "warn", "user", "id", "value", "=", "->")
+RARE = "needle"
+
+
+@dataclass
+class Result:
+    workload: str
+    backend: str
+    lines: int
+    line_len: int
+    ops: int
+    ops_per_sec: float
+    p50_us: float
+    p99_us: float
+    peak_kb: float = 0.0
+
+    @property
+    def key(self) -> str:
+        return f"{self.workload}/{self.backend}/{self.lines}x{self.line_len}"
+
+
+# synthetic documents
+def make_line(rng: random.Random, line_len: int) -> str:
+    parts = []
+    n = 0
+    while n < line_len:
+        w = rng.choice(WORDS)
+        parts.append(w)
+        n += len(w) + 1
+    return " ".join(parts)[:line_len]
+
+
+def make_document(lines: int, line_len: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    out = [make_line(rng, line_len) for _ in range(lines)]
+    # a few rare hits for find/replace
+    for r in range(0, lines, max(1, lines // 50)):
+        out[r] = out[r][:line_len // 2] + RARE + out[r][line_len // 2:]
+    return "\n".join(out)
+
+
+def _random_pos(buf: TextBuffer, rng: random.Random) -> Cursor:
+    row = rng.randrange(len(buf.lines))
+    return Cursor(row, rng.randint(0, len(buf.lines[row])))
+
+
+# workloads: setup(buf, undo, rng) -> step(), called once per measured op
+def wl_typing(buf, undo, rng):
+    # type words at one spot, a new undo step per word
+    state = {"c": _random_pos(buf, rng)}
+    def step():
+        ch = rng.choice("abcdefgh ")
+        state["c"] = undo.push_and_do(InsertCommand(state["c"], ch), buf, state["c"])
+        if ch == " ":
+            undo.seal()
+    return step
+
+
+def wl_backspace(buf, undo, rng):
+    state = {"c": _random_pos(buf, rng)}
+    def step():
+        c = state["c"]
+        new_c, deleted = buf.backspace_at(c, None, 0)
+        if deleted:
+            end = Cursor(new_c.row + 1, 0) if deleted == "\n" else c
+            buf.insert_text_at(new_c, deleted)
+            new_c = undo.push_and_do(DeleteCommand(new_c, end, deleted), buf, c)
+        else:
+            new_c = _random_pos(buf, rng)
+        state["c"] = new_c
+    return step
+
+
+def wl_delete_range(buf, undo, rng):
+    def step():
+        start = _random_pos(buf, rng)
+        end = buf.clamp_cursor(Cursor(start.row + rng.randint(0, 3), rng.randint(0, 40)))
+        if (end.row, end.col) < (start.row, start.col):
+            start, end = end, start
+        undo.push_and_do(DeleteCommand(start, end, buf.get_range(start, end)), buf, start)
+        undo.seal()
+    return step
+
+
+def wl_paste(buf, undo, rng):
+    block = "\n".join(make_line(rng, 60) for _ in range(50))
+    def step():
+        pos = _random_pos(buf, rng)
+        undo.push_and_do(InsertCommand(pos, block), buf, pos)
+    return step
+
+
+def wl_find_next(buf, undo, rng):
+    def step():
+        buf.find_next(RARE, _random_pos(buf, rng))
+    return step
+
+
+def wl_replace_at(buf, undo, rng):
+    def step():
+        found = buf.find_match(RARE, _random_pos(buf, rng))
+        if found is not None:
+            buf.replace_at(found[0], RARE, RARE.upper())
+            buf.replace_at(found[0], RARE.upper(), RARE)
+    return step
+
+
+def wl_replace_all(buf, undo, rng):
+    toggle = [RARE, RARE.upper()]
+    def step():
+        edits, _ = buf.plan_replace_all(toggle[0], toggle[1])
+        undo.push_and_do(ReplaceLinesCommand(edits), buf, Cursor(0, 0))
+        toggle.reverse()
+    return step
+
+
+def wl_undo_redo(buf, undo, rng):
+    c = _random_pos(buf, rng)
+    for i in range(200):
+        c = undo.push_and_do(InsertCommand(c, "x\n" if i % 10 == 0 else "x"), buf, c)
+        undo.seal()
+    state = {"n": 0}
+    def step():
+        # 200 undos, then 200 redos, repeat
+        if (state["n"] // 200) % 2 == 0:
+            undo.undo(buf, c)
+        else:
+            undo.redo(buf, c)
+        state["n"] += 1
+    return step
+
+
+def wl_snapshot_typing(buf, undo, rng):
+    # a background reader holds a snapshot across every keystroke (copy-on-write cost)
+    state = {"c": _random_pos(buf, rng), "snap": None}
+    def step():
+        state["snap"] = buf.snapshot()
+        state["c"] = undo.push_and_do(InsertCommand(state["c"], "x"), buf, state["c"])
+    return step
+
+
+def wl_multi_caret(buf, undo, rng):
+    # one keystroke at 32 carets on consecutive rows, one batched undo step each
+    first = rng.randrange(max(1, len(buf.lines) - 32))
+    state = {"carets": [Cursor(min(r, len(buf.lines) - 1), 0) for r in range(first, first + 32)]}
+    def step():
+        cmd = BatchCommand([(c, c, "x") for c in state["carets"]])
+        undo.push_and_do(cmd, buf, state["carets"][0])
+        state["carets"] = cmd.carets
+    return step
+
+
+def wl_large_paste(buf, undo, rng):
+    # 20k-line clipboard over a short selection, undone on the next step
+    block = "\n".join(make_line(rng, 60) for _ in range(20_000))
+    state = {"n": 0}
+    def step():
+        if state["n"] % 2 == 0:
+            start = _random_pos(buf, rng)
+            end = Cursor(start.row, len(buf.lines[start.row]))
+            undo.push_and_do(BatchCommand([(start, end, block)]), buf, start)
+        else:
+            undo.undo(buf, Cursor(0, 0))
+        state["n"] += 1
+    return step
+
+
+def wl_copy_range(buf, undo, rng):
+    # text of a selection covering half the document, chunk by chunk
+    def step():
+        start = _random_pos(buf, rng)
+        end = Cursor(min(len(buf.lines) - 1, start.row + len(buf.lines) // 2), 1)
+        sum(map(len, buf.iter_range_chunks(start, end)))
+    return step
+
+
+def wl_indexed_typing(buf, undo, rng):
+    # typing with a LineIndex listening, plus the status bar's offset lookup per key
+    index = LineIndex(buf)
+    index.build()
+    state = {"c": _random_pos(buf, rng)}
+    def step():
+        state["c"] = undo.push_and_do(InsertCommand(state["c"], "x" if rng.random() < 0.95 else "\n"), buf, state["c"])
+        index.cursor_at(index.offset(state["c"]))
+    return step
+
+
+# name -> (setup, ops per run)
+WORKLOADS: Dict[str, Tuple[Callable, int]] = {
+    "typing": (wl_typing, 5000),
+    "backspace": (wl_backspace, 2000),
+    "delete_range": (wl_delete_range, 1000),
+    "paste": (wl_paste, 200),
+    "find_next": (wl_find_next, 500),
+    "replace_at": (wl_replace_at, 500),
+    "replace_all": (wl_replace_all, 10),
+    "undo_redo": (wl_undo_redo, 2000),
+    "snapshot_typing": (wl_snapshot_typing, 1000),
+    "multi_caret": (wl_multi_caret, 500),
+    "large_paste": (wl_large_paste, 20),
+    "copy_range": (wl_copy_range, 20),
+    "indexed_typing": (wl_indexed_typing, 2000),
+}
+
+
+def run_one(name: str, backend: str, lines: int, line_len: int, text: str,
+            scale: float = 1.0, memory: bool = True, seed: int = 1) -> Result:
+    setup, ops = WORKLOADS[name]
+    ops = max(1, int(ops * scale))
+
+    buf = TextBuffer(text, backend=backend)
+    undo = UndoStack()
+    step = setup(buf, undo, random.Random(seed))
+    times = []
+    clock = time.perf_counter_ns
+    t0 = clock()
+    for _ in range(ops):
+        t = clock()
+        step()
+        times.append(clock() - t)
+    total = (clock() - t0) / 1e9
+    times.sort()
+    res = Result(name, backend, lines, line_len, ops, ops / total if total else float("inf"),
+                 percentile(times, 0.50) / 1000, percentile(times, 0.99) / 1000)
+
+    if memory:
+        # separate pass: tracemalloc slows everything down
+        tracemalloc.start()
+        buf = TextBuffer(text, backend=backend)
+        undo = UndoStack()
+        step = setup(buf, undo, random.Random(seed))
+        for _ in range(ops):
+            step()
+        res.peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return res
+
+
+def run_all(sizes, backends, workloads, scale=1.0, memory=True, out=sys.stdout) -> List[Result]:
+    results = []
+    print(f"{'workload':<16}{'backend':<8}{'doc':>14}{'ops/s':>12}{'p50 us':>10}{'p99 us':>10}{'peak KB':>10}", file=out)
+    for lines, line_len in sizes:
+        text = make_document(lines, line_len)
+        for backend in backends:
+            for name in workloads:
+                r = run_one(name, backend, lines, line_len, text, scale, memory)
+                results.append(r)
+                print(f"{r.workload:<16}{r.backend:<8}{f'{lines}x{line_len}':>14}"
+                      f"{r.ops_per_sec:>12.0f}{r.p50_us:>10.1f}{r.p99_us:>10.1f}{r.peak_kb:>10.0f}", file=out)
+    return results
+
+
+def save_baseline(path: str, results: List[Result]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({r.key: asdict(r) for r in results}, f, indent=1)
+
+
+def compare(path: str, results: List[Result], tolerance: float, out=sys.stdout) -> List[str]:
+    # keys whose throughput dropped more than `tolerance` below the baseline
+    with open(path, encoding="utf-8") as f:
+        base = json.load(f)
+    regressions = []
+    print(f"\ncompared with {path} (tolerance {tolerance:.0%})", file=out)
+    for r in results:
+        b = base.get(r.key)
+        if b is None:
+            continue
+        change = r.ops_per_sec / b["ops_per_sec"] - 1 if b["ops_per_sec"] else 0.0
+        flag = ""
+        if change < -tolerance:
+            flag = "  <-- REGRESSION"
+            regressions.append(r.key)
+        print(f"{r.key:<40}{change:>+8.1%}{flag}", file=out)
+    return regressions
+
+
+def _parse_sizes(s: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for part in s.split(","):
+        lines, line_len = part.lower().split("x")
+        sizes.append((int(lines), int(line_len)))
+    return sizes
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark TextBuffer and UndoStack operations")
+    ap.add_argument("--sizes", type=_parse_sizes, default=DEFAULT_SIZES,
+                    help="comma separated LINESxLINE_LEN, e.g. 1000x80,100000x80")
+    ap.add_argument("--backends", default=",".join(BACKENDS))
+    ap.add_argument("--workloads", default=",".join(WORKLOADS))
+    ap.add_argument("--scale", type=float, default=1.0, help="multiply the op count of every workload")
+    ap.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    ap.add_argument("--save-baseline", metavar="FILE")
+    ap.add_argument("--compare", metavar="FILE")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    args = ap.parse_args(argv)
+
+    workloads = [w for w in args.workloads.split(",") if w]
+    unknown = [w for w in workloads if w not in WORKLOADS]
+    if unknown:
+        ap.error(f"unknown workloads: {', '.join(unknown)}")
+
+    results = run_all(args.sizes, args.backends.split(","), workloads, args.scale, not args.no_memory)
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+    if args.compare:
+        if compare(args.compare, results, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+    편집기 시작 시간 벤치마크 (프로세스 시작 -> 첫 paint)
+
+    python bench_startup.py                            # 10회, 중앙값/최소
+    python bench_startup.py --runs 20 --save-baseline startup_baseline.json
+    python bench_startup.py --compare startup_baseline.json   # 느려졌으면 exit 1
+
+    main.py를 PPP_STARTUP_PROBE=1로 실행 (첫 paint 뒤 시간 출력 후 종료)
+    화면이 없으면 QT_QPA_PLATFORM=offscreen
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Qt-free modules: importing them must not pull in PyQt6
+HEADLESS_MODULES = ("core", "batch", "perf", "textio", "buffer_pool", "highlight", "recovery", "line_index")
+
+
+def run_once() -> Dict[str, float]:
+    # ms: wall = spawn -> probe line, plus the probe's in-process marks
+    env = dict(os.environ, PPP_STARTUP_PROBE="1")
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, "main.py")], cwd=HERE, env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    line = ""
+    for line in proc.stdout:
+        if line.startswith("startup "):
+            break
+    wall = (time.perf_counter() - t0) * 1000
+    _, err = proc.communicate(timeout=30)
+    if not line.startswith("startup "):
+        raise RuntimeError(f"no startup probe output (exit {proc.returncode}): {err.strip()[-500:]}")
+    marks = dict(part.split("=") for part in line.split()[1:])
+    result = {k: float(v) for k, v in marks.items()}
+    result["wall"] = wall
+    return result
+
+
+def check_headless() -> List[str]:
+    # modules that load PyQt6 on import
+    bad = []
+    for module in HEADLESS_MODULES:
+        code = f"import sys, {module}; print('PyQt6' in sys.modules)"
+        out = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True)
+        if out.stdout.strip() != "False":
+            bad.append(module)
+    return bad
+
+
+def summarize(runs: List[Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    keys = runs[0].keys()
+    return {k: {"median": statistics.median(r[k] for r in runs), "min": min(r[k] for r in runs)} for k in keys}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="cold-start time to first paint")
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--save-baseline", metavar="FILE")
+    ap.add_argument("--compare", metavar="FILE")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed median slowdown (0.2 = 20%%)")
+    args = ap.parse_args(argv)
+
+    bad = check_headless()
+    if bad:
+        print(f"PyQt6 imported by: {', '.join(bad)}")
+
+    runs = [run_once() for _ in range(args.runs)]
+    stats = summarize(runs)
+    print(f"{'mark':<12}{'median ms':>12}{'min ms':>10}")
+    for k, s in stats.items():
+        print(f"{k:<12}{s['median']:>12.1f}{s['min']:>10.1f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=1)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        slower = [k for k, s in stats.items()
+                  if k in base and s["median"] > base[k]["median"] * (1 + args.tolerance)]
+        for k in slower:
+            print(f"REGRESSION {k}: {base[k]['median']:.1f} -> {stats[k]['median']:.1f} ms")
+        if slower:
+            return 1
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
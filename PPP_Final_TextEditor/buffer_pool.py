@@ -0,0 +1,227 @@
+from __future__ import annotations
+import itertools
+import os
+import tempfile
+from itertools import islice
+from typing import Iterable, List, Optional, Tuple
+
+from core import TextBuffer, Cursor, UndoStack
+from fileio import write_atomic
+from prefix_sum import PrefixSumTree
+from textio import DEFAULT_FORMAT, read_document, read_document_sized
+
+
+# rough per-line cost on top of the characters (str header + list/leaf slot)
+LINE_OVERHEAD = 64
+
+# default memory budget for all open documents
+DEFAULT_BUDGET = 512 * 1024 * 1024
+
+# inactive rope documents are compacted once they hold this many times the leaves they need
+COMPACT_FRAGMENTATION = 1.5
+
+
+def _line_sizes(lines: Iterable[str]) -> List[int]:
+    return [len(line) + LINE_OVERHEAD for line in lines]
+
+
+def estimate_bytes(buf: TextBuffer) -> int:
+    # full scan; TextSize keeps the same value up to date
+    return sum(_line_sizes(buf.iter_lines()))
+
+
+class TextSize:
+    """
+        문서 텍스트 메모리 추정치 (estimate_bytes와 같은 값)를 편집마다 갱신
+        - 줄마다 len + LINE_OVERHEAD를 PrefixSumTree에 두고, 변경 알림으로 바뀐 줄만 다시 셈
+        - 처음 total을 읽을 때 한 번 전체 스캔
+        - mapped 문서의 변경은 세지 않음 (줄을 읽으면 디코딩됨), 다음 total에서 다시 만듦
+    """
+    def __init__(self, doc: "Document"):
+        self.doc = doc
+        self.buf = doc.buf
+        self._sizes: Optional[PrefixSumTree] = None     # None: not counted yet
+        self.buf.add_listener(self._on_changed)
+
+    def detach(self) -> None:
+        self.buf.remove_listener(self._on_changed)
+
+    @property
+    def total(self) -> int:
+        if self._sizes is None:
+            self._sizes = PrefixSumTree(_line_sizes(self.buf.iter_lines()))
+        return self._sizes.total
+
+    def _on_changed(self, row: int, removed: int, added: int) -> None:
+        if self._sizes is None:
+            return
+        if self.doc.mapped is not None:
+            self._sizes = None
+            return
+        self._sizes.splice(row, removed, _line_sizes(islice(self.buf.iter_lines(row), added)))
+
+
+class Document:
+    """
+        탭 하나의 문서 상태
+        - 활성 탭은 EditorWidget이 필드를 들고 있고, 비활성일 때만 여기 값이 최신
+        - buf가 None이면 메모리에서 내려간 상태 (path 또는 spill 파일에서 다시 읽음)
+    """
+    def __init__(self, path: Optional[str] = None, buf: Optional[TextBuffer] = None,
+                 undo: Optional[UndoStack] = None):
+        self.path = path
+        self.mapped = None              # MappedFile of a large file
+        self.text_size: Optional[TextSize] = None   # follows buf
+        self.buf = buf if buf is not None else TextBuffer("", backend="rope")
+        self.undo = undo if undo is not None else UndoStack()
+        self.cursor = Cursor(0, 0)
+        self.scroll_row = 0
+        self.saved_version = self.buf.version
+        self.last_used = 0
+        self.size = 0                   # text_size + undo memory, refreshed by the pool
+        self.spill_path: Optional[str] = None
+        self.spill_format = DEFAULT_FORMAT  # on-disk format of the document while spilled
+        self.file_stamp: Optional[Tuple[int, int]] = None    # (mtime_ns, size) when dropped clean
+        self.disk_size: Optional[int] = None    # bytes of path the text was read from / saved as
+
+    @property
+    def buf(self) -> Optional[TextBuffer]:
+        return self._buf
+
+    @buf.setter
+    def buf(self, buf: Optional[TextBuffer]) -> None:
+        if self.text_size is not None:
+            self.text_size.detach()
+        self._buf = buf
+        self.text_size = TextSize(self) if buf is not None else None
+
+    @property
+    def resident(self) -> bool:
+        return self.buf is not None
+
+    @property
+    def title(self) -> str:
+        return os.path.basename(self.path) if self.path else "Untitled"
+
+    def is_modified(self) -> bool:
+        if self.buf is None:
+            return self.spill_path is not None
+        return self.buf.version != self.saved_version
+
+    def mark_saved(self, version: Optional[int] = None) -> None:
+        self.saved_version = self.buf.version if version is None else version
+
+
+class BufferPool:
+    """
+        열린 문서 목록 + 전체 메모리 예산
+        - 비활성 문서는 조각난 경우만 compact, 예산을 넘으면 오래 안 쓴 문서부터 메모리에서 내림
+          수정 안 된 문서는 버리고(파일에서 다시 읽음), 수정된 문서는 임시 파일로 spill
+        - 대용량(mapped) 문서는 이미 디스크 기반이라 내리지 않음
+        - undo 기록은 메모리에 그대로 둠 (다시 읽은 텍스트가 같으므로 유효)
+    """
+    def __init__(self, budget: int = DEFAULT_BUDGET, backend: str = "rope"):
+        self.budget = budget
+        self.backend = backend
+        self.docs: List[Document] = []
+        self._clock = itertools.count(1)
+
+    def add(self, doc: Document) -> Document:
+        doc.last_used = next(self._clock)
+        self.docs.append(doc)
+        return doc
+
+    def close(self, doc: Document) -> None:
+        self.docs.remove(doc)
+        doc.undo.clear()
+        if doc.mapped is not None:
+            doc.mapped.close()
+            doc.mapped = None
+        self._drop_spill(doc)
+        doc.buf = None
+
+    def memory_usage(self) -> int:
+        return sum(d.size for d in self.docs if d.resident)
+
+    # switching
+    def activate(self, doc: Document) -> None:
+        # make doc resident and most recently used
+        if not doc.resident:
+            self._reload(doc)
+        doc.last_used = next(self._clock)
+
+    def deactivate(self, doc: Document) -> None:
+        # doc left the editor: compact it if fragmented, then fit the budget
+        if doc.resident and doc.mapped is None:
+            doc.buf.compact(COMPACT_FRAGMENTATION)
+        self.measure(doc)
+        self.enforce()
+
+    def measure(self, doc: Document) -> None:
+        if not doc.resident:
+            doc.size = 0
+        elif doc.mapped is not None:
+            # lines come from the mapping; only the undo history is ours
+            doc.size = doc.undo.memory_usage()
+        else:
+            doc.size = doc.text_size.total + doc.undo.memory_usage()
+
+    def enforce(self) -> None:
+        # evict least recently used documents until under budget; the active one stays
+        active = max(self.docs, key=lambda d: d.last_used, default=None)
+        if active is not None and active.resident:
+            self.measure(active)
+        candidates = sorted((d for d in self.docs if d.resident and d is not active and d.mapped is None),
+                            key=lambda d: d.last_used)
+        for doc in candidates:
+            if self.memory_usage() <= self.budget:
+                break
+            self._evict(doc)
+
+    # eviction
+    def _evict(self, doc: Document) -> None:
+        if doc.is_modified() or doc.path is None:
+            fd, spill = tempfile.mkstemp(prefix="ppp-editor-", suffix=".spill")
+            os.close(fd)
+            write_atomic(spill, doc.buf.snapshot().iter_chunks())
+            doc.spill_path = spill
+            doc.spill_format = doc.buf.format
+        else:
+            doc.file_stamp = self._stamp(doc.path)
+        doc.buf = None
+        doc.size = 0
+
+    def _reload(self, doc: Document) -> None:
+        if doc.spill_path is not None:
+            doc.buf = TextBuffer(backend=self.backend)
+            doc.buf.set_lines(read_document(doc.spill_path)[0], doc.spill_format)
+            doc.saved_version = -1    # still modified
+            doc.disk_size = None
+            self._drop_spill(doc)
+        else:
+            doc.buf = TextBuffer(backend=self.backend)
+            lines, fmt, doc.disk_size = read_document_sized(doc.path)
+            doc.buf.set_lines(lines, fmt)
+            doc.mark_saved()
+            if self._stamp(doc.path) != doc.file_stamp:
+                # changed outside the editor: old history no longer applies
+                doc.undo.clear()
+            doc.file_stamp = None
+        doc.cursor = doc.buf.clamp_cursor(doc.cursor)
+        self.measure(doc)
+
+    def _drop_spill(self, doc: Document) -> None:
+        if doc.spill_path is not None:
+            try:
+                os.unlink(doc.spill_path)
+            except OSError:
+                pass
+            doc.spill_path = None
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
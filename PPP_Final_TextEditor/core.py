@@ -1,6 +1,44 @@
 from __future__ import annotations
+import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Optional, List, Tuple
+from itertools import islice
+from typing import Optional, List, Tuple, Iterator, Callable, Deque
+
+from patterns import LITERAL, MULTILINE_WINDOW, SearchOptions, compile_pattern, is_multiline
+from rope import LineRope
+from textio import DEFAULT_FORMAT, TextFormat, normalize_newlines, split_lines
+
+
+# line storage backends selectable at construction
+BACKENDS = ("list", "rope")
+
+# lines per chunk when streaming text out
+CHUNK_LINES = 4096
+
+# long scans call tick(row) this often (progress / cancellation)
+TICK_ROWS = 4096
+
+
+def iter_text_chunks(lines, chunk_lines:int=CHUNK_LINES) -> Iterator[str]:
+    # same text as "\n".join(lines), without building it all at once
+    it = iter(lines)
+    first = True
+    while True:
+        batch = list(islice(it, chunk_lines))
+        if not batch:
+            return
+        chunk = "\n".join(batch)
+        yield chunk if first else "\n" + chunk
+        first = False
+
+
+def iter_lines_from(lines, start:int=0) -> Iterator[str]:
+    # lines[start:] lazily; O(1) to the first line for both backends
+    if isinstance(lines, LineRope):
+        return lines.iter_from(start)
+    # by index: islice would step through every line before start
+    return map(lines.__getitem__, range(max(0, start), len(lines)))
 
 
 @dataclass
@@ -12,26 +50,183 @@ class Cursor:
         return Cursor(self.row, self.col)
 
 
+def is_insertable(text:str) -> bool:
+    # typed key text that goes into the buffer as is: printable characters and tab
+    return bool(text) and all(ch == "\t" or ch.isprintable() for ch in text)
+
+
+def _search_nonempty(pattern, text:str, pos:int):
+    # first match at/after pos that is not zero-length
+    while pos <= len(text):
+        m = pattern.search(text, pos)
+        if m is None or m.end() > m.start():
+            return m
+        pos = m.start() + 1
+    return None
+
+
+def _offset_cursor(text:str, first_row:int, offset:int) -> Cursor:
+    # offset in "\n".join(lines[first_row:...]) -> Cursor
+    row = first_row + text.count("\n", 0, offset)
+    return Cursor(row, offset - (text.rfind("\n", 0, offset) + 1))
+
+
+class Snapshot:
+    """
+        TextBuffer의 읽기 전용 스냅샷 (백그라운드 작업용)
+        - 원본과 lines를 공유하고, 원본이 다음에 수정될 때 한 번만 복사 (copy-on-write)
+          rope는 그 복사도 O(1) (트리 공유), list는 O(n) 포인터 복사
+        - version이 buffer.version과 다르면 그 사이 문서가 바뀐 것
+    """
+    __slots__ = ("lines", "version", "backend")
+
+    def __init__(self, lines, version:int, backend:str):
+        self.lines = lines
+        self.version = version
+        self.backend = backend
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def iter_lines(self, start:int=0) -> Iterator[str]:
+        return iter_lines_from(self.lines, start)
+
+    def iter_chunks(self, chunk_lines:int=CHUNK_LINES) -> Iterator[str]:
+        return iter_text_chunks(self.lines, chunk_lines)
+
+    def get_text(self) -> str:
+        return "\n".join(self.lines)
+
+    def as_buffer(self) -> "TextBuffer":
+        # detached TextBuffer over these lines, for the search/replace planners (no listeners)
+        # any write to it copies first, so the snapshot itself never changes
+        buf = TextBuffer.__new__(TextBuffer)
+        buf.backend = self.backend
+        buf._listeners = []
+        buf.version = self.version
+        buf.lines = self.lines
+        buf._shared = True
+        buf.format = DEFAULT_FORMAT
+        return buf
+
+
 class TextBuffer:
     """
-        리스트 기반 버퍼
-        추후 최적화 고려할 것
+        라인 단위 버퍼
+        - backend="list": 파이썬 리스트 (기본)
+        - backend="rope": LineRope, 큰 문서에서 편집 O(log n)
     """
     # init
-    def __init__(self, text: str=""):
+    def __init__(self, text: str="", backend: str="list"):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown backend: {backend}")
+        self.backend = backend
+        self._listeners: List[Callable[[int, int, int], None]] = []
+        self.version = 0    # bumped on every change, lets background results detect staleness
+        self._shared = False    # self.lines is also held by a snapshot
+        self.format = DEFAULT_FORMAT    # encoding / line ending to write back on save
         self.set_text(text)
 
 
     # getter/setter
-    def set_text(self, text:str) -> None:
-        text = text.replace("\r\n", "\n").replace("\r", "\n")
-        self.lines: List[str] = text.split("\n")
-        if len(self.lines) == 0:
-            self.lines = [""]
+    def set_text(self, text:str, fmt:Optional[TextFormat]=None) -> None:
+        self.set_lines(split_lines(text), fmt)
+
+    def set_lines(self, lines:List[str], fmt:Optional[TextFormat]=None) -> None:
+        # lines already split (no "\r", "\n"); the list is taken over, not copied
+        if len(lines) == 0:
+            lines = [""]
+        old_len = len(getattr(self, "lines", ()))
+        self.lines = self._make_lines(lines)
+        self._shared = False
+        if fmt is not None:
+            self.format = fmt
+        self._changed(0, old_len, len(lines))
+
+    def set_source(self, source, count:int, fmt:Optional[TextFormat]=None) -> None:
+        # lazily decoded lines (e.g. MappedFile), rope backend only
+        if self.backend != "rope":
+            raise ValueError("line sources need the rope backend")
+        old_len = len(self.lines)
+        self.lines = LineRope.from_source(source, count) if count > 0 else LineRope([""])
+        self._shared = False
+        if fmt is not None:
+            self.format = fmt
+        self._changed(0, old_len, len(self.lines))
+
+    def _make_lines(self, lines: List[str]):
+        if self.backend == "rope":
+            return LineRope(lines)
+        return lines
 
     def get_text(self) -> str:
         return "\n".join(self.lines)
 
+    def get_range(self, start:Cursor, end:Cursor) -> str:
+        start = self.clamp_cursor(start.copy())
+        end = self.clamp_cursor(end.copy())
+        if start.row == end.row:
+            return self.lines[start.row][start.col:end.col]
+        lines = self.lines[start.row:end.row+1]
+        lines[0] = lines[0][start.col:]
+        lines[-1] = lines[-1][:end.col]
+        return "\n".join(lines)
+
+    def iter_range_chunks(self, start:Cursor, end:Cursor, chunk_lines:int=CHUNK_LINES) -> Iterator[str]:
+        # same text as get_range(), chunk_lines lines at a time (huge selections)
+        start = self.clamp_cursor(start.copy())
+        end = self.clamp_cursor(end.copy())
+        if start.row == end.row:
+            return iter((self.lines[start.row][start.col:end.col],))
+
+        def clipped():
+            it = self.iter_lines(start.row)
+            yield next(it)[start.col:]
+            yield from islice(it, end.row - start.row - 1)
+            yield next(it)[:end.col]
+
+        return iter_text_chunks(clipped(), chunk_lines)
+
+    def iter_chunks(self, chunk_lines:int=CHUNK_LINES) -> Iterator[str]:
+        return iter_text_chunks(self.lines, chunk_lines)
+
+    # snapshots
+    def snapshot(self) -> Snapshot:
+        # O(1) itself, but the next edit copies the lines first (see _own)
+        self._shared = True
+        return Snapshot(self.lines, self.version, self.backend)
+
+    def compact(self, min_fragmentation: float = 0.0) -> None:
+        # rebuild rope leaves after many small edits (not for lazily decoded sources);
+        # skipped while the rope has at most min_fragmentation times the leaves it needs
+        if isinstance(self.lines, LineRope) and self.lines.fragmentation() > min_fragmentation:
+            self._own()
+            self.lines.compact()
+
+    def _own(self) -> None:
+        # copy-on-write: first edit after a snapshot gets private lines
+        # rope: O(1), shares the tree; list: full O(n) copy of the line list
+        if self._shared:
+            self.lines = self.lines.copy()
+            self._shared = False
+
+    # change listeners: cb(row, removed, added)
+    # lines[row:row+removed] were replaced by `added` lines
+    def add_listener(self, cb:Callable[[int, int, int], None]) -> None:
+        self._listeners.append(cb)
+
+    def remove_listener(self, cb:Callable[[int, int, int], None]) -> None:
+        if cb in self._listeners:
+            self._listeners.remove(cb)
+
+    def _changed(self, row:int, removed:int, added:int) -> None:
+        self.version += 1
+        for cb in self._listeners:
+            cb(row, removed, added)
+
+    def iter_lines(self, start:int=0) -> Iterator[str]:
+        return iter_lines_from(self.lines, start)
+
 
     # set text buffer's position 
     def clamp_cursor(self, c:Cursor) -> Cursor:
@@ -84,7 +279,6 @@ class TextBuffer:
     # edit primitives
     def insert_text_at(self, pos:Cursor, text:str) -> Cursor:
         pos = self.clamp_cursor(pos.copy())
-        text = text.replace("\r\n", "\n").replace("\r", "\n")
 
         if text == "":
             return pos
@@ -93,11 +287,13 @@ class TextBuffer:
         left = cur_line[:pos.col]
         right = cur_line[pos.col:]
 
-        parts = text.split("\n")
+        parts = split_lines(text)
+        self._own()
 
         # single line
         if len(parts) == 1:
             self.lines[pos.row] = left + parts[0] + right
+            self._changed(pos.row, 1, 1)
             return Cursor(pos.row, pos.col+len(parts[0]))
         
         # multi line
@@ -105,18 +301,16 @@ class TextBuffer:
         last = parts[-1] + right
         middle = parts[1:-1]
 
-        self.lines[pos.row] = first
-        insert_at = pos.row + 1
-        for m in middle:
-            self.lines.insert(insert_at, m)
-            insert_at += 1
-        self.lines.insert(insert_at, last)
+        # splice all new lines in one slice assignment
+        self.lines[pos.row:pos.row+1] = [first, *middle, last]
+        self._changed(pos.row, 1, len(parts))
 
-        return Cursor(insert_at, len(parts[-1]))
+        return Cursor(pos.row + len(parts) - 1, len(parts[-1]))
     
     def delete_range(self, start:Cursor, end:Cursor) -> str:
         start = self.clamp_cursor(start.copy())
         end = self.clamp_cursor(end.copy())
+        self._own()
 
         # single line
         if start.row == end.row:
@@ -124,6 +318,7 @@ class TextBuffer:
             deleted = line[start.col:end.col]
             self.lines[start.row] = line[:start.col]
             if len(line) > end.col: self.lines[start.row] = self.lines[start.row] + line[end.col:]
+            self._changed(start.row, 1, 1)
             return deleted
         
         # multi line
@@ -132,13 +327,13 @@ class TextBuffer:
         deleted_lines = []
 
         deleted_lines.append(first_line[start.col:])
-        for r in range(start.row+1, end.row):
-            deleted_lines.append(self.lines[r])
+        deleted_lines.extend(self.lines[start.row+1:end.row])
         deleted_lines.append(last_line[:end.col])
 
         new_first = first_line[:start.col] + last_line[end.col:]
         del self.lines[start.row+1 : end.row+1]
         self.lines[start.row] = new_first
+        self._changed(start.row, end.row - start.row + 1, 1)
 
         return "\n".join(deleted_lines)
 
@@ -160,115 +355,637 @@ class TextBuffer:
             deleted = self.delete_range(start, end)
             return start,deleted
 
+        self._own()
         prev_row = pos.row-1
         prev_len = len(self.lines[prev_row])
         self.lines[prev_row] = self.lines[prev_row] + self.lines[pos.row]
         del self.lines[pos.row]
+        self._changed(prev_row, 2, 1)
         return Cursor(prev_row, prev_len),"\n"
 
-    def find_next(self, query:str, start:Cursor) -> Optional[Cursor]:
+    # growing files (follow mode): not undoable, one splice each
+    def append_text(self, text:str) -> None:
+        if text == "":
+            return
+        parts = split_lines(text)
+        self._own()
+        last = len(self.lines) - 1
+        self.lines[last] = self.lines[last] + parts[0]
+        if len(parts) > 1:
+            self.lines.extend(parts[1:])
+        self._changed(last, 1, len(parts))
+
+    def drop_head(self, count:int) -> None:
+        # remove the first count lines; at least one line stays
+        count = min(count, len(self.lines) - 1)
+        if count <= 0:
+            return
+        self._own()
+        del self.lines[:count]
+        self._changed(0, count, 0)
+
+    def find_next(self, query:str, start:Cursor, opts:SearchOptions=LITERAL) -> Optional[Cursor]:
+        # end of the next match (kept for callers that only need the cursor)
+        found = self.find_match(query, start, opts)
+        return None if found is None else found[1]
+
+    def find_match(self, query:str, start:Cursor, opts:SearchOptions=LITERAL) -> Optional[Tuple[Cursor, Cursor]]:
         if query=="":
             return None
             
         start = self.clamp_cursor(start.copy())
 
-        line = self.lines[start.row]
-        idx = line.find(query, start.col)
-        if idx!=-1:
-            return Cursor(start.row, idx+len(query))
-
-        for r in range(start.row+1, len(self.lines)):
-            idx = self.lines[r].find(query)
+        if opts.literal and "\n" not in query:
+            line = self.lines[start.row]
+            idx = line.find(query, start.col)
             if idx!=-1:
-                return Cursor(r, idx+len(query))
+                return Cursor(start.row, idx), Cursor(start.row, idx+len(query))
+
+            for r, line in enumerate(self.iter_lines(start.row+1), start.row+1):
+                idx = line.find(query)
+                if idx!=-1:
+                    return Cursor(r, idx), Cursor(r, idx+len(query))
+            return None
+
+        pattern = compile_pattern(query, opts)
+        if is_multiline(query, opts):
+            found = self._search_window(pattern, start)
+            return None if found is None else found[:2]
+
+        col = start.col
+        for r, line in enumerate(self.iter_lines(start.row), start.row):
+            m = _search_nonempty(pattern, line, col)
+            if m is not None:
+                return Cursor(r, m.start()), Cursor(r, m.end())
+            col = 0
+        return None
 
+    def _search_window(self, pattern, start:Cursor):
+        # multi-line patterns: search windows of joined lines, never the whole document.
+        # windows overlap by half so a match crossing a window edge is still seen
+        # (matches spanning more than MULTILINE_WINDOW // 2 lines can be missed)
+        window = MULTILINE_WINDOW
+        row, col = start.row, start.col
+        n = len(self.lines)
+        while row < n:
+            chunk = list(islice(self.iter_lines(row), window))
+            text = "\n".join(chunk)
+            m = _search_nonempty(pattern, text, col)
+            last = row + len(chunk) >= n
+            if m is not None and m.end() == len(text) and not last:
+                # may be cut off by the window edge: retry with a bigger window
+                window *= 2
+                continue
+            # matches starting in the second half are found again by the next window
+            step = max(1, window // 2)
+            limit = len(text) if last else sum(len(l) + 1 for l in chunk[:step])
+            if m is not None and (last or m.start() < limit):
+                return _offset_cursor(text, row, m.start()), _offset_cursor(text, row, m.end()), m
+            if last:
+                return None
+            row += step
+            col = 0
+            window = MULTILINE_WINDOW
         return None
 
-    def replace_at(self, pos:Cursor, query:str, repl:str) -> bool:
+    def match_at(self, pos:Cursor, query:str, opts:SearchOptions=LITERAL):
+        # re.Match of a single-line match starting exactly at pos, or None
+        if query=="" or is_multiline(query, opts):
+            return None
+        pos = self.clamp_cursor(pos.copy())
+        m = compile_pattern(query, opts).match(self.lines[pos.row], pos.col)
+        if m is None or m.end() == m.start():
+            return None
+        return m
+
+    def next_replacement(self, pos:Cursor, query:str, repl:str, opts:SearchOptions=LITERAL) -> Optional[Tuple[Cursor, Cursor, str]]:
+        # next match at/after pos and its replacement text (regex templates expanded)
+        if query=="":
+            return None
+        pos = self.clamp_cursor(pos.copy())
+        if opts.regex and is_multiline(query, opts):
+            found = self._search_window(compile_pattern(query, opts), pos)
+            if found is None:
+                return None
+            start, end, m = found
+            return start, end, m.expand(repl)
+
+        found = self.find_match(query, pos, opts)
+        if found is None:
+            return None
+        start, end = found
+        if opts.regex:
+            return start, end, self.match_at(start, query, opts).expand(repl)
+        return start, end, repl
+
+    def replace_at(self, pos:Cursor, query:str, repl:str, opts:SearchOptions=LITERAL) -> bool:
         pos = self.clamp_cursor(pos.copy())
         if query=="":
             return False
         
+        self._own()
         line = self.lines[pos.row]
+        if not opts.literal:
+            m = self.match_at(pos, query, opts)
+            if m is None:
+                return False
+            text = m.expand(repl) if opts.regex else repl
+            self.lines[pos.row] = line[:m.start()] + text + line[m.end():]
+            self._changed(pos.row, 1, 1)
+            return True
+
         if line.startswith(query, pos.col):
             self.lines[pos.row] = line[:pos.col] + repl
             if len(line) > pos.col+len(query):
                 self.lines[pos.row] = self.lines[pos.row] + line[pos.col+len(query):]
+            self._changed(pos.row, 1, 1)
             return True
         
         return False
 
+    # bulk line edits
+    def plan_replace_all(self, query:str, repl:str, opts:SearchOptions=LITERAL,
+                         tick:Optional[Callable[[int], None]]=None) -> Tuple[List[Tuple[int, int, List[str]]], int]:
+        # one pass: (row, count, new lines) for every affected span, and the hit count
+        # tick(row) is called every TICK_ROWS rows and may raise to abort
+        edits = []
+        count = 0
+        if query == "":
+            return edits, count
+        repl = normalize_newlines(repl)
+        multi = "\n" in repl
+
+        if opts.literal and "\n" not in query:
+            for r, line in enumerate(self.iter_lines()):
+                if tick is not None and not r % TICK_ROWS:
+                    tick(r)
+                if query in line:
+                    count += line.count(query)
+                    new = line.replace(query, repl)
+                    edits.append((r, 1, new.split("\n") if multi else [new]))
+            return edits, count
+
+        pattern = compile_pattern(query, opts)
+        if is_multiline(query, opts):
+            return self._plan_replace_window(pattern, repl, opts.regex, tick)
+
+        # literal replacement text must not go through template expansion
+        sub = repl if opts.regex else (lambda m: repl)
+        for r, line in enumerate(self.iter_lines()):
+            if tick is not None and not r % TICK_ROWS:
+                tick(r)
+            new, n = pattern.subn(sub, line)
+            if n:
+                count += n
+                edits.append((r, 1, new.split("\n") if "\n" in new else [new]))
+        return edits, count
+
+    def _plan_replace_window(self, pattern, repl:str, regex:bool, tick=None):
+        # matches that touch the same rows are rewritten together as one span
+        edits = []
+        count = 0
+        group = None    # [first_row, last_row, [(start, end, text), ...]]
+        pos = Cursor(0, 0)
+        while True:
+            found = self._search_window(pattern, pos)
+            if found is None:
+                break
+            start, end, m = found
+            if tick is not None:
+                tick(start.row)
+            text = m.expand(repl) if regex else repl
+            if group is not None and start.row <= group[1]:
+                group[1] = max(group[1], end.row)
+                group[2].append((start, end, text))
+            else:
+                if group is not None:
+                    edits.append(self._rewrite_span(*group))
+                group = [start.row, end.row, [(start, end, text)]]
+            count += 1
+            pos = end
+        if group is not None:
+            edits.append(self._rewrite_span(*group))
+        return edits, count
+
+    def _rewrite_span(self, first:int, last:int, hits) -> Tuple[int, int, List[str]]:
+        lines = self.lines[first:last+1]
+        starts = [0]
+        for l in lines:
+            starts.append(starts[-1] + len(l) + 1)
+        text = "\n".join(lines)
+        out = []
+        prev = 0
+        for start, end, repl in hits:
+            a = starts[start.row - first] + start.col
+            b = starts[end.row - first] + end.col
+            out.append(text[prev:a])
+            out.append(repl)
+            prev = b
+        out.append(text[prev:])
+        return first, last - first + 1, "".join(out).split("\n")
+
+    def apply_line_edits(self, edits:List[Tuple[int, int, List[str]]]) -> List[List[str]]:
+        # edits: (row, count, new lines), ascending, non-overlapping, rows as before any edit
+        # applied bottom-up so rows stay valid; listeners get one change for the whole span
+        if not edits:
+            return []
+        self._own()
+        old: List[List[str]] = [[]] * len(edits)
+        delta = 0
+        for i in range(len(edits) - 1, -1, -1):
+            row, count, new = edits[i]
+            old[i] = self.lines[row:row+count]
+            if count == 1 and len(new) == 1:
+                self.lines[row] = new[0]
+            else:
+                self.lines[row:row+count] = new
+            delta += len(new) - count
+
+        first = edits[0][0]
+        removed = edits[-1][0] + edits[-1][1] - first
+        self._changed(first, removed, removed + delta)
+        return old
+
+
+
+# commands keep positions packed into one int: row << 32 | col
+def _pack(c:Cursor) -> int:
+    return (c.row << 32) | c.col
+
+def _unpack(p:int) -> Cursor:
+    return Cursor(p >> 32, p & 0xFFFFFFFF)
+
+
+# typing within this many seconds is merged into one undo step
+COALESCE_SECONDS = 1.0
+# rough per-command overhead for the memory budget
+COMMAND_OVERHEAD = 96
 
 
 class Command:
+    __slots__ = ()
+
     def do(self, buf:TextBuffer, cursor:Cursor) -> Cursor:
         raise NotImplementedError
     def undo(self, buf:TextBuffer, cursor:Cursor) -> Cursor:
         raise NotImplementedError
 
+    def merge(self, other:"Command") -> bool:
+        # absorb `other` (already applied right after self); False if it can't
+        return False
+
+    def size(self) -> int:
+        # approximate memory held, used by UndoStack's budget
+        return COMMAND_OVERHEAD
+
+    def to_record(self) -> list:
+        # JSON-friendly form, see command_from_record()
+        raise NotImplementedError
+
 
 class InsertCommand(Command):
+    __slots__ = ("_pos", "_after", "text", "_t")
+
     def __init__(self, pos: Cursor, text: str):
-        self.pos = pos.copy()
+        self._pos = _pack(pos)
+        self._after = -1
         self.text = text
-        self.after: Optional[Cursor] = None
+        self._t = time.monotonic()
+
+    @property
+    def pos(self) -> Cursor:
+        return _unpack(self._pos)
+
+    @property
+    def after(self) -> Optional[Cursor]:
+        return None if self._after < 0 else _unpack(self._after)
 
     def do(self, buf: TextBuffer, cursor: Cursor) -> Cursor:
-        self.after = buf.insert_text_at(self.pos, self.text)
-        return self.after.copy()
+        after = buf.insert_text_at(self.pos, self.text)
+        self._after = _pack(after)
+        return after
 
     def undo(self, buf: TextBuffer, cursor: Cursor) -> Cursor:
-        if self.after is None:
+        if self._after < 0:
             return cursor
         # delete inserted text range: [pos, after)
         deleted = buf.delete_range(self.pos, self.after)
         # safety: deleted should equal self.text normalized, but we don't enforce
-        return self.pos.copy()
+        return self.pos
+
+    def merge(self, other: Command) -> bool:
+        # consecutive typing on one line
+        if (type(other) is not InsertCommand or other._pos != self._after
+                or "\n" in other.text or "\n" in self.text
+                or other._t - self._t > COALESCE_SECONDS):
+            return False
+        self.text += other.text
+        self._after = other._after
+        self._t = other._t
+        return True
+
+    def size(self) -> int:
+        return COMMAND_OVERHEAD + len(self.text)
+
+    def to_record(self) -> list:
+        return ["I", self._pos, self._after, self.text]
 
 
 class DeleteCommand(Command):
+    __slots__ = ("_start", "_end", "deleted_text", "_t")
+
     def __init__(self, start: Cursor, end: Cursor, deleted_text: str):
-        self.start = start.copy()
-        self.end = end.copy()
+        self._start = _pack(start)
+        self._end = _pack(end)
         self.deleted_text = deleted_text
+        self._t = time.monotonic()
+
+    @property
+    def start(self) -> Cursor:
+        return _unpack(self._start)
+
+    @property
+    def end(self) -> Cursor:
+        return _unpack(self._end)
 
     def do(self, buf: TextBuffer, cursor: Cursor) -> Cursor:
         # apply delete again
         buf.delete_range(self.start, self.end)
-        return self.start.copy()
+        return self.start
 
     def undo(self, buf: TextBuffer, cursor: Cursor) -> Cursor:
         return buf.insert_text_at(self.start, self.deleted_text)
 
+    def merge(self, other: Command) -> bool:
+        # backspace chain: other deleted the text right before ours.
+        # the combined range [other.start, self.end) is valid before both deletes
+        if (type(other) is not DeleteCommand or other._end != self._start
+                or other.deleted_text == "\n" or self.deleted_text == "\n"
+                or other._t - self._t > COALESCE_SECONDS):
+            return False
+        self.deleted_text = other.deleted_text + self.deleted_text
+        self._start = other._start
+        self._t = other._t
+        return True
+
+    def size(self) -> int:
+        return COMMAND_OVERHEAD + len(self.deleted_text)
+
+    def to_record(self) -> list:
+        return ["D", self._start, self._end, self.deleted_text]
+
+
+class ReplaceLinesCommand(Command):
+    """
+        여러 줄을 한 번에 바꾸는 복합 명령 (replace all 등)
+        - undo/redo 모두 한 단계
+    """
+    __slots__ = ("edits", "old")
+
+    def __init__(self, edits: List[Tuple[int, int, List[str]]]):
+        self.edits = edits
+        self.old: List[List[str]] = []
+
+    def do(self, buf: TextBuffer, cursor: Cursor) -> Cursor:
+        self.old = buf.apply_line_edits(self.edits)
+        return buf.clamp_cursor(cursor.copy())
+
+    def undo(self, buf: TextBuffer, cursor: Cursor) -> Cursor:
+        # same spans in post-edit coordinates, restoring the old lines
+        inverse = []
+        shift = 0
+        for (row, count, new), old in zip(self.edits, self.old):
+            inverse.append((row + shift, len(new), old))
+            shift += len(new) - count
+        buf.apply_line_edits(inverse)
+        return buf.clamp_cursor(cursor.copy())
+
+    def size(self) -> int:
+        n = sum(len(l) for _, _, new in self.edits for l in new)
+        n += sum(len(l) for old in self.old for l in old)
+        return COMMAND_OVERHEAD * (1 + len(self.edits)) + n
+
+    def to_record(self) -> list:
+        return ["R", [list(e) for e in self.edits], self.old]
+
+
+class BatchCommand(Command):
+    """
+        여러 커서에서 같은 키 입력을 한 번에 적용하는 명령 (undo 한 단계)
+        - edits: (start, end, text) 편집 전 좌표, 위치 순 정렬, 서로 겹치지 않음
+          [start, end)를 지우고 text를 넣음
+        - 앞에서부터 적용하면서 뒤쪽 위치는 누적 이동량으로 한 번만 옮김
+        - 적용된 하위 명령(Insert/Delete)을 기록, undo는 역순
+        - carets: 적용 후 각 편집 끝 위치
+    """
+    __slots__ = ("edits", "cmds", "carets")
+
+    def __init__(self, edits: List[Tuple[Cursor, Cursor, str]]):
+        self.edits = edits
+        self.cmds: List[Command] = []
+        self.carets: List[Cursor] = []
+
+    def do(self, buf: TextBuffer, cursor: Cursor) -> Cursor:
+        if self.cmds:
+            # redo: replay in the recorded coordinates
+            for cmd in self.cmds:
+                cursor = cmd.do(buf, cursor)
+            return buf.clamp_cursor(self.carets[-1].copy()) if self.carets else cursor
+
+        # shift from the previous edit: rows below its end move by drow,
+        # columns on its end row map onto its new end
+        end_row, new_row, dcol = -1, -1, 0
+        for start, end, text in self.edits:
+            s = _shift(start, end_row, new_row, dcol)
+            e = _shift(end, end_row, new_row, dcol)
+            if e != s:
+                deleted = buf.delete_range(s, e)
+                self.cmds.append(DeleteCommand(s, e, deleted))
+            after = s
+            if text:
+                ins = InsertCommand(s, text)
+                after = ins.do(buf, s)
+                self.cmds.append(ins)
+            self.carets.append(after)
+            end_row, new_row, dcol = end.row, after.row, after.col - end.col
+        return self.carets[-1].copy() if self.carets else cursor
+
+    def undo(self, buf: TextBuffer, cursor: Cursor) -> Cursor:
+        for cmd in reversed(self.cmds):
+            cursor = cmd.undo(buf, cursor)
+        return cursor
+
+    def size(self) -> int:
+        return COMMAND_OVERHEAD + sum(c.size() for c in self.cmds)
+
+    def to_record(self) -> list:
+        return ["B", [c.to_record() for c in self.cmds], [_pack(c) for c in self.carets]]
+
+
+def _shift(pos: Cursor, end_row: int, new_row: int, dcol: int) -> Cursor:
+    # pos (at/after an edit that ended at row end_row) in post-edit coordinates
+    if pos.row == end_row:
+        return Cursor(new_row, pos.col + dcol)
+    return Cursor(pos.row + new_row - end_row, pos.col)
+
+
+def command_from_record(rec: list) -> Command:
+    kind = rec[0]
+    if kind == "I":
+        cmd = InsertCommand(_unpack(rec[1]), rec[3])
+        cmd._after = rec[2]
+    elif kind == "D":
+        cmd = DeleteCommand(_unpack(rec[1]), _unpack(rec[2]), rec[3])
+    elif kind == "R":
+        cmd = ReplaceLinesCommand([(row, count, new) for row, count, new in rec[1]])
+        cmd.old = rec[2]
+        return cmd
+    elif kind == "B":
+        cmd = BatchCommand([])
+        cmd.cmds = [command_from_record(r) for r in rec[1]]
+        cmd.carets = [_unpack(p) for p in rec[2]]
+        return cmd
+    else:
+        raise ValueError(f"unknown command record: {kind!r}")
+    # restored commands never merge with new typing
+    cmd._t = 0.0
+    return cmd
+
 
 class UndoStack:
-    def __init__(self):
-        self._undo: List[Command] = []
+    """
+        undo/redo 스택
+        - 연속 입력/삭제는 한 단계로 병합 (seal()로 끊기)
+        - max_entries / max_bytes를 넘으면 가장 오래된 기록부터 버림
+        - journal(UndoJournal)이 있으면 버리는 대신 디스크로 내보내고, 필요할 때 다시 읽음
+        - recovery(RecoveryLog)가 있으면 버퍼에 적용한 do/undo를 하나씩 기록 (크래시 복구)
+    """
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._undo: Deque[Command] = deque()
         self._redo: List[Command] = []
+        self._bytes = 0
+        self._mergeable = False
+        self.journal = None
+        self.recovery = None
 
     def clear(self) -> None:
         self._undo.clear()
         self._redo.clear()
+        self._bytes = 0
+        self._mergeable = False
+        self.detach_journal()
+        self.detach_recovery()
+
+    # on-disk history
+    def attach_journal(self, journal) -> None:
+        self.detach_journal()
+        self.journal = journal
+
+    def detach_journal(self) -> None:
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    # crash recovery
+    def attach_recovery(self, log) -> None:
+        self.detach_recovery()
+        self.recovery = log
+
+    def detach_recovery(self) -> None:
+        # the buffer was replaced or closed: its unsaved edits are gone on purpose
+        if self.recovery is not None:
+            self.recovery.discard()
+            self.recovery = None
+
+    def history(self) -> List[Command]:
+        # in-memory undo steps, oldest first
+        return list(self._undo)
+
+    def checkpoint(self, content_hash: str, history: Optional[List[Command]] = None) -> None:
+        # the document was saved with this content: persist the history that leads to it
+        if self.journal is not None:
+            self.journal.checkpoint(content_hash, self.history() if history is None else history)
+
+    def can_undo(self) -> bool:
+        return bool(self._undo) or (self.journal is not None and self.journal.has_history())
+
+    def seal(self) -> None:
+        # next push starts a new undo step (cursor moved, focus lost, ...)
+        self._mergeable = False
+
+    def memory_usage(self) -> int:
+        return self._bytes
+
+    def peek(self) -> Optional[Command]:
+        # the command undo() would revert next, left in place
+        if self._undo:
+            return self._undo[-1]
+        if self.journal is not None and self.journal.has_history():
+            return self.journal.peek()
+        return None
+
+    def peek_redo(self) -> Optional[Command]:
+        return self._redo[-1] if self._redo else None
 
     def push_and_do(self, cmd: Command, buf: TextBuffer, cursor: Cursor) -> Cursor:
         new_cursor = cmd.do(buf, cursor)
-        self._undo.append(cmd)
+        for c in self._redo:
+            self._bytes -= c.size()
         self._redo.clear()
+
+        top = self._undo[-1] if self._undo else None
+        if self._mergeable and top is not None:
+            before = top.size()
+            if top.merge(cmd):
+                if self.recovery is not None:
+                    self.recovery.log_merge(cmd)
+                self._bytes += top.size() - before
+                self._trim()
+                return new_cursor
+
+        if self.recovery is not None:
+            self.recovery.log_do(cmd)
+        self._undo.append(cmd)
+        self._bytes += cmd.size()
+        self._mergeable = True
+        self._trim()
         return new_cursor
 
+    def _trim(self) -> None:
+        # evict oldest history, never the newest step
+        while len(self._undo) > 1 and (len(self._undo) > self.max_entries or self._bytes > self.max_bytes):
+            self._evict(self._undo.popleft())
+
+    def _evict(self, cmd: Command) -> None:
+        self._bytes -= cmd.size()
+        if self.journal is not None:
+            self.journal.spill(cmd)
+
     def undo(self, buf: TextBuffer, cursor: Cursor) -> Cursor:
-        if not self._undo:
+        self._mergeable = False
+        if self._undo:
+            cmd = self._undo.pop()
+        elif self.journal is not None and self.journal.has_history():
+            # past the in-memory window: load one step from disk
+            cmd = self.journal.pop()
+            self._bytes += cmd.size()
+        else:
             return cursor
-        cmd = self._undo.pop()
         new_cursor = cmd.undo(buf, cursor)
+        if self.recovery is not None:
+            self.recovery.log_undo(cmd)
         self._redo.append(cmd)
         return new_cursor
 
     def redo(self, buf: TextBuffer, cursor: Cursor) -> Cursor:
+        self._mergeable = False
         if not self._redo:
             return cursor
         cmd = self._redo.pop()
         new_cursor = cmd.do(buf, cursor)
+        if self.recovery is not None:
+            self.recovery.log_do(cmd)
         self._undo.append(cmd)
         return new_cursor
-
@@ -1,11 +1,91 @@
 # editor_widget.py
 from __future__ import annotations
-from typing import Optional
-from PyQt6.QtCore import Qt, QRect, QTimer
-from PyQt6.QtGui import QPainter, QFont, QFontMetrics, QKeyEvent
-from PyQt6.QtWidgets import QWidget
+import hashlib
+import os
+from typing import Callable, List, Optional, Tuple
+from PyQt6.QtCore import Qt, QRect, QTimer, pyqtSignal
+from PyQt6.QtGui import QPainter, QFont, QFontInfo, QFontMetrics, QKeyEvent, QColor
+from PyQt6.QtWidgets import QApplication, QWidget
 
-from core import TextBuffer, Cursor, UndoStack, InsertCommand, DeleteCommand
+from buffer_pool import Document
+from core import TextBuffer, Snapshot, Cursor, InsertCommand, DeleteCommand, ReplaceLinesCommand, BatchCommand, CHUNK_LINES, iter_text_chunks, is_insertable
+from fileio import write_atomic
+from follow import FileFollower
+from highlight import Highlighter, Lexer, lexer_for_path
+from line_index import LineIndex
+from mapped_file import MappedFile
+from patterns import SearchOptions, compile_pattern, is_multiline
+from perf import tracer
+from recovery import RecoveryLog, SYNC_SECONDS, default_dir, replay
+from search import SearchIndex
+from text_metrics import AdvanceCache
+from textio import TextFormat, read_document_sized, sniff_format, split_lines
+from undo_journal import UndoJournal, hashed_chunks, text_hash
+from workers import WorkerPool
+from wrap import WrapLayout
+
+
+# files at least this big are opened memory-mapped
+LARGE_FILE_BYTES = 64 * 1024 * 1024
+
+# follow mode: how often the file is stat()ed
+FOLLOW_POLL_MS = 250
+
+# selections spanning more lines are copied to the clipboard from a worker
+COPY_ASYNC_LINES = 50000
+
+# documents up to this many lines get their line index built inline, larger ones in a worker
+LINE_INDEX_SYNC_LINES = 50000
+
+
+# worker jobs: fn(report, token, *args), they only read snapshots
+# (a TextBuffer argument is a Snapshot.as_buffer() view)
+def _read_document(report, token, path: str):
+    total = os.path.getsize(path)
+    lines, fmt, size = read_document_sized(path, progress=lambda done: report(done, total))
+    return lines, fmt, text_hash(iter_text_chunks(lines)), size
+
+
+def _write_snapshot(report, token, path: str, snap: Snapshot, fmt: TextFormat):
+    total = max(1, -(-len(snap) // CHUNK_LINES))
+    h = hashlib.sha1()
+    write_atomic(path, hashed_chunks(snap.iter_chunks(), h),
+                 progress=lambda n: report(n, total),
+                 encoding=fmt.encoding, newline=fmt.newline, bom=fmt.bom)
+    return h.hexdigest(), os.path.getsize(path)
+
+
+def _build_index(report, token, snap: TextBuffer, query: str, opts: SearchOptions):
+    index = SearchIndex(snap, listen=False)
+    total = len(snap.lines)
+    index.set_query(query, opts, tick=lambda row: report(row, total))
+    return index
+
+
+def _find_match(report, token, snap: TextBuffer, query: str, start: Cursor, opts: SearchOptions):
+    return snap.find_match(query, start, opts)
+
+
+def _plan_replace_all(report, token, snap: TextBuffer, query: str, repl: str, opts: SearchOptions):
+    total = len(snap.lines)
+    return snap.plan_replace_all(query, repl, opts, tick=lambda row: report(row, total))
+
+
+def _build_line_index(report, token, snap: TextBuffer):
+    index = LineIndex(snap, listen=False)
+    total = len(snap.lines)
+    index.build(tick=lambda row: report(row, total))
+    return index
+
+
+def _copy_range(report, token, snap: TextBuffer, start: Cursor, end: Cursor):
+    # joined chunk by chunk, never as one list of every selected line
+    total = end.row - start.row + 1
+    parts = []
+    for i, chunk in enumerate(snap.iter_range_chunks(start, end), 1):
+        parts.append(chunk)
+        report(min(total, i * CHUNK_LINES), total)
+    return "".join(parts)
 
 
 class EditorWidget(QWidget):
@@ -14,13 +94,41 @@ class EditorWidget(QWidget):
     - paintEvent에서 직접 텍스트/커서 렌더
     - keyPressEvent로 입력 처리
     """
+    # (lines indexed so far, finished) while a large file is being indexed
+    loadProgress = pyqtSignal(int, bool)
+    # follow mode: (lines appended, total lines) after each read
+    followUpdated = pyqtSignal(int, int)
+    # the cursor moved or line_index changed (status bar position / statistics)
+    cursorMoved = pyqtSignal()
+    # background jobs "open", "save", "find", "replace_all", "copy":
+    # (kind, done, total) / (kind, result, error message, "cancelled" or "")
+    taskProgress = pyqtSignal(str, int, int)
+    taskFinished = pyqtSignal(str, object, str)
+
+    # syntax token kind -> text color
+    SYNTAX_COLORS = {
+        "keyword": "#0000c0",
+        "builtin": "#6a1b9a",
+        "string": "#a31515",
+        "comment": "#408040",
+        "number": "#098658",
+    }
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
 
-        self.buf = TextBuffer("")
+        # the document shown; its buf/undo/cursor/scroll live on the widget while active
+        self.doc = Document()
+        self.buf = self.doc.buf
+        self.buf.add_listener(self._on_buffer_changed)
         self.cursor = Cursor(0, 0)
-        self.undo = UndoStack()
+        # extra carets (multi-cursor); self.cursor stays the primary one
+        self.carets: List[Cursor] = []
+        # selection: anchor .. cursor (Shift + movement), None when nothing is selected
+        self.anchor: Optional[Cursor] = None
+        self._sel_row = 0       # cursor row when the selection was last repainted
+        self.undo = self.doc.undo
 
         self.font = QFont("Consolas")
         if self.font==None: self.font = QFont("Menlo")
@@ -32,6 +140,18 @@ class EditorWidget(QWidget):
         self.padding = 8
         self.line_h = self.fm.height()
         self.char_w = self.fm.horizontalAdvance("M")
+        self.advances = AdvanceCache(self.fm.horizontalAdvance, self.char_w, QFontInfo(self.font).fixedPitch())
+
+        # viewport: first visual row shown at the top (the logical row without soft wrap)
+        self.scroll_row = 0
+        self._caret_rect = QRect()
+
+        # soft wrap: visual row layout of the buffer (None when off or memory-mapped)
+        self.soft_wrap = False
+        self.wrap: Optional[WrapLayout] = None
+        self._relayout_timer = QTimer(self)
+        self._relayout_timer.setSingleShot(True)
+        self._relayout_timer.timeout.connect(self._apply_wrap_width)
 
         # cursor blink (optional, cheap)
         self._cursor_visible = True
@@ -41,132 +161,1049 @@ class EditorWidget(QWidget):
 
         self.find_query: str = ""
         self.replace_text: str = ""
+        self.search_opts = SearchOptions()
+        self.search = SearchIndex(self.buf)
+        self.syntax = Highlighter(self.buf)
+        # line lengths / word counts: statistics, offset <-> cursor
+        self.line_index = LineIndex(self.buf)
+        self.line_index.build()
+        self._syntax_pens = {kind: QColor(c) for kind, c in self.SYNTAX_COLORS.items()}
 
         # highlight
         self.highlight_pos: Optional[Cursor] = None
         self.highlight_len: int = 0
 
+        # large-file mode (read only until the line index is complete)
+        self.read_only = False
+        self.mapped: Optional[MappedFile] = None
+        self._index_timer = QTimer(self)
+        self._index_timer.timeout.connect(self._poll_index)
+
+        self.workers = WorkerPool(parent=self)
+
+        # follow mode (tail -f): new bytes of doc.path are appended, read only meanwhile
+        self.follower: Optional[FileFollower] = None
+        self.follow_max_lines = 0       # drop the oldest lines past this many, 0 = keep all
+        self._follow_dropped = False
+        self._follow_timer = QTimer(self)
+        self._follow_timer.timeout.connect(self._poll_follow)
+
+        # keep undo history in a journal next to the file (off by default)
+        self.persistent_undo = False
+
+        # crash recovery: edits since the last save are logged here, None = off
+        self.recovery_dir: Optional[str] = default_dir()
+        self._recovery_timer = QTimer(self)
+        self._recovery_timer.timeout.connect(self.sync_recovery)
+        self._recovery_timer.start(int(SYNC_SECONDS * 1000))
+
     def _toggle_cursor(self):
         self._cursor_visible = not self._cursor_visible
+        self.update(self._caret_rect)
+        for c in self.carets:
+            self.update(self._cursor_rect(c))
+
+    # -------- viewport --------
+    def visible_row_count(self) -> int:
+        return max(1, (self.height() - 2 * self.padding) // self.line_h)
+
+    def _visual_row(self, row: int) -> int:
+        return row if self.wrap is None else self.wrap.visual_row(row)
+
+    def _total_rows(self) -> int:
+        return len(self.buf.lines) if self.wrap is None else self.wrap.total
+
+    def _top_row(self) -> int:
+        # logical row at the top of the view
+        return self.scroll_row if self.wrap is None else self.wrap.locate(self.scroll_row)[0]
+
+    def _row_y(self, row: int) -> int:
+        # y of the first visual row of logical row
+        return self.padding + (self._visual_row(row) - self.scroll_row) * self.line_h
+
+    def _rows_rect(self, first: int, last: int) -> QRect:
+        top = self._row_y(first)
+        return QRect(0, top, self.width(), self._row_y(last + 1) - top)
+
+    def _cursor_visual(self, c: Cursor) -> Tuple[int, int]:
+        # (visual row, x from the left text edge)
+        line = self.buf.lines[c.row]
+        if self.wrap is None:
+            return c.row, self.advances.x(c.row, line, c.col)
+        return self.wrap.cursor_visual(c, line)
+
+    def _cursor_rect(self, c: Optional[Cursor] = None) -> QRect:
+        vrow, x = self._cursor_visual(self.cursor if c is None else c)
+        y = self.padding + (vrow - self.scroll_row) * self.line_h
+        return QRect(self.padding + x, y, max(2, self.char_w // 10 + 1), self.line_h)
+
+    def scroll_to(self, row: int):
+        # row: visual row
+        row = max(0, min(row, self._total_rows() - 1))
+        if row != self.scroll_row:
+            self.scroll_row = row
+            self.update()
+
+    def ensure_cursor_visible(self) -> bool:
+        # returns True if the view scrolled (full repaint already queued)
+        old = self.scroll_row
+        rows = self.visible_row_count()
+        vrow = self._cursor_visual(self.cursor)[0] if self.wrap is not None else self.cursor.row
+        if vrow < self.scroll_row:
+            self.scroll_to(vrow)
+        elif vrow >= self.scroll_row + rows:
+            self.scroll_to(vrow - rows + 1)
+        return self.scroll_row != old
+
+    def _move_vertical(self, c: Cursor, step: int) -> Cursor:
+        # step visual rows up (<0) or down, keeping x
+        if self.wrap is None:
+            if step == -1:
+                return self.buf.move_up(c)
+            if step == 1:
+                return self.buf.move_down(c)
+            return self.buf.clamp_cursor(Cursor(c.row + step, c.col))
+        vrow, x = self._cursor_visual(c)
+        target = max(0, min(vrow + step, self.wrap.total - 1))
+        if target == vrow:
+            return c
+        return self.wrap.cursor_at(target, x)
+
+    # -------- soft wrap --------
+    def _wrap_width(self) -> int:
+        # text area width, leaving room for a caret after the last glyph
+        return self.width() - 2 * self.padding - self.char_w
+
+    def set_soft_wrap(self, on: bool):
+        top = self._top_row()
+        self.soft_wrap = on
+        self._relayout()
+        self.scroll_row = self._visual_row(top)
+        self._caret_rect = self._cursor_rect()
+        self.ensure_cursor_visible()
         self.update()
 
+    def _relayout(self):
+        # memory-mapped documents are never wrapped (layout would read every line)
+        if self.soft_wrap and self.mapped is None:
+            self.wrap = WrapLayout(self.buf, self.advances, self._wrap_width())
+        else:
+            self.wrap = None
+
+    def resizeEvent(self, e):
+        super().resizeEvent(e)
+        if self.wrap is not None:
+            # re-wrapping is O(lines): once the resize settles
+            self._relayout_timer.start(30)
+
+    def _apply_wrap_width(self):
+        if self.wrap is None:
+            return
+        top = self._top_row()
+        if self.wrap.set_width(self._wrap_width()):
+            self.scroll_row = self.wrap.visual_row(top)
+            self._caret_rect = self._cursor_rect()
+            self.update()
+
+    def _cursor_moved(self):
+        # repaint only the old and new caret cells
+        self._cursor_visible = True
+        self.update(self._caret_rect)
+        self.ensure_cursor_visible()
+        self._caret_rect = self._cursor_rect()
+        self.update(self._caret_rect)
+        self.cursorMoved.emit()
+        if self.anchor is not None:
+            # the selection grew/shrank between the old and new cursor rows
+            row = self.cursor.row
+            self.update(self._rows_rect(min(row, self._sel_row), max(row, self._sel_row)))
+            self._sel_row = row
+
+    def _update_highlight(self):
+        if self.highlight_pos is not None:
+            row = self.highlight_pos.row
+            self.update(self._rows_rect(row, row))
+
+    def _clear_highlight(self):
+        self._update_highlight()
+        self.highlight_pos = None
+        self.highlight_len = 0
+
+    # -------- multiple carets --------
+    def add_caret(self, step: int):
+        # new caret one row above (step=-1) the topmost or below (1) the bottommost caret
+        carets = self._all_carets()
+        edge = carets[0] if step < 0 else carets[-1]
+        row = edge.row + step
+        if not 0 <= row < len(self.buf.lines):
+            return
+        c = self.buf.clamp_cursor(Cursor(row, self.cursor.col))
+        if all(c != o for o in carets):
+            self.clear_selection()
+            self.carets.append(c)
+            self.undo.seal()
+            self.update(self._cursor_rect(c))
+
+    def clear_carets(self):
+        for c in self.carets:
+            self.update(self._rows_rect(c.row, c.row))
+        self.carets = []
+
+    def _all_carets(self) -> List[Cursor]:
+        # primary + extra carets, in position order, without duplicates
+        carets = sorted({(c.row, c.col) for c in [self.cursor, *self.carets]})
+        return [Cursor(r, c) for r, c in carets]
+
+    def _move_carets(self, move: Callable[[Cursor], Cursor]):
+        for c in self.carets:
+            self.update(self._rows_rect(c.row, c.row))
+        self.cursor = move(self.cursor)
+        moved = {(self.cursor.row, self.cursor.col)}
+        carets = []
+        for c in map(move, self.carets):
+            if (c.row, c.col) not in moved:
+                moved.add((c.row, c.col))
+                carets.append(c)
+                self.update(self._rows_rect(c.row, c.row))
+        self.carets = carets
+        self._cursor_moved()
+
+    def _edit_carets(self, span: Callable[[Cursor], Tuple[Cursor, Cursor]], text: str):
+        # one batched edit at every caret: [span(caret)) is replaced by text
+        carets = self._all_carets()
+        primary = carets.index(self.cursor)
+        edits = []
+        prev = Cursor(0, 0)
+        for c in carets:
+            start, end = span(c)
+            if (start.row, start.col) < (prev.row, prev.col):
+                start = prev    # spans of adjacent carets must not overlap
+            edits.append((start, end, text))
+            prev = end
+        if all(start == end for start, end, _ in edits) and not text:
+            return
+        cmd = BatchCommand(edits)
+        self.undo.push_and_do(cmd, self.buf, self.cursor)
+        self.cursor = cmd.carets[primary].copy()
+        seen = {(self.cursor.row, self.cursor.col)}
+        self.carets = []
+        for c in cmd.carets:
+            if (c.row, c.col) not in seen:
+                seen.add((c.row, c.col))
+                self.carets.append(c.copy())
+        self._cursor_moved()
+
+    def _backspace_span(self, c: Cursor) -> Tuple[Cursor, Cursor]:
+        if c.col > 0:
+            return Cursor(c.row, c.col - 1), c
+        if c.row > 0:
+            return Cursor(c.row - 1, len(self.buf.lines[c.row - 1])), c
+        return c, c
+
+    # -------- selection / clipboard --------
+    def selection(self) -> Optional[Tuple[Cursor, Cursor]]:
+        # (start, end) in position order, None if nothing is selected
+        a, c = self.anchor, self.cursor
+        if a is None or a == c:
+            return None
+        return (a.copy(), c.copy()) if (a.row, a.col) < (c.row, c.col) else (c.copy(), a.copy())
+
+    def clear_selection(self):
+        sel = self.selection()
+        self.anchor = None
+        if sel is not None:
+            self.update(self._rows_rect(sel[0].row, sel[1].row))
+
+    def _extend_selection(self, extend: bool):
+        # before a cursor movement: Shift starts/extends the selection, anything else drops it
+        if not extend:
+            self.clear_selection()
+        elif self.anchor is None:
+            self.anchor = self.cursor.copy()
+            self._sel_row = self.cursor.row
+
+    def select_all(self):
+        self.clear_carets()
+        self._clear_highlight()
+        last = len(self.buf.lines) - 1
+        self.anchor = Cursor(0, 0)
+        self.cursor = Cursor(last, len(self.buf.lines[last]))
+        self.update()
+        self._sel_row = last
+        self._cursor_moved()
+
+    def _replace_range(self, start: Cursor, end: Cursor, text: str):
+        # [start, end) -> text as one undo step; multi-line text is spliced in with one slice assignment
+        self.anchor = None
+        self.cursor = self.undo.push_and_do(BatchCommand([(start, end, text)]), self.buf, self.cursor)
+        self._cursor_moved()
+
+    def copy_selection(self):
+        sel = self.selection()
+        if sel is None:
+            return
+        start, end = sel
+        if end.row - start.row < COPY_ASYNC_LINES:
+            QApplication.clipboard().setText(self.buf.get_range(start, end))
+            return
+        # huge selection: build the text from a snapshot off the UI thread
+        snap = self.buf.snapshot()
+
+        def done(result, error):
+            if not error:
+                QApplication.clipboard().setText(result)
+            self.taskFinished.emit("copy", end.row - start.row + 1, error)
+
+        self._restart("copy", _copy_range, snap.as_buffer(), start, end, on_done=done)
+
+    def cut_selection(self):
+        sel = self.selection()
+        if sel is None or self.read_only:
+            return
+        self.undo.seal()
+        cmd = BatchCommand([(sel[0], sel[1], "")])
+        self.anchor = None
+        self.cursor = self.undo.push_and_do(cmd, self.buf, self.cursor)
+        # the delete already produced the text: no second pass over the selection
+        QApplication.clipboard().setText(cmd.cmds[0].deleted_text)
+        self.undo.seal()
+        self._cursor_moved()
+
+    def paste(self):
+        text = QApplication.clipboard().text()
+        if text:
+            self.paste_text(text)
+
+    def paste_text(self, text: str):
+        # one undo step per paste, at every caret or over the selection
+        if self.read_only:
+            return
+        self.undo.seal()
+        self._clear_highlight()
+        if self.carets:
+            self._edit_carets(lambda c: (c, c), text)
+        else:
+            start, end = self.selection() or (self.cursor, self.cursor)
+            self._replace_range(start, end, text)
+        self.undo.seal()
+
+    def _on_buffer_changed(self, row: int, removed: int, added: int):
+        self.advances.invalidate(row, removed, added)
+        shifted = removed != added
+        if self.wrap is not None:
+            shifted = self.wrap.invalidate(row, removed, added)
+        if not shifted:
+            self.update(self._rows_rect(row, row + added - 1))
+        else:
+            # line (or visual row) count changed: every row below shifts
+            self.update(QRect(0, self._row_y(row), self.width(), self.height()))
+
+    def wheelEvent(self, e):
+        # 120 units per notch -> 3 rows
+        self.scroll_to(self.scroll_row - e.angleDelta().y() // 40)
+
     # -------- public API for main window --------
     def set_text(self, text: str):
-        self.buf.set_text(text)
+        self.set_lines(split_lines(text))
+
+    def set_lines(self, lines, fmt: Optional[TextFormat] = None):
+        self.stop_follow(resume=False)
+        self.line_index.reset()     # counted once below, not line by line from the change
+        self.buf.set_lines(lines, fmt)
+        self._close_mapped()
+        if self.soft_wrap and self.wrap is None:
+            self._relayout()
         self.cursor = Cursor(0, 0)
+        self.carets = []
+        self.anchor = None
+        self.scroll_row = 0
         self.undo.clear()
+        self._rebuild_line_index()
+        self._caret_rect = self._cursor_rect()
         self.update()
 
     def get_text(self) -> str:
         return self.buf.get_text()
 
     def open_file(self, path: str):
-        with open(path, "r", encoding="utf-8") as f:
-            self.set_text(f.read())
+        if self._try_open_mapped(path):
+            return
+        lines, fmt, size = read_document_sized(path)
+        self.set_lines(lines, fmt)
+        self.doc.mark_saved()
+        self.doc.disk_size = size
+        self.syntax.set_lexer(lexer_for_path(path))
+        if not self.persistent_undo and self.recovery_dir is None:
+            return
+        content_hash = text_hash(self.buf.iter_chunks())
+        if self.persistent_undo:
+            self.undo.attach_journal(UndoJournal.open(path, content_hash))
+        self._attach_recovery(self.doc, path, content_hash)
+
+    def set_persistent_undo(self, on: bool):
+        # takes effect from the next open/save
+        self.persistent_undo = on
+        if not on:
+            self.undo.detach_journal()
+
+    def _checkpoint_undo(self, doc: Document, path: str, content_hash: str, history):
+        # history must match what was saved; mapped files are not journaled
+        if not self.persistent_undo or doc.mapped is not None:
+            return
+        journal = doc.undo.journal
+        if journal is None or journal.doc_path != os.path.abspath(path):
+            doc.undo.attach_journal(UndoJournal.create(path))
+        doc.undo.checkpoint(content_hash, history)
+
+    # -------- crash recovery --------
+    def _attach_recovery(self, doc: Document, path: str, content_hash: str) -> int:
+        # start logging doc's edits; replays what a crashed session left, returns that count
+        if self.recovery_dir is None or doc.mapped is not None:
+            return 0
+        try:
+            log, records = RecoveryLog.open(self.recovery_dir, path, content_hash)
+        except OSError:
+            return 0
+        if not records:
+            doc.undo.attach_recovery(log)
+            return 0
+        # replayed first: with the log attached the recovered edits would be logged twice
+        cursor = replay(doc.buf, doc.undo, records)
+        doc.undo.attach_recovery(log)
+        if doc is self.doc:
+            self.cursor = cursor
+            self._cursor_moved()
+        else:
+            doc.cursor = cursor
+        return len(records)
+
+    def _recovery_mark(self) -> int:
+        # log position of the content about to be saved
+        log = self.undo.recovery
+        return log.size if log is not None else 0
+
+    def _rebase_recovery(self, doc: Document, path: str, content_hash: str, mark: int):
+        # saved: the file is the new base, only edits made after the snapshot stay in the log
+        if self.recovery_dir is None or doc.mapped is not None or doc.buf is None:
+            return
+        log = doc.undo.recovery
+        if log is None:
+            doc.undo.attach_recovery(RecoveryLog(self.recovery_dir, path, content_hash))
+        else:
+            log.rebase(path, content_hash, mark)
+
+    def sync_recovery(self):
+        # fsync the active document's log (batched: typing only writes)
+        if self.undo.recovery is not None:
+            self.undo.recovery.sync()
+
+    def _try_open_mapped(self, path: str) -> bool:
+        # large files in a b"\n"-delimited encoding are memory-mapped
+        if os.path.getsize(path) < LARGE_FILE_BYTES:
+            return False
+        fmt, skip = sniff_format(path)
+        if not fmt.ascii_compatible:
+            return False
+        self.open_large_file(path, fmt, skip)
+        return True
+
+    def open_large_file(self, path: str, fmt: Optional[TextFormat] = None, skip: int = 0):
+        if fmt is None:
+            fmt, skip = sniff_format(path)
+        self.stop_follow(resume=False)
+        old = self.mapped
+        self.mapped = self.doc.mapped = MappedFile(path, fmt.encoding, skip)
+        self.wrap = None
+        self.mapped.start_indexing()
+        self.line_index.reset()     # the change below must not decode every mapped line
+        # lexing a mapped file from the top would page it all in; set first so the
+        # change below allocates no per-line states
+        self.syntax.set_lexer(Lexer())
+        self.buf.set_source(self.mapped, self.mapped.line_count, fmt)
+        self._rebuild_line_index()
+        self.cursor = Cursor(0, 0)
+        self.carets = []
+        self.anchor = None
+        self.scroll_row = 0
+        self.undo.clear()
+        self._caret_rect = self._cursor_rect()
+        self.doc.mark_saved()
+        self.doc.disk_size = self.mapped.size
+        if old is not None:
+            old.close()
+
+        self.read_only = not self.mapped.done
+        if self.read_only:
+            self._index_timer.start(100)
+        self.loadProgress.emit(self.mapped.line_count, self.mapped.done)
+        self.update()
+
+    def _poll_index(self):
+        m = self.mapped
+        if m is None:
+            self._index_timer.stop()
+            return
+        done = m.done
+        count = m.line_count
+        if count != len(self.buf.lines):
+            self.buf.set_source(m, count)
+        if done:
+            self._index_timer.stop()
+            self.read_only = False
+        self.loadProgress.emit(count, done)
+
+    def _close_mapped(self):
+        self._index_timer.stop()
+        self.read_only = False
+        if self.mapped is None:
+            return
+        # only this document's jobs read the mapped lines (through its snapshots);
+        # other tabs' saves keep running without blocking the UI
+        doc = self.doc
+        for kind in ("find", "replace_all", "copy"):
+            self.workers.cancel(kind, owner=doc)
+        for kind in ("find", "replace_all", "copy", "save"):
+            self.workers.wait(kind, owner=doc)
+        self.mapped.close()
+        self.mapped = self.doc.mapped = None
 
     def save_file(self, path: str):
-        with open(path, "w", encoding="utf-8", newline="\n") as f:
-            f.write(self.get_text())
+        h = hashlib.sha1()
+        fmt = self.buf.format
+        mark = self._recovery_mark()
+        write_atomic(path, hashed_chunks(self.buf.iter_chunks(), h),
+                     encoding=fmt.encoding, newline=fmt.newline, bom=fmt.bom)
+        self.doc.mark_saved()
+        self.doc.disk_size = os.path.getsize(path)
+        self._set_path(self.doc, path)
+        # sealed like save_file_async: typing must not merge into a command the journal just wrote
+        self.undo.seal()
+        self._checkpoint_undo(self.doc, path, h.hexdigest(), self.undo.history())
+        self._rebase_recovery(self.doc, path, h.hexdigest(), mark)
+
+    # -------- follow mode --------
+    def is_following(self) -> bool:
+        return self.follower is not None
+
+    def start_follow(self):
+        # append whatever gets written to the file from now on
+        doc = self.doc
+        if self.follower is not None:
+            return
+        if doc.path is None or doc.disk_size is None:
+            raise RuntimeError("the document has not been read from or saved to a file")
+        if doc.is_modified():
+            raise RuntimeError("save or discard the changes first")
+        if self.read_only:
+            raise RuntimeError("the file is still being indexed")
+        self.follower = FileFollower(doc.path, self.buf.format, doc.disk_size)
+        self._follow_dropped = False
+        self.clear_carets()
+        self.clear_selection()
+        self.undo.clear()
+        self.read_only = True
+        last = len(self.buf.lines) - 1
+        self.cursor = Cursor(last, len(self.buf.lines[last]))
+        self._cursor_moved()
+        self._follow_timer.start(FOLLOW_POLL_MS)
+        self._poll_follow()
+
+    def stop_follow(self, resume: bool = True):
+        # resume=False: the text is about to be replaced anyway
+        if self.follower is None:
+            return
+        self._follow_timer.stop()
+        # with lines dropped the text no longer mirrors the file
+        self.doc.disk_size = None if self._follow_dropped else self.follower.offset
+        self.follower = None
+        self.read_only = False
+        if resume and not self._follow_dropped:
+            self._resume_history(self.doc)
+
+    def _resume_history(self, doc: Document):
+        # start_follow dropped the undo journal and recovery log; edits from here on
+        # are logged against the file content followed so far
+        # (with dropped lines there is no file content to recover onto)
+        if doc.mapped is not None or (not self.persistent_undo and self.recovery_dir is None):
+            return
+        content_hash = text_hash(doc.buf.iter_chunks())
+        if self.persistent_undo:
+            doc.undo.attach_journal(UndoJournal.open(doc.path, content_hash))
+        self._rebase_recovery(doc, doc.path, content_hash, 0)
+
+    def _poll_follow(self):
+        f = self.follower
+        if f is None:
+            return
+        try:
+            text, restarted = f.poll()
+        except OSError as e:
+            path = f.path
+            self.stop_follow()
+            self.taskFinished.emit("follow", path, str(e) or type(e).__name__)
+            return
+        if not text and not restarted:
+            return
+
+        last = len(self.buf.lines) - 1
+        at_end = self.cursor.row == last and self.cursor.col == len(self.buf.lines[last])
+        if restarted:
+            # truncated or replaced: start over from its first byte
+            self._close_mapped()
+            self.read_only = True
+            self._follow_dropped = False
+            self.anchor = None
+            self.buf.set_lines([""])
+            self.cursor = Cursor(0, 0)
+            self.scroll_row = 0
+            self._clear_highlight()
+        before = len(self.buf.lines)
+        self.buf.append_text(text)
+        added = len(self.buf.lines) - before
+        extra = len(self.buf.lines) - self.follow_max_lines
+        if self.follow_max_lines and extra > 0:
+            self._drop_head(extra)
+        self.doc.mark_saved()
+
+        if at_end or restarted:
+            last = len(self.buf.lines) - 1
+            self.cursor = Cursor(last, len(self.buf.lines[last]))
+            self._cursor_moved()
+        if f.pending:
+            # more than one read's worth is waiting: keep going without the poll delay
+            QTimer.singleShot(0, self._poll_follow)
+        self.followUpdated.emit(added, len(self.buf.lines))
+
+    def _drop_head(self, count: int):
+        # drop the oldest lines, keeping the view and cursor on the same text
+        dropped_v = self._visual_row(count)
+        self.buf.drop_head(count)
+        self._follow_dropped = True
+        self._clear_highlight()
+        self.anchor = None
+        if self.cursor.row >= count:
+            self.cursor = Cursor(self.cursor.row - count, self.cursor.col)
+        else:
+            self.cursor = Cursor(0, 0)
+        self.scroll_row = max(0, self.scroll_row - dropped_v)
+        self._caret_rect = self._cursor_rect()
+        self.update()
+
+    # -------- documents (tabs) --------
+    def store_document(self) -> Document:
+        # write the widget's per-document state back into self.doc
+        doc = self.doc
+        doc.cursor = self.cursor.copy()
+        doc.scroll_row = self._top_row()
+        return doc
+
+    def set_document(self, doc: Document):
+        # show another (resident) document; find/replace results for the old one are dropped
+        if doc is self.doc:
+            return
+        self.workers.cancel("find")
+        self.workers.cancel("replace_all")
+        self.stop_follow()
+        self.sync_recovery()
+        self.store_document()
+        self._index_timer.stop()
+        self.buf.remove_listener(self._on_buffer_changed)
+        self.search.detach()
+        self.syntax.detach()
+        self.line_index.detach()
+
+        self.doc = doc
+        self.buf = doc.buf
+        self.undo = doc.undo
+        self.cursor = self.buf.clamp_cursor(doc.cursor.copy())
+        self.carets = []
+        self.anchor = None
+        self.mapped = doc.mapped
+        self.buf.add_listener(self._on_buffer_changed)
+        self.search = SearchIndex(self.buf)
+        self.syntax = Highlighter(self.buf, Lexer() if self.mapped is not None else lexer_for_path(doc.path))
+        self.line_index = LineIndex(self.buf)
+        self._rebuild_line_index()
+        self.advances.clear()
+        self._relayout()
+        self.scroll_row = self._visual_row(min(doc.scroll_row, len(self.buf.lines) - 1))
+        self.highlight_pos = None
+        self.highlight_len = 0
+
+        self.read_only = self.mapped is not None and not self.mapped.done
+        if self.read_only:
+            self._index_timer.start(100)
+        self._caret_rect = self._cursor_rect()
+        self.update()
+
+    def _set_path(self, doc: Document, path: str):
+        # save as: a new extension may mean a different language
+        if doc.path != path:
+            doc.path = path
+            if doc is self.doc and self.mapped is None:
+                self.syntax.set_lexer(lexer_for_path(path))
+
+    # -------- line index / go to --------
+    def _rebuild_line_index(self):
+        # whole-document count: inline for small documents, else on a snapshot in a worker
+        index = self.line_index
+        index.reset()
+        self.workers.cancel("stats")
+        if self.mapped is not None or len(self.buf.lines) <= LINE_INDEX_SYNC_LINES:
+            # a mapped file would be decoded in full: it only reports its line count
+            if self.mapped is None:
+                index.build()
+            self.cursorMoved.emit()
+            return
+        snap = self.buf.snapshot()
+
+        def done(result, error):
+            if error or index is not self.line_index:
+                return
+            if snap.version != self.buf.version:
+                self._rebuild_line_index()
+                return
+            index.adopt(result)
+            self.cursorMoved.emit()
+
+        # no progress signal: this runs after every open and tab switch
+        self.workers.submit("stats", _build_line_index, snap.as_buffer(), on_done=done, owner=self.doc)
+
+    def goto_line(self, line: int, col: int = 1):
+        # 1-based, clamped to the document
+        row = max(0, min(line - 1, len(self.buf.lines) - 1))
+        self._goto(self.buf.clamp_cursor(Cursor(row, max(0, col - 1))))
+
+    def goto_offset(self, offset: int) -> bool:
+        # character offset (a line break counts as one); False while the index is being built
+        if not self.line_index.ready:
+            return False
+        self._goto(self.line_index.cursor_at(offset))
+        return True
+
+    def _goto(self, c: Cursor):
+        self.undo.seal()
+        self.clear_carets()
+        self.clear_selection()
+        self._clear_highlight()
+        self.cursor = c
+        self._cursor_moved()
+
+    def is_modified(self) -> bool:
+        return self.doc.is_modified()
+
+    # -------- background jobs --------
+    def _submit(self, kind: str, fn, *args, on_done):
+        # jobs belong to the active document (see _close_mapped)
+        return self.workers.submit(kind, fn, *args, on_done=on_done,
+                                   on_progress=lambda done, total: self.taskProgress.emit(kind, done, total),
+                                   owner=self.doc)
+
+    def _restart(self, kind: str, fn, *args, on_done):
+        # one job per kind: a new request replaces the running one
+        self.workers.cancel(kind)
+        return self._submit(kind, fn, *args, on_done=on_done)
+
+    def is_busy(self, kind: Optional[str] = None) -> bool:
+        return self.workers.running(kind)
+
+    def cancel_tasks(self):
+        self.workers.cancel()
+
+    def wait_tasks(self):
+        # block until running jobs leave their threads (before closing what they read)
+        self.workers.wait()
+
+    def open_file_async(self, path: str):
+        # read + decode in a worker, swap the buffer in here
+        if self._try_open_mapped(path):   # indexes in the background already
+            self.taskFinished.emit("open", path, "")
+            return
+
+        doc = self.doc
+
+        def done(result, error):
+            # the tab may have been switched away (or closed) meanwhile
+            recovered = 0
+            if not error and doc.resident:
+                lines, fmt, content_hash, size = result
+                if doc is self.doc:
+                    self.set_lines(lines, fmt)
+                    self.syntax.set_lexer(lexer_for_path(path))
+                else:
+                    doc.buf.set_lines(lines, fmt)
+                    doc.undo.clear()
+                    doc.cursor = Cursor(0, 0)
+                    doc.scroll_row = 0
+                doc.mark_saved()
+                doc.disk_size = size
+                if self.persistent_undo:
+                    doc.undo.attach_journal(UndoJournal.open(path, content_hash))
+                recovered = self._attach_recovery(doc, path, content_hash)
+            self.taskFinished.emit("open", path, error)
+            if recovered:
+                self.taskFinished.emit("recover", (path, recovered), "")
+
+        self._restart("open", _read_document, path, on_done=done)
+
+    def is_saving(self) -> bool:
+        return self.workers.running("save")
+
+    def save_file_async(self, path: str):
+        # stream a snapshot from a worker thread
+        if self.is_saving():
+            raise RuntimeError("a save is already running")
+        snap = self.buf.snapshot()
+        # history as of this content; sealed so later typing can't merge into it
+        self.undo.seal()
+        history = self.undo.history()
+        mark = self._recovery_mark()
+
+        doc = self.doc
+
+        def done(result, error):
+            if not error:
+                content_hash, doc.disk_size = result
+                doc.mark_saved(snap.version)
+                self._set_path(doc, path)
+                self._checkpoint_undo(doc, path, content_hash, history)
+                self._rebase_recovery(doc, path, content_hash, mark)
+            self.taskFinished.emit("save", path, error)
+
+        self._submit("save", _write_snapshot, path, snap, self.buf.format, on_done=done)
 
     def do_undo(self):
+        if self.read_only:
+            return
+        self.clear_carets()
+        self.clear_selection()
         self.cursor = self.undo.undo(self.buf, self.cursor)
         self.cursor = self.buf.clamp_cursor(self.cursor)
-        self.update()
+        self._cursor_moved()
 
     def do_redo(self):
+        if self.read_only:
+            return
+        self.clear_carets()
+        self.clear_selection()
         self.cursor = self.undo.redo(self.buf, self.cursor)
         self.cursor = self.buf.clamp_cursor(self.cursor)
-        self.update()
+        self._cursor_moved()
 
     def set_find_replace(self, query: str, repl: str):
         self.find_query = query
         self.replace_text = repl
 
+    def set_search_options(self, opts: SearchOptions):
+        self.search_opts = opts
+
+    def _sync_search(self):
+        # may raise re.error for a bad regex
+        if self.search.query != self.find_query or self.search.opts != self.search_opts:
+            self.search.set_query(self.find_query, self.search_opts)
+            self.update()  # all-match highlights changed
+
+    def _select_match(self, start: Cursor, end: Cursor):
+        # highlight the match, cursor goes to its end
+        if start.row == end.row:
+            self.highlight_pos = start.copy()
+            self.highlight_len = end.col - start.col
+            self._update_highlight()
+        self.cursor = end.copy()
+
     def find_next(self):
+        self.undo.seal()
+        self._clear_highlight()
+        self._sync_search()
         if not self.find_query:
-            self.highlight_pos = None
-            self.highlight_len = 0
-            self.update()
             return
         
-        found = self.buf.find_next(self.find_query, self.cursor)
+        if self.search.indexed:
+            m = self.search.next_after(self.cursor)
+            found = None if m is None else (Cursor(m[0], m[1]), Cursor(m[0], m[2]))
+        else:
+            found = self.buf.find_match(self.find_query, self.cursor, self.search_opts)
         if found is not None:
-            self.cursor = found
-            self.highlight_pos = found.copy()
-            self.highlight_len = len(self.find_query)
-            self.highlight_pos.col = self.highlight_pos.col - self.highlight_len
+            self._select_match(*found)
+
+        self._cursor_moved()
+
+    def find_next_async(self):
+        self._find_async(forward=True)
+
+    def find_prev_async(self):
+        self._find_async(forward=False)
+
+    def _find_async(self, forward: bool):
+        # index (or window-search) a snapshot in a worker, then move here;
+        # a result computed on an older buffer version is thrown away and redone
+        query, opts = self.find_query, self.search_opts
+        step = self.find_next if forward else self.find_prev
+        if query and not opts.literal:
+            compile_pattern(query, opts)   # a bad regex raises here, not in the worker
+        multi = is_multiline(query, opts)
+        if not query or (multi and not forward) or (not multi and self.search.is_current(query, opts)):
+            step()
+            self.taskFinished.emit("find", self.match_count(), "")
+            return
+
+        snap = self.buf.snapshot()
+
+        def done(result, error):
+            if not error:
+                if snap.version != self.buf.version:
+                    self._find_async(forward)
+                    return
+                if multi:
+                    self.undo.seal()
+                    self._clear_highlight()
+                    self._sync_search()
+                    if result is not None:
+                        self._select_match(*result)
+                    self._cursor_moved()
+                else:
+                    self.search.adopt(result)
+                    self.update()
+                    step()
+            self.taskFinished.emit("find", self.match_count(), error)
+
+        if multi:
+            self._restart("find", _find_match, snap.as_buffer(), query, self.cursor.copy(), opts, on_done=done)
         else:
-            self.highlight_pos = None
-            self.highlight_len = 0
+            self._restart("find", _build_index, snap.as_buffer(), query, opts, on_done=done)
 
-        self.update()
+    def find_prev(self):
+        self.undo.seal()
+        start = self.highlight_pos if self.highlight_pos is not None else self.cursor
+        self._clear_highlight()
+        self._sync_search()
+        if not self.find_query or not self.search.indexed:
+            return
+
+        m = self.search.prev_before(start)
+        if m is not None:
+            self._select_match(Cursor(m[0], m[1]), Cursor(m[0], m[2]))
+
+        self._cursor_moved()
+
+    def match_count(self) -> Optional[int]:
+        # None for multi-line patterns (not indexed)
+        return self.search.count if self.search.indexed else None
 
     def replace_next(self):
         q = self.find_query
         r = self.replace_text
-        if not q:
+        if not q or self.read_only:
             return
 
-        if not self.buf.replace_at(self.cursor, q, r):
-            found = self.buf.find_next(q, self.buf.move_right(self.cursor))
-            if found is None:
-                return
-            self.cursor = found
-            found.col = found.col - len(q)
-
-            if not self.buf.replace_at(self.cursor, q, r):
-                self.update()
-                return
-
-        start = self.cursor.copy()
-        end = Cursor(self.cursor.row, self.cursor.col + len(q))
-        deleted = q
+        # the highlighted match (after find) or the next match from the cursor
+        at = self.highlight_pos if self.highlight_pos is not None else self.cursor
+        self._clear_highlight()
+        found = self.buf.next_replacement(at, q, r, self.search_opts)
+        if found is None:
+            self._cursor_moved()
+            return
 
-        self.buf.replace_at(self.cursor, r, q)  # revert
+        start, end, text = found
+        deleted = self.buf.get_range(start, end)
         self.cursor = self.undo.push_and_do(DeleteCommand(start, end, deleted), self.buf, self.cursor)
-        self.cursor = self.undo.push_and_do(InsertCommand(start, r), self.buf, self.cursor)
+        self.cursor = self.undo.push_and_do(InsertCommand(start, text), self.buf, self.cursor)
+        self.undo.seal()
 
-        self.update()
+        self._cursor_moved()
 
-    def replace_all(self, max_ops: int = 100000):
+    def replace_all(self) -> int:
+        # single pass, one undo step; returns the number of replacements
         q = self.find_query
         r = self.replace_text
-        if not q:
-            return
+        if not q or self.read_only:
+            return 0
 
-        c = Cursor(0, 0)
-        ops = 0
-        while ops < max_ops:
-            found = self.buf.find_next(q, c)
-            if found is None:
-                break
-            start = found
-            end = Cursor(found.row, found.col + len(q))
+        edits, count = self.buf.plan_replace_all(q, r, self.search_opts)
+        self._apply_replace_all(edits, count)
+        return count
 
-            self.cursor = self.undo.push_and_do(DeleteCommand(start, end, q), self.buf, self.cursor)
-            self.cursor = self.undo.push_and_do(InsertCommand(start, r), self.buf, self.cursor)
+    def _apply_replace_all(self, edits, count: int):
+        if count:
+            cmd = ReplaceLinesCommand(edits)
+            self.cursor = self.undo.push_and_do(cmd, self.buf, self.cursor)
+            self.undo.seal()
 
-            c = Cursor(start.row, start.col + len(r))
-            ops += 1
+        self._clear_highlight()
+        self._cursor_moved()
 
-        self.cursor = self.buf.clamp_cursor(self.cursor)
+    def replace_all_async(self):
+        # plan on a snapshot in a worker, apply as one undo step here
+        q = self.find_query
+        r = self.replace_text
+        opts = self.search_opts
+        if not q or self.read_only:
+            self.taskFinished.emit("replace_all", 0, "")
+            return
+        if not opts.literal:
+            compile_pattern(q, opts)
 
-        self.highlight_pos = None
-        self.highlight_len = 0
+        snap = self.buf.snapshot()
 
-        self.update()
+        def done(result, error):
+            count = 0
+            if not error:
+                if snap.version != self.buf.version:
+                    # edited while planning: rows may have moved
+                    self.replace_all_async()
+                    return
+                edits, count = result
+                self._apply_replace_all(edits, count)
+            self.taskFinished.emit("replace_all", count, error)
+
+        self._restart("replace_all", _plan_replace_all, snap.as_buffer(), q, r, opts, on_done=done)
 
 
     # rendering
-    def paintEvent(self, _):
+    def paintEvent(self, e):
         painter = QPainter(self)
         painter.setFont(self.font)
 
-        rect = self.rect()
+        rect = e.rect()
         painter.fillRect(rect, self.palette().base())
 
-        x0 = self.padding
-        y0 = self.padding + self.fm.ascent()
+        ascent = self.fm.ascent()
+
+        # only rows intersecting the dirty rect
+        top_v = self.scroll_row + max(0, (rect.top() - self.padding) // self.line_h)
+        bottom_v = self.scroll_row + (rect.bottom() - self.padding) // self.line_h
+        wrap = self.wrap
+        if wrap is None:
+            first = top_v
+            last = min(len(self.buf.lines) - 1, bottom_v)
+        else:
+            first = wrap.locate(top_v)[0]
+            last = wrap.locate(bottom_v)[0]
+
+        # all matches of the current query in view
+        if self.search.indexed:
+            hit_color = QColor(self.palette().highlight().color())
+            hit_color.setAlpha(70)
+            for row, col, end in self.search.matches(first, last):
+                for r in self._span_rects(row, self.buf.lines[row], col, end):
+                    painter.fillRect(r, hit_color)
+
+        # selection; a selected line break shows as a half-cell past the line end
+        sel = self.selection()
+        if sel is not None and sel[0].row <= last and sel[1].row >= first:
+            start, end = sel
+            sel_brush = self.palette().highlight()
+            for row in range(max(first, start.row), min(last, end.row) + 1):
+                line = self.buf.lines[row]
+                a = start.col if row == start.row else 0
+                b = end.col if row == end.row else len(line)
+                if a < b:
+                    for r in self._span_rects(row, line, a, b):
+                        painter.fillRect(r, sel_brush)
+                if row < end.row:
+                    vrow, x = self._cursor_visual(Cursor(row, len(line)))
+                    y = self.padding + (vrow - self.scroll_row) * self.line_h
+                    painter.fillRect(QRect(self.padding + x, y, max(2, self.char_w // 2), self.line_h), sel_brush)
 
         # draw highlight
         if self.highlight_pos is not None and self.highlight_len > 0:
@@ -177,33 +1214,118 @@ class EditorWidget(QWidget):
             start_col = max(0, min(hp.col, len(line)))
             end_col = max(0, min(hp.col + self.highlight_len, len(line)))
 
-            if end_col > start_col:
-                prefix = line[:start_col]
-                marked = line[start_col:end_col]
+            if end_col > start_col and first <= row <= last:
+                for highlight_rect in self._span_rects(row, line, start_col, end_col):
+                    painter.fillRect(highlight_rect, self.palette().highlight())
 
-                hx = x0 + self.fm.horizontalAdvance(prefix)
-                hw = self.fm.horizontalAdvance(marked)
-                hy = self.padding + row*self.line_h
-                
-                highlight_rect = QRect(hx, hy, max(1,hw), self.line_h)
-                painter.fillRect(highlight_rect, self.palette().highlight())
-
-        # draw lines
-        for i, line in enumerate(self.buf.lines):
-            y = y0 + i * self.line_h
-            painter.drawText(x0, y, line)
+        # draw lines; lexer states only as far as the bottom of the view
+        syntax = self.syntax
+        if not syntax.lexer.stateless:
+            bottom = self.scroll_row + self.visible_row_count()
+            view_last = min(len(self.buf.lines) - 1, bottom) if wrap is None else wrap.locate(bottom)[0]
+            view_last = max(last, view_last)
+            changed = syntax.ensure(view_last)
+            if changed > last:
+                # an edit here reopened/closed a block below the repainted rows
+                self.update(self._rows_rect(last + 1, min(changed, view_last)))
+        text_pen = self.palette().text().color()
+        pens = self._syntax_pens
+        y = self._row_y(first) + ascent
+        for i, line in enumerate(self.buf.iter_lines(first), first):
+            if i > last:
+                break
+            starts = wrap.breaks(i, line) if wrap is not None else (0,)
+            tokens = syntax.tokens(i, line) if line else ()
+            if not tokens:
+                self._draw_run(painter, i, line, 0, len(line), starts, y)
+            else:
+                pos = 0
+                for start, end, kind in tokens:
+                    if start > pos:
+                        painter.setPen(text_pen)
+                        self._draw_run(painter, i, line, pos, start, starts, y)
+                    painter.setPen(pens[kind])
+                    self._draw_run(painter, i, line, start, end, starts, y)
+                    pos = end
+                painter.setPen(text_pen)
+                if pos < len(line):
+                    self._draw_run(painter, i, line, pos, len(line), starts, y)
+            y += len(starts) * self.line_h
 
         # draw cursor
         if self.hasFocus() and self._cursor_visible:
-            cx = x0 + self.fm.horizontalAdvance(self.buf.lines[self.cursor.row][:self.cursor.col])
-            cy_top = self.padding + self.cursor.row * self.line_h
-            cursor_rect = QRect(cx, cy_top, max(2, self.char_w // 10 + 1), self.line_h)
-            painter.fillRect(cursor_rect, self.palette().text())
+            for c in [self.cursor, *self.carets]:
+                if first <= c.row <= last:
+                    painter.fillRect(self._cursor_rect(c), self.palette().text())
 
         painter.end()
 
+    def _draw_run(self, painter: QPainter, row: int, line: str, start: int, end: int, starts, y: int):
+        # line[start:end] at baseline y of row's first visual row, split at wrap points
+        adv = self.advances
+        for sub, s in enumerate(starts):
+            e = starts[sub + 1] if sub + 1 < len(starts) else len(line)
+            a, b = max(start, s), min(end, e)
+            if a < b:
+                painter.drawText(self.padding + adv.width(row, line, s, a), y + sub * self.line_h, line[a:b])
+
+    def _span_rects(self, row: int, line: str, start: int, end: int) -> List[QRect]:
+        # one rect per visual row covered by line[start:end]
+        adv = self.advances
+        y = self._row_y(row)
+        if self.wrap is None:
+            return [QRect(self.padding + adv.x(row, line, start), y, max(1, adv.width(row, line, start, end)), self.line_h)]
+        rects = []
+        starts = self.wrap.breaks(row, line)
+        for sub, s in enumerate(starts):
+            e = starts[sub + 1] if sub + 1 < len(starts) else len(line)
+            a, b = max(start, s), min(end, e)
+            if a < b:
+                rects.append(QRect(self.padding + adv.width(row, line, s, a), y + sub * self.line_h,
+                                   max(1, adv.width(row, line, a, b)), self.line_h))
+        return rects
+
 
     # input handling
+    @staticmethod
+    def _typed_text(e: QKeyEvent) -> str:
+        # text the key inserts, "" for shortcuts and control keys; the same for every caret mode
+        if e.modifiers() not in (Qt.KeyboardModifier.NoModifier, Qt.KeyboardModifier.ShiftModifier):
+            return ""
+        text = e.text()
+        return text if is_insertable(text) else ""
+
+    def _multi_caret_key(self, e: QKeyEvent) -> bool:
+        # keys applied at every caret; False if the key is single-caret only
+        key = e.key()
+        moves = {
+            Qt.Key.Key_Left: self.buf.move_left,
+            Qt.Key.Key_Right: self.buf.move_right,
+            Qt.Key.Key_Up: lambda c: self._move_vertical(c, -1),
+            Qt.Key.Key_Down: lambda c: self._move_vertical(c, 1),
+            Qt.Key.Key_Home: lambda c: Cursor(c.row, 0),
+            Qt.Key.Key_End: lambda c: Cursor(c.row, len(self.buf.lines[c.row])),
+        }
+        if key in moves:
+            self.undo.seal()
+            self._clear_highlight()
+            self._move_carets(moves[key])
+            return True
+        if self.read_only:
+            return False
+        if key == Qt.Key.Key_Backspace:
+            self._clear_highlight()
+            self._edit_carets(self._backspace_span, "")
+            return True
+        if key in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+            self._edit_carets(lambda c: (c, c), "\n")
+            return True
+        text = self._typed_text(e)
+        if text:
+            self._edit_carets(lambda c: (c, c), text)
+            return True
+        return False
+
     def keyPressEvent(self, e: QKeyEvent):
         key = e.key()
         mods = e.modifiers()
@@ -216,8 +1338,24 @@ class EditorWidget(QWidget):
             if key == Qt.Key.Key_Y:
                 self.do_redo()
                 return
+            if mods & Qt.KeyboardModifier.AltModifier and key in (Qt.Key.Key_Up, Qt.Key.Key_Down):
+                self.add_caret(-1 if key == Qt.Key.Key_Up else 1)
+                return
 
-        if key == Qt.Key.Key_Backspace:
+        if self.carets:
+            if self._multi_caret_key(e):
+                return
+            # anything else continues with the primary caret only
+            self.clear_carets()
+
+        sel = self.selection()
+        if sel is not None and not self.read_only and key in (Qt.Key.Key_Backspace, Qt.Key.Key_Delete):
+            self._clear_highlight()
+            self.undo.seal()
+            self._replace_range(*sel, "")
+            return
+
+        if key == Qt.Key.Key_Backspace and not self.read_only:
             old = self.cursor.copy()
             new_cursor, deleted = self.buf.backspace_at(self.cursor, self.highlight_pos, self.highlight_len)
             if deleted:
@@ -232,55 +1370,80 @@ class EditorWidget(QWidget):
             else:
                 self.cursor = new_cursor
 
-            self.highlight_pos = None
-            self.highlight_len = 0
+            self._clear_highlight()
 
             self.cursor = self.buf.clamp_cursor(self.cursor)
-            self.update()
+            self._cursor_moved()
             return
 
-        self.highlight_pos = None
-        self.highlight_len = 0
+        self._clear_highlight()
 
         # navigation
+        if key in (Qt.Key.Key_Left, Qt.Key.Key_Right, Qt.Key.Key_Up, Qt.Key.Key_Down,
+                   Qt.Key.Key_Home, Qt.Key.Key_End, Qt.Key.Key_PageUp, Qt.Key.Key_PageDown):
+            self.undo.seal()
+            self._extend_selection(bool(mods & Qt.KeyboardModifier.ShiftModifier))
         if key == Qt.Key.Key_Left:
             self.cursor = self.buf.move_left(self.cursor)
-            self.update()
+            self._cursor_moved()
             return
         if key == Qt.Key.Key_Right:
             self.cursor = self.buf.move_right(self.cursor)
-            self.update()
+            self._cursor_moved()
             return
         if key == Qt.Key.Key_Up:
-            self.cursor = self.buf.move_up(self.cursor)
-            self.update()
+            self.cursor = self._move_vertical(self.cursor, -1)
+            self._cursor_moved()
             return
         if key == Qt.Key.Key_Down:
-            self.cursor = self.buf.move_down(self.cursor)
-            self.update()
+            self.cursor = self._move_vertical(self.cursor, 1)
+            self._cursor_moved()
             return
         if key == Qt.Key.Key_Home:
             self.cursor = Cursor(self.cursor.row, 0)
-            self.update()
+            self._cursor_moved()
             return
         if key == Qt.Key.Key_End:
             self.cursor = Cursor(self.cursor.row, len(self.buf.lines[self.cursor.row]))
-            self.update()
+            self._cursor_moved()
+            return
+        if key in (Qt.Key.Key_PageUp, Qt.Key.Key_PageDown):
+            step = self.visible_row_count()
+            if key == Qt.Key.Key_PageUp:
+                step = -step
+            self.scroll_to(self.scroll_row + step)
+            self.cursor = self._move_vertical(self.cursor, step)
+            self._cursor_moved()
+            return
+
+        if self.read_only:
+            super().keyPressEvent(e)
             return
 
+        if sel is not None:
+            # typing over a selection replaces it
+            typed = "\n" if key in (Qt.Key.Key_Return, Qt.Key.Key_Enter) else self._typed_text(e)
+            if typed:
+                self.undo.seal()
+                self._replace_range(*sel, typed)
+                return
+
         if key in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
             cmd = InsertCommand(self.cursor, "\n")
             self.cursor = self.undo.push_and_do(cmd, self.buf, self.cursor)
             self.cursor = self.buf.clamp_cursor(self.cursor)
-            self.update()
+            self._cursor_moved()
             return
 
-        text = e.text()
-        if text and text not in ("\n", "\r") and (mods == Qt.KeyboardModifier.NoModifier or mods == Qt.KeyboardModifier.ShiftModifier):
+        text = self._typed_text(e)
+        if text:
             cmd = InsertCommand(self.cursor, text)
             self.cursor = self.undo.push_and_do(cmd, self.buf, self.cursor)
             self.cursor = self.buf.clamp_cursor(self.cursor)
-            self.update()
+            self._cursor_moved()
             return
 
         super().keyPressEvent(e)
+
+
+tracer.register(EditorWidget, ("keyPressEvent", "paintEvent"), "ui")
@@ -0,0 +1,64 @@
+from __future__ import annotations
+import os
+import shutil
+import tempfile
+from typing import Callable, Iterable, Optional
+
+
+def _read_umask() -> int:
+    # os.umask can only be read by setting it; done once at import, before any worker threads
+    old = os.umask(0)
+    os.umask(old)
+    return old
+
+
+# mode for newly created files, as open(path, "w") would give (mkstemp makes them 0600)
+NEW_FILE_MODE = 0o666 & ~_read_umask()
+
+
+def write_atomic(path: str, chunks: Iterable[str],
+                 progress: Optional[Callable[[int], None]] = None,
+                 encoding: str = "utf-8", newline: str = "\n", bom: bool = False) -> None:
+    """
+        chunks를 같은 폴더의 임시 파일에 스트리밍으로 쓰고 fsync 후 rename
+        - 중간에 실패해도 원본 파일은 그대로 남음
+        - progress(n): n개 chunk를 쓸 때마다 호출
+        - newline: "\\n"을 이 줄바꿈으로 바꿔 씀, bom: 맨 앞에 U+FEFF
+    """
+    path = os.path.abspath(path)
+    folder = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "w", encoding=encoding, newline=newline) as f:
+            if bom:
+                f.write("\ufeff")
+            for n, chunk in enumerate(chunks, 1):
+                f.write(chunk)
+                if progress is not None:
+                    progress(n)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp)
+        else:
+            os.chmod(tmp, NEW_FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    _fsync_dir(folder)
+
+
+def _fsync_dir(folder: str) -> None:
+    # make the rename itself durable (not supported on Windows)
+    try:
+        dfd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dfd)
+    except OSError:
+        pass
+    finally:
+        os.close(dfd)
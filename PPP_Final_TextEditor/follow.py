@@ -0,0 +1,75 @@
+from __future__ import annotations
+import codecs
+import os
+from typing import Optional, Tuple
+
+from textio import READ_BLOCK, TextFormat, detect_encoding, normalize_newlines
+
+
+class FileFollower:
+    """
+        커지는 파일(로그)의 뒤에 붙은 바이트만 읽어 텍스트로 돌려줌 (tail -f)
+        - stat으로 크기/inode만 보고, 커졌을 때만 열어서 offset부터 읽음
+        - 디코더 상태는 다음 poll로 넘김 (문자가 잘려도 안전)
+        - "\\r"로 끝나면 바로 줄바꿈으로 내보내고, 다음에 이어지는 "\\n"은 버림 (\\r\\n이 잘려도 한 줄)
+          처음 읽은 내용이 "\\r"로 끝났어도 같음
+        - 파일이 줄었거나 바뀌었으면(truncate, rotate) 처음부터 다시 읽음
+    """
+    def __init__(self, path: str, fmt: TextFormat, offset: int):
+        self.path = path
+        self.fmt = fmt
+        self.offset = offset
+        self._ino = self._inode()
+        self._decoder = codecs.getincrementaldecoder(fmt.encoding)(errors="replace")
+        self._after_cr = self._ends_with_cr(offset)     # a "\n" right at offset ends that line
+        self.pending = 0        # bytes known to be unread after the last poll
+
+    def _ends_with_cr(self, offset: int) -> bool:
+        # the text read so far (offset bytes) ends with "\r"
+        unit = len("\r".encode(self.fmt.encoding))
+        if offset < unit:
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset - unit)
+                return f.read(unit).decode(self.fmt.encoding, errors="replace") == "\r"
+        except OSError:
+            return False
+
+    def _inode(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_ino
+        except OSError:
+            return None
+
+    def poll(self, max_bytes: int = READ_BLOCK) -> Tuple[str, bool]:
+        # (new text with "\n" line endings, restarted); at most max_bytes per call
+        # raises OSError if the file is gone
+        st = os.stat(self.path)
+        restarted = False
+        if st.st_size < self.offset or (self._ino is not None and st.st_ino != self._ino):
+            self.offset = 0
+            self._ino = st.st_ino
+            self._decoder.reset()
+            self._after_cr = False
+            restarted = True
+        if st.st_size == self.offset:
+            self.pending = 0
+            return "", restarted
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(min(max_bytes, st.st_size - self.offset))
+        start = self.offset
+        self.offset += len(data)
+        self.pending = st.st_size - self.offset
+        if start == 0 and self.fmt.bom:
+            data = data[detect_encoding(data[:4])[1]:]
+        text = self._decoder.decode(data)
+        if text:
+            ends_cr = text.endswith("\r")
+            if self._after_cr and text.startswith("\n"):
+                # second half of a \r\n whose \r was already a line break
+                text = text[1:]
+            self._after_cr = ends_cr
+        return normalize_newlines(text), restarted
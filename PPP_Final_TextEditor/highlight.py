@@ -0,0 +1,246 @@
+from __future__ import annotations
+import builtins
+import keyword
+import os
+import re
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from core import TextBuffer
+
+
+# (start col, end col, kind); kinds: keyword, builtin, string, comment, number
+Token = Tuple[int, int, str]
+
+# a line's end state is unknown (never lexed, or edited since)
+HOLE = -1
+
+
+class Lexer:
+    """
+        한 줄 단위 토크나이저
+        - lex_line(line, state) -> (tokens, 줄 끝 상태), 상태는 0 이상 작은 정수
+        - 여러 줄에 걸치는 구문(블록 주석, 여러 줄 문자열)은 상태로 넘김
+        - stateless: 모든 줄이 상태 0에서 시작 (상태 캐시 불필요)
+    """
+    name = "Plain"
+    stateless = True
+
+    def lex_line(self, line: str, state: int) -> Tuple[List[Token], int]:
+        return [], 0
+
+
+class PythonLexer(Lexer):
+    name = "Python"
+    stateless = False
+
+    # states: 0 code, 1 inside \"\"\" string, 2 inside ''' string
+    _QUOTES = {1: '"""', 2: "'''"}
+    _TOKEN = re.compile(r"""
+        (?P<comment>\#.*)
+      | (?P<triple>[rRbBuUfF]{0,2}(?:\"\"\"|'''))
+      | (?P<string>[rRbBuUfF]{0,2}(?:"(?:[^"\\]|\\.)*"?|'(?:[^'\\]|\\.)*'?))
+      | (?P<number>\b\d[\d_]*(?:\.\d*)?(?:[eE][+-]?\d+)?[jJ]?\b)
+      | (?P<word>[A-Za-z_]\w*)
+    """, re.VERBOSE)
+    _KEYWORDS = frozenset(keyword.kwlist) | frozenset(getattr(keyword, "softkwlist", ()))
+    _BUILTINS = frozenset(n for n in dir(builtins) if not n.startswith("_"))
+
+    def lex_line(self, line: str, state: int) -> Tuple[List[Token], int]:
+        tokens: List[Token] = []
+        pos = 0
+        if state:
+            end = line.find(self._QUOTES[state])
+            if end == -1:
+                return [(0, len(line), "string")], state
+            pos = end + 3
+            tokens.append((0, pos, "string"))
+
+        search = self._TOKEN.search
+        while True:
+            m = search(line, pos)
+            if m is None:
+                return tokens, 0
+            kind = m.lastgroup
+            start, pos = m.span()
+            if kind == "triple":
+                quote = line[pos - 3:pos]
+                end = line.find(quote, pos)
+                if end == -1:
+                    tokens.append((start, len(line), "string"))
+                    return tokens, 1 if quote == '"""' else 2
+                pos = end + 3
+                tokens.append((start, pos, "string"))
+            elif kind == "word":
+                word = m.group()
+                if word in self._KEYWORDS:
+                    tokens.append((start, pos, "keyword"))
+                elif word in self._BUILTINS:
+                    tokens.append((start, pos, "builtin"))
+            else:
+                tokens.append((start, pos, kind))
+
+
+class CLikeLexer(Lexer):
+    name = "C-like"
+    stateless = False
+
+    # states: 0 code, 1 inside /* */
+    _TOKEN = re.compile(r"""
+        (?P<comment>//.*)
+      | (?P<block>/\*)
+      | (?P<string>@?"(?:[^"\\]|\\.)*"?|'(?:[^'\\]|\\.)*'?)
+      | (?P<number>\b(?:0[xX][0-9a-fA-F]+|\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)[uUlLfFdDmM]*\b)
+      | (?P<word>[A-Za-z_]\w*)
+    """, re.VERBOSE)
+    _KEYWORDS = frozenset("""
+        abstract as async await base bool break byte case catch char class const continue
+        default delegate do double else enum event explicit extern false final finally fixed
+        float for foreach function get goto if implicit import in int interface internal is
+        let lock long namespace new null object operator out override package params private
+        protected public readonly ref return sbyte sealed set short signed sizeof static
+        string struct switch this throw true try typedef typeof uint ulong unsigned using
+        var virtual void volatile while yield
+    """.split())
+
+    def lex_line(self, line: str, state: int) -> Tuple[List[Token], int]:
+        tokens: List[Token] = []
+        pos = 0
+        if state:
+            end = line.find("*/")
+            if end == -1:
+                return [(0, len(line), "comment")], 1
+            pos = end + 2
+            tokens.append((0, pos, "comment"))
+
+        search = self._TOKEN.search
+        while True:
+            m = search(line, pos)
+            if m is None:
+                return tokens, 0
+            kind = m.lastgroup
+            start, pos = m.span()
+            if kind == "block":
+                end = line.find("*/", pos)
+                if end == -1:
+                    tokens.append((start, len(line), "comment"))
+                    return tokens, 1
+                pos = end + 2
+                tokens.append((start, pos, "comment"))
+            elif kind == "word":
+                if m.group() in self._KEYWORDS:
+                    tokens.append((start, pos, "keyword"))
+            else:
+                tokens.append((start, pos, kind))
+
+
+LEXERS: Dict[str, type] = {
+    ".py": PythonLexer, ".pyw": PythonLexer,
+    ".c": CLikeLexer, ".h": CLikeLexer, ".cpp": CLikeLexer, ".hpp": CLikeLexer, ".cc": CLikeLexer,
+    ".cs": CLikeLexer, ".java": CLikeLexer, ".js": CLikeLexer, ".ts": CLikeLexer,
+}
+
+
+def lexer_for_path(path: Optional[str]) -> Lexer:
+    if not path:
+        return Lexer()
+    return LEXERS.get(os.path.splitext(path)[1].lower(), Lexer)()
+
+
+class Highlighter:
+    """
+        줄 끝 lexer 상태 캐시로 하는 증분 하이라이트
+        - _states[r]: r번째 줄 끝 상태, [0, _valid) 구간은 확정
+        - 편집된 줄은 HOLE로 표시하고 그 줄부터 다시 lex,
+          새 상태가 예전 캐시와 같아지면(수렴) 다음 HOLE까지 건너뜀
+        - 화면에 보이는 줄까지만 lex (ensure), 토큰은 (줄, 시작 상태)로 캐시
+        - stateless lexer면 상태 배열도 변경 알림 구독도 없음 (토큰 캐시만)
+    """
+    CACHE_ROWS = 2048
+
+    def __init__(self, buf: TextBuffer, lexer: Optional[Lexer] = None):
+        self.buf = buf
+        self._states = array("h")
+        self._valid = 0
+        self._tokens: Dict[int, Tuple[str, int, List[Token]]] = {}
+        self._listening = False
+        self.set_lexer(lexer or Lexer())
+
+    def detach(self) -> None:
+        if self._listening:
+            self.buf.remove_listener(self._on_changed)
+            self._listening = False
+
+    def set_lexer(self, lexer: Lexer) -> None:
+        self.lexer = lexer
+        self._valid = 0
+        self._tokens.clear()
+        if lexer.stateless:
+            self._states = array("h")
+            self.detach()
+            return
+        self._states = array("h", [HOLE]) * len(self.buf.lines)
+        if not self._listening:
+            self.buf.add_listener(self._on_changed)
+            self._listening = True
+
+    def _on_changed(self, row: int, removed: int, added: int) -> None:
+        self._states[row:row + removed] = array("h", [HOLE]) * added
+        if self._valid > row:
+            self._valid = row
+
+    def ensure(self, upto: int) -> int:
+        # end states correct through row `upto`; returns the last row whose cached
+        # (non-hole) state changed, -1 if none did
+        changed = -1
+        if self.lexer.stateless:
+            return changed
+        states = self._states
+        upto = min(upto, len(states) - 1)
+        r = self._valid
+        if r > upto:
+            return changed
+        lex = self.lexer.lex_line
+        state = states[r - 1] if r else 0
+        lines = self.buf.iter_lines(r)
+        while r <= upto:
+            state = lex(next(lines), state)[1]
+            old = states[r]
+            states[r] = state
+            r += 1
+            if old == state:
+                # converged: cached states hold until the next hole
+                try:
+                    nxt = states.index(HOLE, r)
+                except ValueError:
+                    nxt = len(states)
+                if nxt != r:
+                    r = nxt
+                    state = states[r - 1]
+                    lines = self.buf.iter_lines(r)
+                    continue
+            elif old != HOLE:
+                changed = r - 1
+            if r > upto and r < len(states):
+                # stopped before converging: the next row's cached state is stale
+                states[r] = HOLE
+        self._valid = r
+        return changed
+
+    def start_state(self, row: int) -> int:
+        # call ensure(row - 1) first
+        if row == 0 or self.lexer.stateless:
+            return 0
+        return self._states[row - 1]
+
+    def tokens(self, row: int, line: str) -> List[Token]:
+        # tokens depend only on (line, start state), so a hit is always right
+        state = self.start_state(row)
+        hit = self._tokens.get(row)
+        if hit is not None and hit[0] is line and hit[1] == state:
+            return hit[2]
+        toks = self.lexer.lex_line(line, state)[0]
+        if len(self._tokens) >= self.CACHE_ROWS:
+            self._tokens.clear()
+        self._tokens[row] = (line, state, toks)
+        return toks
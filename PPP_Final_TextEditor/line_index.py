@@ -0,0 +1,107 @@
+from __future__ import annotations
+from itertools import islice
+from typing import Callable, List, Optional, Tuple
+
+from core import TextBuffer, Cursor, TICK_ROWS
+from prefix_sum import PrefixSumTree
+
+
+def _measure(lines) -> Tuple[List[int], List[int]]:
+    # (len + 1 for the line break, word count) per line
+    lens = []
+    words = []
+    for line in lines:
+        lens.append(len(line) + 1)
+        words.append(len(line.split()))
+    return lens, words
+
+
+class LineIndex:
+    """
+        줄 길이 / 단어 수 인덱스 (문서 통계, 오프셋 <-> 커서, 줄 이동)
+        - 줄마다 (길이 + 1)과 단어 수를 PrefixSumTree 두 개에 저장, 질의 O(log n)
+        - 오프셋은 문자 단위, 줄바꿈은 한 글자 (get_text() 기준)
+        - 처음 한 번 build()로 전체 스캔, 이후에는 TextBuffer 변경 알림으로 바뀐 줄만 다시 셈
+        - listen=False: 스냅샷 위에서 워커가 만든 뒤 adopt()로 넘겨받는 용도
+    """
+    def __init__(self, buf: TextBuffer, listen: bool = True):
+        self.buf = buf
+        self.ready = False      # built for the current text; changes before build() are ignored
+        self._lens = PrefixSumTree()
+        self._words = PrefixSumTree()
+        if listen:
+            buf.add_listener(self._on_changed)
+
+    def detach(self) -> None:
+        self.buf.remove_listener(self._on_changed)
+
+    def build(self, tick: Optional[Callable[[int], None]] = None) -> None:
+        # tick(row) every TICK_ROWS rows, may raise to abort
+        lens = []
+        words = []
+        it = self.buf.iter_lines()
+        row = 0
+        while True:
+            if tick is not None:
+                tick(row)
+            l, w = _measure(islice(it, TICK_ROWS))
+            if not l:
+                break
+            lens += l
+            words += w
+            row += len(l)
+        self._lens = PrefixSumTree(lens)
+        self._words = PrefixSumTree(words)
+        self.ready = True
+
+    def adopt(self, other: "LineIndex") -> None:
+        # take over an index built on a snapshot of the same buffer version
+        self._lens = other._lens
+        self._words = other._words
+        self.ready = other.ready
+
+    def reset(self) -> None:
+        # the text was replaced: not valid until the next build()/adopt()
+        self.ready = False
+        self._lens = PrefixSumTree()
+        self._words = PrefixSumTree()
+
+    def _on_changed(self, row: int, removed: int, added: int) -> None:
+        if not self.ready:
+            return
+        lens, words = _measure(islice(self.buf.iter_lines(row), added))
+        self._lens.splice(row, removed, lens)
+        self._words.splice(row, removed, words)
+
+    # totals
+    @property
+    def line_count(self) -> int:
+        return len(self._lens)
+
+    @property
+    def char_count(self) -> int:
+        # no line break after the last line
+        return max(0, self._lens.total - 1)
+
+    @property
+    def word_count(self) -> int:
+        return self._words.total
+
+    def words_before(self, row: int) -> int:
+        return self._words.prefix(row)
+
+    # offset <-> cursor
+    def line_start(self, row: int) -> int:
+        return self._lens.prefix(row)
+
+    def offset(self, c: Cursor) -> int:
+        return self._lens.prefix(c.row) + c.col
+
+    def cursor_at(self, offset: int) -> Cursor:
+        # offsets past the end clamp to the end of the last line
+        offset = max(0, min(offset, self.char_count))
+        row, col = self._lens.find(offset)
+        if row >= len(self._lens):
+            row = len(self._lens) - 1
+            col = self._lens.get(row) - 1
+        return Cursor(row, col)
@@ -0,0 +1,579 @@
+# main_window.py
+from __future__ import annotations
+import os
+import re
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtWidgets import (
+    QMainWindow, QFileDialog, QInputDialog, QMessageBox,
+    QToolBar, QLabel, QTabBar, QVBoxLayout, QWidget
+)
+from PyQt6.QtGui import QAction, QKeySequence
+
+from buffer_pool import BufferPool, Document
+from editor_widget import EditorWidget
+from patterns import SearchOptions
+from perf import tracer, format_summary
+from recovery import pending_paths
+
+
+class MainWindow(QMainWindow):
+    # status bar wording for EditorWidget background jobs
+    TASK_LABELS = {"open": "Opening", "save": "Saving", "find": "Searching", "replace_all": "Replacing",
+                   "follow": "Following", "copy": "Copying"}
+    # spans shown in the status bar readout, in this order
+    PERF_SPANS = ["EditorWidget.keyPressEvent", "UndoStack.push_and_do", "EditorWidget.paintEvent"]
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("[2025-2 PPP] Text Editor (Custom Buffer)")
+
+        self.editor = EditorWidget(self)
+        self.editor.loadProgress.connect(self.on_load_progress)
+        self.editor.followUpdated.connect(self.on_follow_updated)
+        self.editor.cursorMoved.connect(self._update_position_label)
+        self.editor.taskProgress.connect(self.on_task_progress)
+        self.editor.taskFinished.connect(self.on_task_finished)
+
+        # one editor widget; tabs swap documents in and out of it
+        self.pool = BufferPool()
+        self.pool.add(self.editor.doc)
+        self.tabs = QTabBar(self)
+        self.tabs.setTabsClosable(True)
+        self.tabs.setDocumentMode(True)
+        self.tabs.setExpanding(False)
+        self.tabs.addTab(self.editor.doc.title)
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+        self.tabs.tabCloseRequested.connect(self.on_tab_close)
+
+        central = QWidget(self)
+        layout = QVBoxLayout(central)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addWidget(self.tabs)
+        layout.addWidget(self.editor)
+        self.setCentralWidget(central)
+
+        self._find_label = "Find next"
+
+        self._make_actions()
+        self._make_menu()
+        self._make_statusbar()
+        # toolbar and command-line files wait for finish_startup (after the first paint)
+
+        self.resize(900, 650)
+
+    @property
+    def current_path(self) -> str | None:
+        return self.editor.doc.path
+
+    def finish_startup(self, paths=()):
+        self._make_toolbar()
+        paths = list(paths)
+        if self.editor.recovery_dir is not None:
+            # files with unsaved edits from a crashed session: opening replays them
+            opened = {os.path.abspath(p) for p in paths}
+            paths += [p for p in pending_paths(self.editor.recovery_dir) if p not in opened]
+        for path in paths:
+            self.open_path(path)
+
+    def _make_actions(self):
+        self.act_new_tab = QAction("New Tab", self)
+        self.act_new_tab.setShortcut(QKeySequence.StandardKey.AddTab)
+        self.act_new_tab.triggered.connect(lambda: self._new_tab())
+
+        self.act_close_tab = QAction("Close Tab", self)
+        self.act_close_tab.setShortcut(QKeySequence.StandardKey.Close)
+        self.act_close_tab.triggered.connect(lambda: self.on_tab_close(self.tabs.currentIndex()))
+
+        self.act_open = QAction("Open...", self)
+        self.act_open.setShortcut(QKeySequence.StandardKey.Open)
+        self.act_open.triggered.connect(self.on_open)
+
+        self.act_save = QAction("Save", self)
+        self.act_save.setShortcut(QKeySequence.StandardKey.Save)
+        self.act_save.triggered.connect(self.on_save)
+
+        self.act_save_as = QAction("Save As...", self)
+        self.act_save_as.setShortcut(QKeySequence.StandardKey.SaveAs)
+        self.act_save_as.triggered.connect(self.on_save_as)
+
+        self.act_undo = QAction("Undo", self)
+        self.act_undo.setShortcut(QKeySequence.StandardKey.Undo)
+        self.act_undo.triggered.connect(self.editor.do_undo)
+
+        self.act_redo = QAction("Redo", self)
+        self.act_redo.setShortcut(QKeySequence.StandardKey.Redo)
+        self.act_redo.triggered.connect(self.editor.do_redo)
+
+        self.act_cut = QAction("Cut", self)
+        self.act_cut.setShortcut(QKeySequence.StandardKey.Cut)
+        self.act_cut.triggered.connect(self.editor.cut_selection)
+
+        self.act_copy = QAction("Copy", self)
+        self.act_copy.setShortcut(QKeySequence.StandardKey.Copy)
+        self.act_copy.triggered.connect(self.editor.copy_selection)
+
+        self.act_paste = QAction("Paste", self)
+        self.act_paste.setShortcut(QKeySequence.StandardKey.Paste)
+        self.act_paste.triggered.connect(self.editor.paste)
+
+        self.act_select_all = QAction("Select All", self)
+        self.act_select_all.setShortcut(QKeySequence.StandardKey.SelectAll)
+        self.act_select_all.triggered.connect(self.editor.select_all)
+
+        self.act_goto = QAction("Go to Line...", self)
+        self.act_goto.setShortcut(QKeySequence("Ctrl+G"))
+        self.act_goto.triggered.connect(self.on_goto)
+
+        self.act_find = QAction("Find (Next)...", self)
+        self.act_find.setShortcut(QKeySequence("Ctrl+F"))
+        self.act_find.triggered.connect(self.on_find_next)
+
+        self.act_find_again = QAction("Find Again", self)
+        self.act_find_again.setShortcut(QKeySequence("F3"))
+        self.act_find_again.triggered.connect(self.on_find_again)
+
+        self.act_find_prev = QAction("Find Previous", self)
+        self.act_find_prev.setShortcut(QKeySequence("Shift+F3"))
+        self.act_find_prev.triggered.connect(self.on_find_prev)
+
+        self.act_replace = QAction("Replace (Next)...", self)
+        self.act_replace.setShortcut(QKeySequence("Ctrl+H"))
+        self.act_replace.triggered.connect(self.on_replace_next)
+
+        self.act_replace_all = QAction("Replace All...", self)
+        self.act_replace_all.triggered.connect(self.on_replace_all)
+
+        self.act_regex = QAction("Regular Expression", self, checkable=True)
+        self.act_match_case = QAction("Match Case", self, checkable=True)
+        self.act_match_case.setChecked(True)
+        self.act_whole_word = QAction("Whole Word", self, checkable=True)
+        for act in (self.act_regex, self.act_match_case, self.act_whole_word):
+            act.toggled.connect(self.on_search_options)
+
+        self.act_persistent_undo = QAction("Keep Undo History on Disk", self, checkable=True)
+        self.act_persistent_undo.toggled.connect(self.editor.set_persistent_undo)
+
+        self.act_cancel = QAction("Cancel Background Task", self)
+        self.act_cancel.setShortcut(QKeySequence("Esc"))
+        self.act_cancel.triggered.connect(self.editor.cancel_tasks)
+        self.act_cancel.triggered.connect(self.editor.clear_carets)
+
+        self.act_soft_wrap = QAction("Soft Wrap", self, checkable=True)
+        self.act_soft_wrap.setShortcut(QKeySequence("Alt+Z"))
+        self.act_soft_wrap.toggled.connect(self.editor.set_soft_wrap)
+
+        self.act_follow = QAction("Follow File (tail -f)", self, checkable=True)
+        self.act_follow.setShortcut(QKeySequence("Ctrl+Shift+T"))
+        self.act_follow.toggled.connect(self.on_follow_toggled)
+
+        self.act_follow_limit = QAction("Follow Line Limit...", self)
+        self.act_follow_limit.triggered.connect(self.on_follow_limit)
+
+        self.act_perf = QAction("Show Latency (p50/p99)", self, checkable=True)
+        self.act_perf.setShortcut(QKeySequence("Ctrl+Shift+P"))
+        self.act_perf.setChecked(tracer.enabled)
+        self.act_perf.toggled.connect(self.on_perf_toggled)
+
+        self.act_export_trace = QAction("Export Trace...", self)
+        self.act_export_trace.triggered.connect(self.on_export_trace)
+
+    def _make_menu(self):
+        m_file = self.menuBar().addMenu("File")
+        m_file.addAction(self.act_new_tab)
+        m_file.addAction(self.act_open)
+        m_file.addAction(self.act_save)
+        m_file.addAction(self.act_save_as)
+        m_file.addAction(self.act_close_tab)
+
+        m_edit = self.menuBar().addMenu("Edit")
+        m_edit.addAction(self.act_undo)
+        m_edit.addAction(self.act_redo)
+        m_edit.addAction(self.act_persistent_undo)
+        m_edit.addSeparator()
+        m_edit.addAction(self.act_cut)
+        m_edit.addAction(self.act_copy)
+        m_edit.addAction(self.act_paste)
+        m_edit.addAction(self.act_select_all)
+        m_edit.addAction(self.act_goto)
+        m_edit.addSeparator()
+        m_edit.addAction(self.act_find)
+        m_edit.addAction(self.act_find_again)
+        m_edit.addAction(self.act_find_prev)
+        m_edit.addAction(self.act_replace)
+        m_edit.addAction(self.act_replace_all)
+        m_edit.addAction(self.act_cancel)
+        m_edit.addSeparator()
+        m_edit.addAction(self.act_regex)
+        m_edit.addAction(self.act_match_case)
+        m_edit.addAction(self.act_whole_word)
+
+        m_view = self.menuBar().addMenu("View")
+        m_view.addAction(self.act_soft_wrap)
+        m_view.addSeparator()
+        m_view.addAction(self.act_follow)
+        m_view.addAction(self.act_follow_limit)
+
+        m_tools = self.menuBar().addMenu("Tools")
+        m_tools.addAction(self.act_perf)
+        m_tools.addAction(self.act_export_trace)
+
+    def _make_toolbar(self):
+        tb = QToolBar("Main")
+        tb.setMovable(False)
+        self.addToolBar(Qt.ToolBarArea.TopToolBarArea, tb)
+        tb.addAction(self.act_open)
+        tb.addAction(self.act_save)
+        tb.addSeparator()
+        tb.addAction(self.act_undo)
+        tb.addAction(self.act_redo)
+        tb.addSeparator()
+        tb.addAction(self.act_find)
+        tb.addAction(self.act_replace)
+
+    def _make_statusbar(self):
+        self.status = QLabel("Ready")
+        self.statusBar().addWidget(self.status)
+
+        # cursor position and document statistics (editor.line_index)
+        self.pos_label = QLabel("")
+        self.statusBar().addPermanentWidget(self.pos_label)
+        self._update_position_label()
+
+        # latency readout while tracing
+        self.perf_label = QLabel("")
+        self.statusBar().addPermanentWidget(self.perf_label)
+        self._perf_timer = QTimer(self)
+        self._perf_timer.timeout.connect(self._update_perf_label)
+        self.on_perf_toggled(tracer.enabled)
+
+    def on_open(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open", "", "Text Files (*.txt);;All Files (*)")
+        if not path:
+            return
+        self.open_path(path)
+
+    def open_path(self, path: str):
+        doc = self.editor.doc
+        if doc.path is not None or doc.is_modified():
+            # keep the current document, open into a new tab
+            doc = self._new_tab(path)
+        else:
+            doc.path = path
+        try:
+            self.editor.open_file_async(path)
+        except Exception as e:
+            QMessageBox.critical(self, "Open failed", str(e))
+            return
+        self.status.setText(f"Opening: {path}...")
+
+    def on_load_progress(self, lines: int, done: bool):
+        self._update_position_label()
+        if done:
+            self.status.setText(f"Opened: {self.current_path} ({lines} lines)")
+        else:
+            self.status.setText(f"Indexing: {lines} lines... (read only)")
+
+    def on_save(self):
+        if not self.current_path:
+            self.on_save_as()
+            return
+        self._start_save(self.current_path)
+
+    def on_save_as(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save As", "", "Text Files (*.txt);;All Files (*)")
+        if not path:
+            return
+        self._start_save(path)
+
+    def _start_save(self, path: str):
+        try:
+            self.editor.save_file_async(path)
+        except Exception as e:
+            QMessageBox.critical(self, "Save failed", str(e))
+            return
+        self.act_save.setEnabled(False)
+        self.act_save_as.setEnabled(False)
+        self.status.setText(f"Saving: {path}...")
+
+    def on_task_progress(self, kind: str, done: int, total: int):
+        percent = done * 100 // total if total else 0
+        self.status.setText(f"{self.TASK_LABELS.get(kind, kind)}... {percent}%")
+
+    def on_task_finished(self, kind: str, result, error: str):
+        self._sync_follow_action()
+        if kind == "save":
+            self.act_save.setEnabled(True)
+            self.act_save_as.setEnabled(True)
+        if error == "cancelled":
+            self.status.setText(f"{self.TASK_LABELS.get(kind, kind)} cancelled")
+            return
+
+        if kind == "open":
+            if error:
+                QMessageBox.critical(self, "Open failed", error)
+                self.status.setText("Open failed")
+                return
+            self._refresh_tab_titles()
+            if not self.editor.read_only:   # large files report through on_load_progress
+                self.status.setText(f"Opened: {result}")
+        elif kind == "save":
+            if error:
+                QMessageBox.critical(self, "Save failed", error)
+                self.status.setText("Save failed")
+                return
+            self._refresh_tab_titles()
+            self.status.setText(f"Saved: {result}")
+        elif kind == "find":
+            if error:
+                QMessageBox.warning(self, "Find failed", error)
+                return
+            self._show_find_status(self._find_label)
+        elif kind == "copy":
+            if error:
+                QMessageBox.warning(self, "Copy failed", error)
+                return
+            self.status.setText(f"Copied {result} lines")
+        elif kind == "recover":
+            path, count = result
+            self.status.setText(f"Recovered {count} unsaved edits: {path}")
+        elif kind == "follow":
+            QMessageBox.warning(self, "Follow stopped", error)
+            self.status.setText(f"Stopped following: {result}")
+        elif kind == "replace_all":
+            if error:
+                QMessageBox.warning(self, "Replace failed", error)
+                return
+            self.status.setText(f"Replace all: {self.editor.find_query} -> {self.editor.replace_text} ({result} replaced)")
+
+    # follow mode
+    def _sync_follow_action(self):
+        # the editor stops following on open/tab switch/errors
+        self.act_follow.setChecked(self.editor.is_following())
+
+    def on_follow_toggled(self, on: bool):
+        if on == self.editor.is_following():
+            return
+        if not on:
+            self.editor.stop_follow()
+            self.status.setText("Stopped following")
+            return
+        try:
+            self.editor.start_follow()
+        except (RuntimeError, OSError) as e:
+            QMessageBox.warning(self, "Follow", str(e))
+            self.act_follow.setChecked(False)
+            return
+        self.status.setText(f"Following: {self.current_path}")
+
+    def on_follow_updated(self, added: int, total: int):
+        self.status.setText(f"Following: {self.current_path} (+{added} lines, {total} lines)")
+
+    def on_follow_limit(self):
+        n, ok = QInputDialog.getInt(self, "Follow", "Keep at most this many lines (0 = no limit):",
+                                    self.editor.follow_max_lines, 0, 1_000_000_000)
+        if ok:
+            self.editor.follow_max_lines = n
+
+    # position / go to
+    def _update_position_label(self):
+        ed = self.editor
+        c = ed.cursor
+        index = ed.line_index
+        text = f"Ln {c.row + 1}, Col {c.col + 1}"
+        if index.ready:
+            text += (f"  |  {index.line_count:,} lines, {index.word_count:,} words, "
+                     f"{index.char_count:,} chars  |  offset {index.offset(c):,}")
+        else:
+            text += f"  |  {len(ed.buf.lines):,} lines"
+        self.pos_label.setText(text)
+
+    def on_goto(self):
+        # "line", "line:col" or "@offset"
+        target, ok = QInputDialog.getText(self, "Go to", "Line[:column] or @offset:")
+        if not ok or not target.strip():
+            return
+        target = target.strip()
+        try:
+            if target.startswith("@"):
+                if not self.editor.goto_offset(int(target[1:])):
+                    self.status.setText("Offsets are available once the document is counted")
+                return
+            line, _, col = target.partition(":")
+            self.editor.goto_line(int(line), int(col) if col else 1)
+        except ValueError:
+            QMessageBox.warning(self, "Go to", f"Not a line or offset: {target}")
+
+    # performance tracing
+    def on_perf_toggled(self, on: bool):
+        tracer.set_enabled(on)
+        self.perf_label.setVisible(on)
+        if on:
+            self._perf_timer.start(500)
+            self._update_perf_label()
+        else:
+            self._perf_timer.stop()
+
+    def _update_perf_label(self):
+        self.perf_label.setText(format_summary(tracer.summary(), self.PERF_SPANS))
+
+    def on_export_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Trace", "trace.json", "Chrome Trace (*.json)")
+        if not path:
+            return
+        try:
+            n = tracer.export(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Export failed", str(e))
+            return
+        self.status.setText(f"Trace: {n} events -> {path}")
+
+    # tabs (tab index == index in self.pool.docs)
+    def _new_tab(self, path: str | None = None) -> Document:
+        doc = self.pool.add(Document(path))
+        index = self.tabs.addTab(doc.title)
+        self.tabs.setCurrentIndex(index)
+        return doc
+
+    def _refresh_tab_titles(self):
+        for i, doc in enumerate(self.pool.docs):
+            self.tabs.setTabText(i, doc.title)
+            self.tabs.setTabToolTip(i, doc.path or "")
+
+    def on_tab_changed(self, index: int):
+        if index < 0:
+            return
+        doc = self.pool.docs[index]
+        old = self.editor.store_document()
+        if doc is old:
+            return
+        try:
+            self.pool.activate(doc)   # reload if it was evicted
+        except (OSError, UnicodeDecodeError) as e:
+            QMessageBox.critical(self, "Reload failed", str(e))
+            self.tabs.setCurrentIndex(self.pool.docs.index(old))
+            return
+        self.editor.set_document(doc)
+        self._sync_follow_action()
+        self.pool.deactivate(old)
+        self.status.setText(doc.path or "Untitled")
+
+    def on_tab_close(self, index: int):
+        if index < 0:
+            return
+        doc = self.pool.docs[index]
+        if not self._confirm_close(doc, "Close Tab"):
+            return
+        if self.tabs.count() == 1:
+            self._new_tab()
+        elif doc is self.editor.doc:
+            self.tabs.setCurrentIndex(index - 1 if index > 0 else index + 1)
+        # jobs may still read its lines
+        self.editor.wait_tasks()
+        index = self.pool.docs.index(doc)
+        self.pool.close(doc)
+        self.tabs.removeTab(index)
+
+    def _confirm_close(self, doc: Document, title: str) -> bool:
+        # save / discard / cancel for a modified document; False keeps it open
+        if not doc.is_modified():
+            return True
+        self.tabs.setCurrentIndex(self.pool.docs.index(doc))
+        Btn = QMessageBox.StandardButton
+        ans = QMessageBox.question(self, title, f"Save changes to {doc.title}?",
+                                   Btn.Save | Btn.Discard | Btn.Cancel, Btn.Save)
+        if ans == Btn.Discard:
+            return True
+        if ans != Btn.Save:
+            return False
+        path = doc.path
+        if not path:
+            path, _ = QFileDialog.getSaveFileName(self, "Save As", "", "Text Files (*.txt);;All Files (*)")
+            if not path:
+                return False
+        self.editor.wait_tasks()
+        try:
+            self.editor.save_file(path)
+        except Exception as e:
+            QMessageBox.critical(self, "Save failed", str(e))
+            return False
+        self._refresh_tab_titles()
+        return True
+
+    def closeEvent(self, e):
+        self.editor.store_document()
+        self.editor.wait_tasks()
+        for doc in list(self.pool.docs):
+            if not self._confirm_close(doc, "Quit"):
+                e.ignore()
+                return
+        for doc in list(self.pool.docs):
+            self.pool.close(doc)   # removes spill files
+        super().closeEvent(e)
+
+    def _ask_find_replace(self, ask_replace: bool):
+        query, ok = QInputDialog.getText(self, "Find", "Find what?")
+        if not ok:
+            return None
+        query = query or ""
+        repl = ""
+        if ask_replace:
+            repl, ok2 = QInputDialog.getText(self, "Replace", "Replace with?")
+            if not ok2:
+                return None
+        self.editor.set_find_replace(query, repl)
+        return query, repl
+
+    def on_search_options(self, _checked: bool = False):
+        self.editor.set_search_options(SearchOptions(
+            regex=self.act_regex.isChecked(),
+            case_sensitive=self.act_match_case.isChecked(),
+            whole_word=self.act_whole_word.isChecked(),
+        ))
+
+    def _run_search(self, fn) -> bool:
+        try:
+            fn()
+        except re.error as e:
+            QMessageBox.warning(self, "Invalid pattern", str(e))
+            return False
+        return True
+
+    def on_find_next(self):
+        res = self._ask_find_replace(ask_replace=False)
+        if res is None:
+            return
+        self._find_label = "Find next"
+        self._run_search(self.editor.find_next_async)
+
+    def on_find_again(self):
+        if not self.editor.find_query:
+            self.on_find_next()
+            return
+        self._find_label = "Find next"
+        self._run_search(self.editor.find_next_async)
+
+    def on_find_prev(self):
+        if not self.editor.find_query:
+            self.on_find_next()
+            return
+        self._find_label = "Find previous"
+        self._run_search(self.editor.find_prev_async)
+
+    def _show_find_status(self, what: str):
+        count = self.editor.match_count()
+        suffix = "" if count is None else f" ({count} matches)"
+        self.status.setText(f"{what}: {self.editor.find_query}{suffix}")
+
+    def on_replace_next(self):
+        res = self._ask_find_replace(ask_replace=True)
+        if res is None:
+            return
+        if self._run_search(self.editor.replace_next):
+            self.status.setText(f"Replace next: {self.editor.find_query} -> {self.editor.replace_text}")
+
+    def on_replace_all(self):
+        res = self._ask_find_replace(ask_replace=True)
+        if res is None:
+            return
+        self._run_search(self.editor.replace_all_async)
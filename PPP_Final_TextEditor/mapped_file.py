@@ -0,0 +1,136 @@
+from __future__ import annotations
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Iterator, Optional
+
+
+class MappedFile:
+    """
+        mmap 기반 읽기 전용 라인 소스 (대용량 파일용)
+        - 줄 오프셋 인덱스는 백그라운드 스레드에서 생성 (CHECKPOINT 줄마다 하나만 저장)
+        - 줄은 접근할 때만 디코딩, 최근 줄은 LRU 캐시
+    """
+    CHECKPOINT = 256           # lines between stored offsets
+    SCAN_CHUNK = 4 * 1024 * 1024
+    CACHE_LINES = 4096
+
+    def __init__(self, path: str, encoding: str = "utf-8", offset: int = 0):
+        # offset: bytes skipped at the start (a BOM); encoding must keep b"\n" as newline
+        self.path = path
+        self.encoding = encoding
+        self._f = open(path, "rb")
+        self.size = os.fstat(self._f.fileno()).st_size
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+        # _marks[k] = byte offset of line k*CHECKPOINT
+        self._marks = array("q", [offset])
+        self._newlines = 0
+        self._scan_pos = offset
+        self.done = self.size <= offset
+
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+        self._last: Optional[tuple] = None    # (row, start, end) of last decoded line
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # number of lines readable so far (all lines once indexing is done)
+    @property
+    def line_count(self) -> int:
+        return self._newlines + 1 if self.done else self._newlines
+
+    # indexing
+    def scan(self, limit: int) -> bool:
+        # index up to `limit` more bytes, returns True when finished
+        if self.done:
+            return True
+        pos = self._scan_pos
+        end = min(self.size, pos + limit)
+        lines = self._newlines
+        next_mark = len(self._marks) * self.CHECKPOINT
+
+        chunk = self._mm[pos:end]
+        n = chunk.count(b"\n")
+        if lines + n < next_mark:
+            lines += n
+        else:
+            p = 0
+            while True:
+                p = chunk.find(b"\n", p)
+                if p == -1:
+                    break
+                p += 1
+                lines += 1
+                if lines == next_mark:
+                    self._marks.append(pos + p)
+                    next_mark += self.CHECKPOINT
+
+        self._scan_pos = end
+        self._newlines = lines
+        self.done = end >= self.size
+        return self.done
+
+    def start_indexing(self, first_chunk: int = 1 << 20) -> None:
+        # index the head synchronously so the first screen can paint right away
+        if self.scan(first_chunk):
+            return
+        self._thread = threading.Thread(target=self._index_loop, daemon=True)
+        self._thread.start()
+
+    def _index_loop(self) -> None:
+        while not self._stop.is_set():
+            if self.scan(self.SCAN_CHUNK):
+                return
+
+    # line access
+    def _line_start(self, row: int) -> int:
+        last = self._last
+        if last is not None and last[0] == row - 1:
+            return last[2] + 1
+        mm = self._mm
+        k, skip = divmod(row, self.CHECKPOINT)
+        p = self._marks[k]
+        for _ in range(skip):
+            p = mm.find(b"\n", p) + 1
+        return p
+
+    def _decode(self, row: int) -> str:
+        if self._mm is None:
+            return ""
+        start = self._line_start(row)
+        end = self._mm.find(b"\n", start)
+        if end == -1:
+            end = self.size
+        self._last = (row, start, end)
+        raw = self._mm[start:end]
+        if raw.endswith(b"\r"):
+            raw = raw[:-1]
+        return raw.decode(self.encoding, errors="replace")
+
+    def line(self, row: int) -> str:
+        with self._lock:
+            s = self._cache.get(row)
+            if s is not None:
+                self._cache.move_to_end(row)
+                return s
+            s = self._decode(row)
+            self._cache[row] = s
+            if len(self._cache) > self.CACHE_LINES:
+                self._cache.popitem(last=False)
+            return s
+
+    def iter_lines(self, start: int, stop: int) -> Iterator[str]:
+        # sequential reads reuse the previous line's end offset
+        for row in range(start, stop):
+            yield self.line(row)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._mm is not None:
+            self._mm.close()
+        self._f.close()
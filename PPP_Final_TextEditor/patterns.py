@@ -0,0 +1,39 @@
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+
+# lines joined per window when a pattern can span lines
+MULTILINE_WINDOW = 256
+
+
+@dataclass(frozen=True)
+class SearchOptions:
+    regex: bool = False
+    case_sensitive: bool = True
+    whole_word: bool = False
+
+    @property
+    def literal(self) -> bool:
+        # plain substring search (str.find fast path)
+        return not self.regex and self.case_sensitive and not self.whole_word
+
+
+LITERAL = SearchOptions()
+
+
+@lru_cache(maxsize=128)
+def compile_pattern(query: str, opts: SearchOptions) -> "re.Pattern[str]":
+    # bounded LRU: re-pressing Ctrl+F / replace all never recompiles
+    pat = query if opts.regex else re.escape(query)
+    if opts.whole_word:
+        pat = rf"\b(?:{pat})\b"
+    flags = re.MULTILINE
+    if not opts.case_sensitive:
+        flags |= re.IGNORECASE
+    return re.compile(pat, flags)
+
+
+def is_multiline(query: str, opts: SearchOptions) -> bool:
+    return "\n" in query or (opts.regex and "\\n" in query)
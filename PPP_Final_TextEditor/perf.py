@@ -0,0 +1,134 @@
+from __future__ import annotations
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import core
+
+
+# raw spans kept for export (oldest dropped first)
+MAX_EVENTS = 200_000
+# recent durations per span name for the p50/p99 readout
+WINDOW = 512
+
+# (name, category, start ns, duration ns, thread id)
+Event = Tuple[str, str, int, int, int]
+
+
+class Tracer:
+    """
+        핫패스 구간 타이머
+        - register(cls, names, cat)로 측정할 메서드를 등록
+        - enable() 할 때만 메서드를 타이머 래퍼로 바꿔 끼우고, disable()이면 원래 함수로 되돌림
+          (꺼져 있을 때는 호출 경로에 아무것도 없음)
+        - export(path): Chrome trace JSON (chrome://tracing, Perfetto)
+        - summary(): 이름별 최근 WINDOW개 구간의 (p50, p99, 횟수), 단위 µs
+    """
+    def __init__(self):
+        self.enabled = False
+        self._targets: List[Tuple[type, str, str]] = []
+        self._originals: Dict[Tuple[type, str], Callable] = {}
+        self._events: Deque[Event] = deque(maxlen=MAX_EVENTS)
+        self._recent: Dict[str, Deque[int]] = {}
+        self._origin = time.perf_counter_ns()
+
+    def register(self, cls: type, names, cat: str) -> None:
+        for name in names:
+            self._targets.append((cls, name, cat))
+            if self.enabled:
+                self._wrap(cls, name, cat)
+
+    def enable(self) -> None:
+        if self.enabled:
+            return
+        self.enabled = True
+        for cls, name, cat in self._targets:
+            self._wrap(cls, name, cat)
+
+    def disable(self) -> None:
+        if not self.enabled:
+            return
+        self.enabled = False
+        for (cls, name), fn in self._originals.items():
+            setattr(cls, name, fn)
+        self._originals.clear()
+
+    def set_enabled(self, on: bool) -> None:
+        self.enable() if on else self.disable()
+
+    def clear(self) -> None:
+        self._events.clear()
+        self._recent.clear()
+
+    def _wrap(self, cls: type, name: str, cat: str) -> None:
+        fn = cls.__dict__[name]
+        self._originals[(cls, name)] = fn
+        label = f"{cls.__name__}.{name}"
+        record = self.record
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(label, cat, t0, time.perf_counter_ns() - t0)
+
+        setattr(cls, name, timed)
+
+    def record(self, name: str, cat: str, start_ns: int, dur_ns: int) -> None:
+        # deque.append is atomic, so worker threads may record too
+        self._events.append((name, cat, start_ns, dur_ns, threading.get_ident()))
+        recent = self._recent.get(name)
+        if recent is None:
+            recent = self._recent.setdefault(name, deque(maxlen=WINDOW))
+        recent.append(dur_ns)
+
+    # reporting
+    def summary(self) -> Dict[str, Tuple[float, float, int]]:
+        out = {}
+        for name, recent in list(self._recent.items()):
+            durs = sorted(recent)
+            if durs:
+                out[name] = (percentile(durs, 0.50) / 1000, percentile(durs, 0.99) / 1000, len(durs))
+        return out
+
+    def export(self, path: str) -> int:
+        # returns the number of events written
+        events = list(self._events)
+        pid = os.getpid()
+        trace = [{"name": name, "cat": cat, "ph": "X", "pid": pid, "tid": tid,
+                  "ts": (start - self._origin) / 1000, "dur": dur / 1000}
+                 for name, cat, start, dur, tid in events]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        return len(trace)
+
+
+def percentile(sorted_ns: List[int], p: float) -> float:
+    # nearest-rank on an already sorted list, same unit as the input
+    return sorted_ns[min(len(sorted_ns) - 1, int(p * len(sorted_ns)))]
+
+
+def format_summary(summary: Dict[str, Tuple[float, float, int]], names: Optional[List[str]] = None) -> str:
+    # one line: "keyPressEvent 12/80us  paintEvent 300/900us ..." (p50/p99)
+    parts = []
+    for name in names or sorted(summary):
+        if name in summary:
+            p50, p99, _ = summary[name]
+            parts.append(f"{name.split('.')[-1]} {p50:.0f}/{p99:.0f}us")
+    return "  ".join(parts)
+
+
+tracer = Tracer()
+
+tracer.register(core.TextBuffer, ("insert_text_at", "delete_range", "backspace_at",
+                                  "replace_at", "apply_line_edits"), "buffer")
+tracer.register(core.UndoStack, ("push_and_do", "undo", "redo"), "undo")
+
+if os.environ.get("PPP_TRACE"):
+    tracer.enable()
@@ -0,0 +1,161 @@
+from __future__ import annotations
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Iterable, List, Tuple
+
+
+# values per block; a block is split at 2 * BLOCK
+BLOCK = 512
+
+
+class Fenwick:
+    """
+        Fenwick(BIT) 트리: 점 갱신 / 앞부분 합 / 합으로 위치 찾기 모두 O(log n)
+        - 길이는 고정 (원소 삽입/삭제는 다시 만들어야 함)
+    """
+    __slots__ = ("_tree",)
+
+    def __init__(self, values: Iterable[int] = ()):
+        tree = [0]
+        tree.extend(values)
+        n = len(tree) - 1
+        # O(n) build: push each node's sum to its parent
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def __len__(self) -> int:
+        return len(self._tree) - 1
+
+    def add(self, i: int, delta: int) -> None:
+        tree = self._tree
+        i += 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        # sum of values[:i]
+        tree = self._tree
+        s = 0
+        while i > 0:
+            s += tree[i]
+            i -= i & -i
+        return s
+
+    def search(self, target: int) -> Tuple[int, int]:
+        # (i, rest): i = number of leading values whose sum <= target (values must be >= 0)
+        tree = self._tree
+        n = len(tree) - 1
+        pos = 0
+        step = 1 << n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= n and tree[nxt] <= target:
+                pos = nxt
+                target -= tree[nxt]
+            step >>= 1
+        return pos, target
+
+
+class PrefixSumTree:
+    """
+        삽입/삭제가 되는 prefix-sum 배열 (줄별 화면 줄 수, 줄 길이 등)
+        - 값은 BLOCK개 단위 블록에 저장, 블록 크기/합은 Fenwick 두 개로 관리
+        - prefix / find / set: O(log n + BLOCK) (블록 안은 C 수준 sum/accumulate)
+        - splice(TextBuffer 변경 알림과 같은 모양): 블록 하나 안이면 O(BLOCK),
+          블록 수가 바뀌면 Fenwick만 다시 만듦 O(n / BLOCK)
+    """
+    def __init__(self, values: Iterable[int] = ()):
+        values = list(values)
+        self._blocks: List[List[int]] = [values[i:i + BLOCK] for i in range(0, len(values), BLOCK)]
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._sizes = Fenwick(len(b) for b in self._blocks)
+        self._sums = Fenwick(sum(b) for b in self._blocks)
+        self._len = self._sizes.prefix(len(self._blocks))
+        self._total = self._sums.prefix(len(self._blocks))
+
+    def __len__(self) -> int:
+        return self._len
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    def _locate(self, i: int) -> Tuple[int, int]:
+        # (block, offset) of value i; i == len maps past the end of the last block
+        if i >= self._len:
+            b = len(self._blocks) - 1
+            return b, (len(self._blocks[b]) if b >= 0 else 0)
+        return self._sizes.search(i)
+
+    def get(self, i: int) -> int:
+        b, off = self._locate(i)
+        return self._blocks[b][off]
+
+    def set(self, i: int, value: int) -> None:
+        b, off = self._locate(i)
+        block = self._blocks[b]
+        delta = value - block[off]
+        if delta:
+            block[off] = value
+            self._sums.add(b, delta)
+            self._total += delta
+
+    def prefix(self, i: int) -> int:
+        # sum of values[:i]
+        if i <= 0:
+            return 0
+        if i >= self._len:
+            return self._total
+        b, off = self._locate(i)
+        return self._sums.prefix(b) + sum(self._blocks[b][:off])
+
+    def find(self, target: int) -> Tuple[int, int]:
+        # (i, rest) with prefix(i) <= target < prefix(i + 1) and rest = target - prefix(i);
+        # (len, target - total) past the end
+        if target >= self._total:
+            return self._len, target - self._total
+        b, rest = self._sums.search(target)
+        block = self._blocks[b]
+        acc = list(accumulate(block))
+        off = bisect_right(acc, rest)
+        if off:
+            rest -= acc[off - 1]
+        return self._sizes.prefix(b) + off, rest
+
+    def splice(self, start: int, removed: int, values: List[int]) -> None:
+        # values[start:start + removed] = values
+        blocks = self._blocks
+        if not blocks:
+            self.__init__(values)
+            return
+        b, off = self._locate(start)
+        block = blocks[b]
+        if off + removed <= len(block) and 0 < len(block) - removed + len(values) <= 2 * BLOCK:
+            old = block[off:off + removed]
+            block[off:off + removed] = values
+            dsize = len(values) - removed
+            dsum = sum(values) - sum(old)
+            if dsize:
+                self._sizes.add(b, dsize)
+                self._len += dsize
+            if dsum:
+                self._sums.add(b, dsum)
+                self._total += dsum
+            return
+
+        # spans blocks or resizes one past its limits: re-chunk the affected blocks
+        last, _ = self._locate(start + removed - 1) if removed else (b, 0)
+        merged = [v for blk in blocks[b:last + 1] for v in blk]
+        merged[off:off + removed] = values
+        blocks[b:last + 1] = [merged[i:i + BLOCK] for i in range(0, len(merged), BLOCK)]
+        self._reindex()
+
+    def __iter__(self):
+        for block in self._blocks:
+            yield from block
@@ -0,0 +1,310 @@
+from __future__ import annotations
+import glob
+import hashlib
+import os
+import struct
+import time
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+from core import Command, Cursor, TextBuffer, UndoStack, command_from_record
+
+
+MAGIC = b"PPPREC1\n"
+# after MAGIC: 20-byte content sha1, path length; then the utf-8 document path
+_HEADER = struct.Struct("<20sI")
+# per record: op, payload length, crc32 of the payload
+_RECORD = struct.Struct("<BII")
+
+OP_DO = 1       # cmd.do() was applied as a new undo step (push or redo)
+OP_UNDO = 2     # cmd.undo() was applied
+OP_MERGE = 3    # cmd.do() was applied and merged into the previous undo step
+
+# fsync at most this often while typing, or after this many unsynced bytes
+SYNC_SECONDS = 1.0
+SYNC_BYTES = 256 * 1024
+
+
+def default_dir() -> str:
+    # PPP_RECOVERY_DIR overrides the per-user folder
+    return os.environ.get("PPP_RECOVERY_DIR") or os.path.join(os.path.expanduser("~"), ".ppp_editor", "recovery")
+
+
+def log_path(folder: str, doc_path: str) -> str:
+    key = hashlib.sha1(os.path.abspath(doc_path).encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    return os.path.join(folder, key + ".rec")
+
+
+# command records (see Command.to_record) as tagged varints:
+# b"i" zigzag int, b"s" length + utf-8, b"l" count + items
+def _put_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def encode_record(rec, out: bytearray) -> None:
+    if isinstance(rec, str):
+        data = rec.encode("utf-8", "surrogatepass")
+        out.append(0x73)
+        _put_varint(out, len(data))
+        out += data
+    elif isinstance(rec, int):
+        out.append(0x69)
+        _put_varint(out, rec << 1 if rec >= 0 else (~rec << 1) | 1)
+    else:
+        out.append(0x6C)
+        _put_varint(out, len(rec))
+        for item in rec:
+            encode_record(item, out)
+
+
+def decode_record(data: bytes, pos: int = 0):
+    # (record, position after it); raises ValueError on garbage
+    tag = data[pos]
+    n, pos = _get_varint(data, pos + 1)
+    if tag == 0x73:
+        end = pos + n
+        if end > len(data):
+            raise ValueError("truncated string")
+        return data[pos:end].decode("utf-8", "surrogatepass"), end
+    if tag == 0x69:
+        return (n >> 1) ^ -(n & 1), pos
+    if tag == 0x6C:
+        items = []
+        for _ in range(n):
+            item, pos = decode_record(data, pos)
+            items.append(item)
+        return items, pos
+    raise ValueError(f"unknown tag {tag:#x}")
+
+
+def _header(doc_path: str, content_hash: str) -> bytes:
+    path = doc_path.encode("utf-8", "surrogateescape")
+    return MAGIC + _HEADER.pack(bytes.fromhex(content_hash), len(path)) + path
+
+
+def read_header(f) -> Optional[Tuple[str, str]]:
+    # (content hash, document path) or None if f is not a recovery log
+    if f.read(len(MAGIC)) != MAGIC:
+        return None
+    head = f.read(_HEADER.size)
+    if len(head) < _HEADER.size:
+        return None
+    digest, n = _HEADER.unpack(head)
+    path = f.read(n)
+    if len(path) < n:
+        return None
+    return digest.hex(), path.decode("utf-8", "surrogateescape")
+
+
+def read_records(f) -> Iterator[Tuple[int, Command, int]]:
+    # (op, command, offset after the record) from f's position; stops at a torn or corrupt tail
+    while True:
+        head = f.read(_RECORD.size)
+        if len(head) < _RECORD.size:
+            return
+        op, n, crc = _RECORD.unpack(head)
+        payload = f.read(n)
+        if len(payload) < n or zlib.crc32(payload) != crc or op not in (OP_DO, OP_UNDO, OP_MERGE):
+            return
+        try:
+            rec, end = decode_record(payload)
+            if end != n:
+                return
+            cmd = command_from_record(rec)
+        except (ValueError, IndexError, TypeError):
+            return
+        yield op, cmd, f.tell()
+
+
+def pending_paths(folder: str) -> List[str]:
+    # documents with unsaved edits left by a previous session
+    paths = []
+    for name in sorted(glob.glob(os.path.join(folder, "*.rec"))):
+        try:
+            with open(name, "rb") as f:
+                header = read_header(f)
+                if header is not None and next(read_records(f), None) is not None and os.path.isfile(header[1]):
+                    paths.append(header[1])
+        except OSError:
+            continue
+    return paths
+
+
+def replay(buf: TextBuffer, undo: UndoStack, records: List[Tuple[int, Command]]) -> Cursor:
+    # apply logged commands over the on-disk content through undo, so recovered edits can be undone;
+    # undo must not have the recovery log attached yet (it would log them again).
+    # cursor ends at the last edit
+    cursor = Cursor(0, 0)
+    for op, cmd in records:
+        if op == OP_UNDO:
+            top = undo.peek()
+            if top is not None and top.to_record() == cmd.to_record():
+                cursor = undo.undo(buf, cursor)
+            else:
+                # undone past the history this session has (not journaled): the text
+                # is still right, the history leading to it is gone
+                cursor = cmd.undo(buf, cursor)
+                undo.clear()
+            continue
+        if op == OP_DO:
+            redo = undo.peek_redo()
+            if redo is not None and redo.to_record() == cmd.to_record():
+                cursor = undo.redo(buf, cursor)
+                continue
+            undo.seal()
+        cursor = undo.push_and_do(cmd, buf, cursor)
+    undo.seal()
+    return buf.clamp_cursor(cursor)
+
+
+class RecoveryLog:
+    """
+        저장 안 된 편집의 크래시 복구 기록 (append-only 바이너리 파일, 문서마다 하나)
+        - 헤더: 기준 내용(디스크 파일)의 해시 + 문서 경로
+        - 레코드: UndoStack을 거친 do/undo/redo마다 명령 하나 (op, 길이, crc32, 명령)
+          레코드 하나만으로 버퍼에 다시 적용 가능, 병합 여부(OP_MERGE)도 남겨 undo 단계까지 복원
+        - write는 레코드마다(프로세스 크래시), fsync는 모아서 (SYNC_SECONDS / SYNC_BYTES, sync())
+        - 저장하면 저장한 내용을 새 기준으로 다시 씀, 파일은 첫 편집 때 만듦
+        - 다음 실행 때 같은 내용의 파일을 열면 open()이 남은 레코드를 돌려줌 (내용이 다르면 버림)
+    """
+    def __init__(self, folder: str, doc_path: str, content_hash: str):
+        self.folder = folder
+        self.doc_path = os.path.abspath(doc_path)
+        self.path = log_path(folder, doc_path)
+        self.content_hash = content_hash
+        self.size = 0                   # record bytes after the header
+        self._f = None                  # opened by the first record
+        self._unsynced = 0
+        self._synced_at = 0.0
+        self.failed = False             # a write failed: stop logging, editing goes on
+
+    @classmethod
+    def open(cls, folder: str, doc_path: str, content_hash: str) -> Tuple["RecoveryLog", List[Tuple[int, Command]]]:
+        # log for doc_path, plus the records a previous session left over this same content
+        log = cls(folder, doc_path, content_hash)
+        records = []
+        end = 0
+        try:
+            with open(log.path, "rb") as f:
+                header = read_header(f)
+                if header is not None and header[0] == content_hash:
+                    start = f.tell()
+                    end = start
+                    for op, cmd, end in read_records(f):
+                        records.append((op, cmd))
+        except FileNotFoundError:
+            return log, records
+        if records:
+            # keep going after the last good record
+            log._f = open(log.path, "r+b")
+            log._f.truncate(end)
+            log._f.seek(end)
+            log.size = end - start
+        else:
+            log.discard()
+        return log, records
+
+    def _file(self):
+        if self._f is None:
+            os.makedirs(self.folder, exist_ok=True)
+            self._f = open(self.path, "w+b")
+            self._f.write(_header(self.doc_path, self.content_hash))
+            self.size = 0
+        return self._f
+
+    def _append(self, op: int, cmd: Command) -> None:
+        if self.failed:
+            return
+        payload = bytearray()
+        encode_record(cmd.to_record(), payload)
+        try:
+            f = self._file()
+            f.write(_RECORD.pack(op, len(payload), zlib.crc32(payload)) + payload)
+            f.flush()
+            n = _RECORD.size + len(payload)
+            self.size += n
+            self._unsynced += n
+            if self._unsynced >= SYNC_BYTES or time.monotonic() - self._synced_at >= SYNC_SECONDS:
+                self.sync()
+        except OSError:
+            self.failed = True
+
+    # UndoStack hooks
+    def log_do(self, cmd: Command) -> None:
+        self._append(OP_DO, cmd)
+
+    def log_merge(self, cmd: Command) -> None:
+        self._append(OP_MERGE, cmd)
+
+    def log_undo(self, cmd: Command) -> None:
+        self._append(OP_UNDO, cmd)
+
+    def sync(self) -> None:
+        # records written so far survive an OS crash
+        if self._f is not None and self._unsynced:
+            try:
+                os.fsync(self._f.fileno())
+            except OSError:
+                self.failed = True
+            self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def rebase(self, doc_path: str, content_hash: str, mark: int) -> None:
+        # the document was saved with this content when the log held mark record bytes:
+        # only the records after mark still apply
+        tail = b""
+        if self._f is not None and self.size > mark:
+            f = self._f
+            f.seek(mark - self.size, os.SEEK_END)
+            tail = f.read()
+        self.discard()
+        self.doc_path = os.path.abspath(doc_path)
+        self.path = log_path(self.folder, doc_path)
+        self.content_hash = content_hash
+        self.failed = False
+        if not tail:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(_header(self.doc_path, content_hash))
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._f = open(self.path, "a+b")
+        except OSError:
+            self.failed = True
+            return
+        self.size = len(tail)
+        self._synced_at = time.monotonic()
+
+    def close(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        self._unsynced = 0
+        self.size = 0
+
+    def discard(self) -> None:
+        # nothing left to recover: drop the file
+        self.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,287 @@
+from __future__ import annotations
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+
+# max lines per leaf
+LEAF_MAX = 64
+
+
+class _Leaf:
+    __slots__ = ("items", "size")
+    height = 0
+    leaves = 1
+
+    def __init__(self, items: Tuple[str, ...]):
+        self.items = items
+        self.size = len(items)
+
+    def get(self, i: int) -> str:
+        return self.items[i]
+
+    def set(self, i: int, value: str) -> "_Leaf":
+        items = self.items
+        return _Leaf(items[:i] + (value,) + items[i+1:])
+
+    def split(self, i: int) -> Tuple["_Leaf", "_Leaf"]:
+        return _Leaf(self.items[:i]), _Leaf(self.items[i:])
+
+    def iter_from(self, i: int) -> Iterator[str]:
+        return islice(self.items, i, None)
+
+
+class _SourceLeaf:
+    # lines [start, start+size) of an external line source, read on demand
+    # source needs line(i) and iter_lines(start, stop)
+    __slots__ = ("source", "start", "size")
+    height = 0
+    leaves = 1
+
+    def __init__(self, source, start: int, size: int):
+        self.source = source
+        self.start = start
+        self.size = size
+
+    def get(self, i: int) -> str:
+        return self.source.line(self.start + i)
+
+    def set(self, i: int, value: str):
+        # only the edited line is materialized
+        left, rest = self.split(i)
+        _, right = rest.split(1)
+        return _join(_join(left, _Leaf((value,))), right)
+
+    def split(self, i: int) -> Tuple["_SourceLeaf", "_SourceLeaf"]:
+        return (_SourceLeaf(self.source, self.start, i),
+                _SourceLeaf(self.source, self.start + i, self.size - i))
+
+    def iter_from(self, i: int) -> Iterator[str]:
+        return self.source.iter_lines(self.start + i, self.start + self.size)
+
+
+class _Node:
+    __slots__ = ("left", "right", "size", "height", "leaves")
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+        self.size = left.size + right.size
+        self.height = max(left.height, right.height) + 1
+        self.leaves = left.leaves + right.leaves
+
+
+# tree helpers (nodes are never mutated after creation)
+def _balance(l, r):
+    hl, hr = l.height, r.height
+    if hl > hr + 1:
+        if l.left.height >= l.right.height:
+            return _Node(l.left, _Node(l.right, r))
+        lr = l.right
+        return _Node(_Node(l.left, lr.left), _Node(lr.right, r))
+    if hr > hl + 1:
+        if r.right.height >= r.left.height:
+            return _Node(_Node(l, r.left), r.right)
+        rl = r.left
+        return _Node(_Node(l, rl.left), _Node(rl.right, r.right))
+    return _Node(l, r)
+
+
+def _mergeable(a, b) -> bool:
+    return type(a) is _Leaf and type(b) is _Leaf and a.size + b.size <= LEAF_MAX
+
+
+def _join(a, b):
+    if a is None or a.size == 0:
+        return b
+    if b is None or b.size == 0:
+        return a
+    if _mergeable(a, b):
+        return _Leaf(a.items + b.items)
+
+    ha, hb = a.height, b.height
+    # keep small edits from piling up one-line leaves
+    if hb == 0 and ha >= 1 and _mergeable(a.right, b):
+        return _Node(a.left, _Leaf(a.right.items + b.items))
+    if ha == 0 and hb >= 1 and _mergeable(a, b.left):
+        return _Node(_Leaf(a.items + b.left.items), b.right)
+
+    if ha > hb + 1:
+        return _balance(a.left, _join(a.right, b))
+    if hb > ha + 1:
+        return _balance(_join(a, b.left), b.right)
+    return _Node(a, b)
+
+
+def _split(t, i: int):
+    # -> (first i lines, rest)
+    if t is None:
+        return None, None
+    if i <= 0:
+        return None, t
+    if i >= t.size:
+        return t, None
+    if t.height == 0:
+        return t.split(i)
+
+    ls = t.left.size
+    if i < ls:
+        a, b = _split(t.left, i)
+        return a, _join(b, t.right)
+    if i == ls:
+        return t.left, t.right
+    a, b = _split(t.right, i - ls)
+    return _join(t.left, a), b
+
+
+def _set(t, i: int, value: str):
+    if t.height == 0:
+        return t.set(i, value)
+    ls = t.left.size
+    if i < ls:
+        return _join(_set(t.left, i, value), t.right)
+    return _join(t.left, _set(t.right, i - ls, value))
+
+
+def _build_leaves(leaves: List, lo: int, hi: int):
+    if hi - lo == 1:
+        return leaves[lo]
+    mid = (lo + hi) // 2
+    return _Node(_build_leaves(leaves, lo, mid), _build_leaves(leaves, mid, hi))
+
+
+def _build(lines: Iterable[str]):
+    lines = tuple(lines)
+    if not lines:
+        return None
+    leaves = [_Leaf(lines[i:i+LEAF_MAX]) for i in range(0, len(lines), LEAF_MAX)]
+    return _build_leaves(leaves, 0, len(leaves))
+
+
+def _iter_leaves_from(t, i: int):
+    # yields (leaf, offset in leaf)
+    stack = []
+    while t is not None and t.height:
+        ls = t.left.size
+        if i < ls:
+            stack.append(t.right)
+            t = t.left
+        else:
+            i -= ls
+            t = t.right
+    if t is not None:
+        yield t, i
+    while stack:
+        t = stack.pop()
+        while t.height:
+            stack.append(t.right)
+            t = t.left
+        yield t, 0
+
+
+class LineRope:
+    """
+        균형 트리(rope) 기반 라인 저장소
+        - list와 같은 방식으로 사용 (index/slice 대입, insert, del)
+        - 편집 비용 O(log n), 노드는 불변이라 copy()는 O(1)
+    """
+    __slots__ = ("_root",)
+
+    def __init__(self, lines: Iterable[str] = ()):
+        self._root = _build(lines)
+
+    @classmethod
+    def from_source(cls, source, count: int) -> "LineRope":
+        # lazily backed rope: lines are fetched from `source` when accessed
+        rope = cls()
+        if count > 0:
+            rope._root = _SourceLeaf(source, 0, count)
+        return rope
+
+    def __len__(self) -> int:
+        return 0 if self._root is None else self._root.size
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iter_from(0)
+
+    def __repr__(self) -> str:
+        return f"LineRope({len(self)} lines)"
+
+    def _index(self, i: int) -> int:
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("LineRope index out of range")
+        return i
+
+    def _range(self, s: slice) -> Tuple[int, int]:
+        start, stop, step = s.indices(len(self))
+        if step != 1:
+            raise ValueError("LineRope does not support extended slices")
+        return start, max(start, stop)
+
+    def iter_from(self, start: int) -> Iterator[str]:
+        for leaf, off in _iter_leaves_from(self._root, max(0, start)):
+            yield from leaf.iter_from(off)
+
+    def __getitem__(self, key: Union[int, slice]):
+        if isinstance(key, slice):
+            a, b = self._range(key)
+            return list(islice(self.iter_from(a), b - a))
+
+        i = self._index(key)
+        t = self._root
+        while t.height:
+            ls = t.left.size
+            if i < ls:
+                t = t.left
+            else:
+                i -= ls
+                t = t.right
+        return t.get(i)
+
+    def __setitem__(self, key: Union[int, slice], value) -> None:
+        if isinstance(key, slice):
+            a, b = self._range(key)
+            left, rest = _split(self._root, a)
+            _, right = _split(rest, b - a)
+            self._root = _join(_join(left, _build(value)), right)
+            return
+        self._root = _set(self._root, self._index(key), value)
+
+    def __delitem__(self, key: Union[int, slice]) -> None:
+        if not isinstance(key, slice):
+            i = self._index(key)
+            key = slice(i, i + 1)
+        self[key] = ()
+
+    def insert(self, i: int, line: str) -> None:
+        n = len(self)
+        if i < 0:
+            i = max(0, i + n)
+        i = min(i, n)
+        self[i:i] = (line,)
+
+    def append(self, line: str) -> None:
+        self.insert(len(self), line)
+
+    def extend(self, lines: Iterable[str]) -> None:
+        n = len(self)
+        self[n:n] = lines
+
+    def copy(self) -> "LineRope":
+        other = LineRope()
+        other._root = self._root
+        return other
+
+    def leaf_count(self) -> int:
+        return 0 if self._root is None else self._root.leaves
+
+    def fragmentation(self) -> float:
+        # leaves per leaf a fresh build would have (1.0 = compact)
+        n = len(self)
+        return self.leaf_count() / -(-n // LEAF_MAX) if n else 1.0
+
+    def compact(self) -> None:
+        # rebuild into full leaves (after many small edits)
+        self._root = _build(self)
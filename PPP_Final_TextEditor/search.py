@@ -0,0 +1,146 @@
+from __future__ import annotations
+from bisect import bisect_left
+from itertools import islice
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from core import TextBuffer, Cursor, TICK_ROWS
+from patterns import LITERAL, SearchOptions, compile_pattern, is_multiline
+from prefix_sum import PrefixSumTree
+
+
+class SearchIndex:
+    """
+        현재 검색어의 매치 위치 인덱스
+        - 줄마다 매치 개수를 PrefixSumTree에 저장: 편집은 바뀐 줄만 splice (뒤쪽 줄 번호는 따로 옮기지 않음)
+        - next/prev/전체 개수는 개수 합으로 O(log n), 열 위치는 찾은 줄 하나만 다시 스캔
+        - 처음 한 번 전체 스캔, 이후에는 TextBuffer 변경 알림으로 바뀐 줄만 다시 스캔
+        - 여러 줄에 걸치는 패턴은 인덱싱하지 않음 (indexed == False)
+        - listen=False: 스냅샷 위에서 워커가 만든 뒤 adopt()로 넘겨받는 용도
+    """
+    def __init__(self, buf: TextBuffer, listen: bool = True):
+        self.buf = buf
+        self.query = ""
+        self.opts = LITERAL
+        self.indexed = False
+        self._pattern = None
+        self._counts = PrefixSumTree()      # matches per line
+        self._tick: Optional[Callable[[int], None]] = None
+        if listen:
+            buf.add_listener(self._on_changed)
+
+    def detach(self) -> None:
+        self.buf.remove_listener(self._on_changed)
+
+    def set_query(self, query: str, opts: SearchOptions = LITERAL,
+                  tick: Optional[Callable[[int], None]] = None) -> None:
+        # may raise re.error for a bad regex; tick(row) as in TextBuffer.plan_replace_all
+        if self.is_current(query, opts):
+            return
+        self._pattern = None
+        if query and not opts.literal:
+            self._pattern = compile_pattern(query, opts)
+        self.query = query
+        self.opts = opts
+        self.indexed = bool(query) and not is_multiline(query, opts)
+        self._tick = tick
+        try:
+            self._rebuild()
+        finally:
+            self._tick = None
+
+    def is_current(self, query: str, opts: SearchOptions) -> bool:
+        return query == self.query and opts == self.opts
+
+    def adopt(self, other: "SearchIndex") -> None:
+        # take over an index built on a snapshot of the same buffer version
+        self.query = other.query
+        self.opts = other.opts
+        self.indexed = other.indexed
+        self._pattern = other._pattern
+        self._counts = other._counts
+
+    @property
+    def count(self) -> int:
+        return self._counts.total
+
+    # scanning
+    def _scan_line(self, line: str) -> List[Tuple[int, int]]:
+        # non-overlapping, left to right
+        if self._pattern is not None:
+            return [m.span() for m in self._pattern.finditer(line) if m.end() > m.start()]
+        q = self.query
+        cols = []
+        i = line.find(q)
+        while i != -1:
+            cols.append((i, i + len(q)))
+            i = line.find(q, i + len(q))
+        return cols
+
+    def _count_rows(self, lines, first: int) -> List[int]:
+        # same matches as _scan_line; str.count is non-overlapping too
+        q = self.query
+        literal = self._pattern is None
+        tick = self._tick
+        counts = []
+        for r, line in enumerate(lines, first):
+            if tick is not None and not r % TICK_ROWS:
+                tick(r)
+            counts.append(line.count(q) if literal else len(self._scan_line(line)))
+        return counts
+
+    def _rebuild(self) -> None:
+        self._counts = PrefixSumTree(self._count_rows(self.buf.iter_lines(), 0) if self.indexed else ())
+
+    def _on_changed(self, row: int, removed: int, added: int) -> None:
+        if not self.indexed:
+            return
+        self._counts.splice(row, removed, self._count_rows(islice(self.buf.iter_lines(row), added), row))
+
+    def _cols(self, row: int) -> List[Tuple[int, int]]:
+        return self._scan_line(self.buf.lines[row])
+
+    def _row_of(self, k: int) -> int:
+        # row holding match number k (0-based, k < count)
+        return self._counts.find(k)[0]
+
+    # lookup, matches are (row, start col, end col)
+    def next_after(self, pos: Cursor) -> Optional[Tuple[int, int, int]]:
+        # first match starting at or after pos
+        counts = self._counts
+        if pos.row < len(counts) and counts.get(pos.row):
+            cols = self._cols(pos.row)
+            j = bisect_left(cols, (pos.col,))
+            if j < len(cols):
+                return (pos.row, *cols[j])
+        k = counts.prefix(pos.row + 1)
+        if k >= counts.total:
+            return None
+        row = self._row_of(k)
+        return (row, *self._cols(row)[0])
+
+    def prev_before(self, pos: Cursor) -> Optional[Tuple[int, int, int]]:
+        # last match starting strictly before pos
+        counts = self._counts
+        if pos.row < len(counts) and counts.get(pos.row):
+            cols = self._cols(pos.row)
+            j = bisect_left(cols, (pos.col,)) - 1
+            if j >= 0:
+                return (pos.row, *cols[j])
+        k = counts.prefix(pos.row)
+        if k == 0:
+            return None
+        row = self._row_of(k - 1)
+        return (row, *self._cols(row)[-1])
+
+    def matches(self, first_row: int = 0, last_row: Optional[int] = None) -> Iterator[Tuple[int, int, int]]:
+        # every match in rows [first_row, last_row]; rows without matches are skipped by count
+        counts = self._counts
+        k = counts.prefix(first_row)
+        while k < counts.total:
+            row = self._row_of(k)
+            if last_row is not None and row > last_row:
+                return
+            cols = self._cols(row)
+            for a, b in cols:
+                yield row, a, b
+            k += len(cols)
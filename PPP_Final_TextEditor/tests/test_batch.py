@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+import batch
+from batch import _edit_endings, iter_files, main, replace_in_file
+from patterns import LITERAL, SearchOptions
+
+
+def _write(path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_mixed_line_endings_kept(tmp_path):
+    path = _write(tmp_path / "mixed.txt", b"foo\r\nbar\nfoo\r\nlast\rfoo")
+    res = replace_in_file(str(path), "foo", "x", LITERAL)
+    assert (res.count, res.error) == (3, "")
+    assert path.read_bytes() == b"x\r\nbar\nx\r\nlast\rx"
+
+
+def test_new_line_breaks_use_the_dominant_ending(tmp_path):
+    path = _write(tmp_path / "mixed.txt", b"a foo b\r\nbar\nc\r\n")
+    replace_in_file(str(path), "foo", "1\n2\n3", LITERAL)
+    assert path.read_bytes() == b"a 1\r\n2\r\n3 b\r\nbar\nc\r\n"
+
+
+def test_multiline_match_keeps_span_ending(tmp_path):
+    path = _write(tmp_path / "mixed.txt", b"keep\r\nfoo\nbar\rtail\n")
+    replace_in_file(str(path), "foo\nbar", "joined", LITERAL)
+    assert path.read_bytes() == b"keep\r\njoined\rtail\n"
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_edit_endings_match_line_count(seed):
+    rng = random.Random(seed)
+    n = rng.randrange(1, 30)
+    ends = [rng.choice(["\n", "\r\n", "\r"]) for _ in range(n - 1)] + [""]
+    edits = []
+    row = 0
+    while True:
+        row += rng.randrange(0, 4)
+        count = rng.randrange(1, 4)
+        if row + count > n:
+            break
+        edits.append((row, count, ["x"] * rng.randrange(1, 5)))
+        row += count
+    out = _edit_endings(ends, edits, "\n")
+    new_len = n + sum(len(new) - count for _, count, new in edits)
+    assert len(out) == new_len
+    assert out[-1] == ""
+
+
+def test_uniform_file_round_trips(tmp_path):
+    data = "한글 foo\r\n".encode("cp949") * 3
+    path = _write(tmp_path / "cp949.txt", data)
+    replace_in_file(str(path), "foo", "bar", LITERAL)
+    assert path.read_bytes() == data.replace(b"foo", b"bar")
+
+
+def test_dry_run_and_binary_untouched(tmp_path):
+    text = _write(tmp_path / "a.txt", b"foo\r\nfoo\n")
+    binary = _write(tmp_path / "b.bin", b"foo\0foo")
+    assert replace_in_file(str(text), "foo", "x", LITERAL, dry_run=True).count == 2
+    assert replace_in_file(str(binary), "foo", "x", LITERAL).count == 0
+    assert text.read_bytes() == b"foo\r\nfoo\n"
+    assert binary.read_bytes() == b"foo\0foo"
+
+
+def test_regex_and_whole_word(tmp_path):
+    path = _write(tmp_path / "a.txt", b"cat catalog cat\nbob@old.com\n")
+    replace_in_file(str(path), "cat", "dog", SearchOptions(whole_word=True))
+    replace_in_file(str(path), r"(\w+)@old\.com", r"\1@new.com", SearchOptions(regex=True))
+    assert path.read_bytes() == b"dog catalog dog\nbob@new.com\n"
+
+
+def test_iter_files_filters(tmp_path):
+    _write(tmp_path / "a.txt", b"")
+    _write(tmp_path / "b.md", b"")
+    _write(tmp_path / "sub" / "c.txt", b"")
+    _write(tmp_path / ".hidden" / "d.txt", b"")
+    _write(tmp_path / "skip" / "e.txt", b"")
+    found = sorted(p[len(str(tmp_path)) + 1:] for p in
+                   iter_files([str(tmp_path)], ["*.txt"], ["skip"]))
+    assert found == ["a.txt", "sub/c.txt"]
+
+
+def test_exit_codes(tmp_path, capsys):
+    _write(tmp_path / "a.txt", b"foo\n")
+    args = ["-j", "1", "-q"]
+    assert main(["nothing", "x", str(tmp_path)] + args) == 1
+    assert main(["foo", "bar", str(tmp_path), "-n"] + args) == 0
+    assert (tmp_path / "a.txt").read_bytes() == b"foo\n"
+    assert main(["foo", "bar", str(tmp_path)] + args) == 0
+    assert (tmp_path / "a.txt").read_bytes() == b"bar\n"
+    assert main(["(", "x", str(tmp_path), "-r"] + args) == 2
+    assert main(["bar", "x", str(tmp_path / "missing.txt")] + args) == 2
+    assert "missing.txt: error" in capsys.readouterr().err
+
+
+def test_pending_bounded(tmp_path, monkeypatch):
+    # more files than the in-flight window still all get processed
+    monkeypatch.setattr(batch, "PENDING_PER_WORKER", 1)
+    for i in range(5):
+        _write(tmp_path / f"{i}.txt", b"foo\n")
+    results = list(batch.run(iter_files([str(tmp_path)], [], []), "foo", "x", LITERAL, jobs=1))
+    assert sorted(r.count for r in results) == [1] * 5
@@ -0,0 +1,114 @@
+import os
+import random
+
+import pytest
+
+from buffer_pool import COMPACT_FRAGMENTATION, BufferPool, Document, estimate_bytes
+from core import Cursor, InsertCommand, TextBuffer
+from rope import LEAF_MAX
+
+
+def _doc(tmp_path, name, text, backend="rope"):
+    path = tmp_path / name
+    path.write_text(text)
+    return Document(str(path), TextBuffer(text, backend=backend))
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+def test_text_size_tracks_edits(backend):
+    rng = random.Random(backend)
+    doc = Document(None, TextBuffer("\n".join("x" * rng.randrange(50) for _ in range(500)), backend=backend))
+    buf = doc.buf
+    assert doc.text_size.total == estimate_bytes(buf)
+    for _ in range(200):
+        row = rng.randrange(len(buf.lines))
+        col = rng.randint(0, len(buf.lines[row]))
+        if rng.random() < 0.5:
+            buf.insert_text_at(Cursor(row, col), rng.choice(["a", "bc\n", "\n\n", "long text"]))
+        else:
+            end_row = min(len(buf.lines) - 1, row + rng.randrange(2))
+            end = Cursor(end_row, len(buf.lines[end_row]))
+            buf.delete_range(Cursor(row, col), end)
+        assert doc.text_size.total == estimate_bytes(buf)
+    buf.set_text("short")
+    assert doc.text_size.total == estimate_bytes(buf)
+
+
+def test_text_size_follows_buffer_swaps():
+    doc = Document(None, TextBuffer("abc"))
+    old = doc.buf
+    assert doc.text_size.total == estimate_bytes(old)
+    doc.buf = TextBuffer("a\nbb\nccc")
+    old.insert_text_at(Cursor(0, 0), "not counted")
+    assert doc.text_size.total == estimate_bytes(doc.buf)
+    doc.buf = None
+    assert doc.text_size is None
+
+
+def test_deactivate_compacts_only_fragmented(tmp_path):
+    pool = BufferPool()
+    doc = pool.add(_doc(tmp_path, "a.txt", "\n".join(str(i) for i in range(LEAF_MAX * 20))))
+    root = doc.buf.lines._root
+    pool.deactivate(doc)
+    assert doc.buf.lines._root is root        # compact, left alone
+
+    # leaves of 40 lines: too big to merge with a neighbour, 1.6 times the leaves needed
+    for i in range(LEAF_MAX * 4):
+        doc.buf.append_text("".join(f"\n{i}.{j}" for j in range(40)))
+    assert doc.buf.lines.fragmentation() > COMPACT_FRAGMENTATION
+    text = doc.buf.get_text()
+    pool.deactivate(doc)
+    assert doc.buf.lines.fragmentation() == 1.0
+    assert doc.buf.get_text() == text
+    assert doc.size == estimate_bytes(doc.buf) + doc.undo.memory_usage()
+
+
+def test_evict_and_reload(tmp_path):
+    pool = BufferPool(budget=1)
+    clean = pool.add(_doc(tmp_path, "clean.txt", "clean\ntext"))
+    dirty = pool.add(_doc(tmp_path, "dirty.txt", "dirty"))
+    dirty.buf.insert_text_at(Cursor(0, 5), " edited\nline")
+    active = pool.add(_doc(tmp_path, "active.txt", "active"))
+
+    pool.deactivate(clean)
+    pool.deactivate(dirty)
+    assert active.resident
+    assert not clean.resident and not dirty.resident
+    assert dirty.spill_path is not None and dirty.is_modified()
+    assert not clean.is_modified()
+    assert pool.memory_usage() == active.size
+
+    pool.activate(dirty)
+    assert dirty.buf.get_text() == "dirty edited\nline"
+    assert dirty.is_modified() and dirty.spill_path is None
+    pool.activate(clean)
+    assert clean.buf.get_text() == "clean\ntext"
+    assert not clean.is_modified()
+    assert clean.text_size.total == estimate_bytes(clean.buf)
+
+
+def test_reload_drops_history_when_file_changed(tmp_path):
+    pool = BufferPool(budget=1)
+    doc = pool.add(_doc(tmp_path, "a.txt", "abc"))
+    doc.undo.push_and_do(InsertCommand(Cursor(0, 0), "x"), doc.buf, Cursor(0, 0))
+    doc.mark_saved()
+    (tmp_path / "a.txt").write_text("xabc")
+    pool.add(_doc(tmp_path, "b.txt", "b"))
+    pool.deactivate(doc)
+    assert not doc.resident
+    (tmp_path / "a.txt").write_text("changed outside")
+    pool.activate(doc)
+    assert doc.buf.get_text() == "changed outside"
+    assert not doc.undo.can_undo()
+
+
+def test_close_removes_spill(tmp_path):
+    pool = BufferPool(budget=1)
+    doc = pool.add(Document(None, TextBuffer("untitled")))
+    pool.add(Document(None, TextBuffer("active")))
+    pool.deactivate(doc)
+    spill = doc.spill_path
+    assert spill is not None
+    pool.close(doc)
+    assert not os.path.exists(spill)
+    assert doc not in pool.docs
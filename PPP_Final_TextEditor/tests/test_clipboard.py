@@ -0,0 +1,115 @@
+import os
+import random
+import time
+
+import pytest
+
+from core import BatchCommand, Cursor, TextBuffer, UndoStack
+from textio import normalize_newlines
+
+
+def _text(rng: random.Random, lines: int) -> str:
+    return "\n".join("".join(rng.choice("ab 한") for _ in range(rng.randrange(12))) for _ in range(lines))
+
+
+def _cursor(rng: random.Random, buf: TextBuffer) -> Cursor:
+    row = rng.randrange(len(buf.lines))
+    return Cursor(row, rng.randint(0, len(buf.lines[row])))
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+@pytest.mark.parametrize("chunk_lines", [1, 2, 5, 4096])
+def test_range_chunks_join_to_get_range(backend, chunk_lines):
+    rng = random.Random(chunk_lines)
+    buf = TextBuffer(_text(rng, 60), backend=backend)
+    for _ in range(50):
+        a, b = sorted([_cursor(rng, buf), _cursor(rng, buf)], key=lambda c: (c.row, c.col))
+        expected = buf.get_range(a, b)
+        assert "".join(buf.iter_range_chunks(a, b, chunk_lines)) == expected
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+def test_large_paste_is_one_splice_and_one_step(backend):
+    rng = random.Random(1)
+    buf = TextBuffer(_text(rng, 20), backend=backend)
+    before = buf.get_text()
+    pasted = "\r\n".join(_text(rng, 1) for _ in range(5000)) + "\rtail"
+    calls = []
+    buf.add_listener(lambda row, removed, added: calls.append((row, removed, added)))
+    undo = UndoStack()
+
+    pos = Cursor(3, 2)
+    end = undo.push_and_do(BatchCommand([(pos, pos, pasted)]), buf, pos)
+    text = normalize_newlines(pasted)
+    offset = sum(len(line) + 1 for line in before.split("\n")[:3]) + 2
+    assert buf.get_text() == before[:offset] + text + before[offset:]
+    assert calls == [(3, 1, text.count("\n") + 1)]
+    assert (end.row, end.col) == (3 + text.count("\n"), len("tail"))
+
+    undo.undo(buf, end)
+    assert buf.get_text() == before
+    assert len(calls) == 2
+
+
+def test_paste_over_selection_and_cut_text():
+    buf = TextBuffer("one\ntwo\nthree")
+    undo = UndoStack()
+    sel = (Cursor(0, 1), Cursor(2, 2))
+    cut = BatchCommand([(sel[0], sel[1], "")])
+    undo.push_and_do(cut, buf, sel[1])
+    assert cut.cmds[0].deleted_text == "ne\ntwo\nth"
+    assert buf.get_text() == "oree"
+    undo.undo(buf, Cursor(0, 0))
+    cmd = BatchCommand([(sel[0], sel[1], "X\nY")])
+    undo.push_and_do(cmd, buf, sel[1])
+    assert buf.get_text() == "oX\nYree"
+    assert cmd.carets == [Cursor(1, 1)]
+
+
+# through the widget (needs Qt)
+
+@pytest.fixture
+def editor():
+    QtWidgets = pytest.importorskip("PyQt6.QtWidgets")
+    # headless runs: no display needed
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    from editor_widget import EditorWidget
+    w = EditorWidget()
+    yield w, app
+    w.close()
+
+
+def test_widget_cut_copy_paste(editor):
+    w, app = editor
+    w.set_lines(["abc", "def", "ghi"])
+    w.anchor, w.cursor = Cursor(0, 1), Cursor(2, 1)
+    w.copy_selection()
+    assert app.clipboard().text() == "bc\ndef\ng"
+    w.cut_selection()
+    assert w.buf.get_text() == "ahi"
+    assert w.selection() is None
+    w.cursor = Cursor(0, 3)
+    w.paste()
+    assert w.buf.get_text() == "ahibc\ndef\ng"
+    w.undo.undo(w.buf, w.cursor)
+    assert w.buf.get_text() == "ahi"
+
+
+def test_widget_async_copy(editor, monkeypatch):
+    import editor_widget
+    w, app = editor
+    monkeypatch.setattr(editor_widget, "COPY_ASYNC_LINES", 2)
+    lines = [f"line {i}" for i in range(20)]
+    w.set_lines(lines)
+    done = []
+    w.taskFinished.connect(lambda kind, n, error: done.append((kind, n, error)))
+    w.anchor, w.cursor = Cursor(1, 2), Cursor(15, 3)
+    w.copy_selection()
+    end = time.monotonic() + 5
+    while not done:
+        assert time.monotonic() < end
+        app.processEvents()
+        time.sleep(0.001)
+    assert done == [("copy", 15, "")]
+    assert app.clipboard().text() == w.buf.get_range(Cursor(1, 2), Cursor(15, 3))
@@ -0,0 +1,54 @@
+import os
+import stat
+
+import pytest
+
+import fileio
+from fileio import write_atomic
+
+
+def _mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_new_file_follows_umask(tmp_path):
+    path = tmp_path / "new.txt"
+    write_atomic(str(path), ["a\n", "b"])
+    assert path.read_text() == "a\nb"
+    assert _mode(path) == fileio.NEW_FILE_MODE
+    # what a plain open() gives under the same umask
+    plain = tmp_path / "plain.txt"
+    with open(plain, "w"):
+        pass
+    assert _mode(path) == _mode(plain)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_existing_mode_kept(tmp_path):
+    path = tmp_path / "script.sh"
+    path.write_text("old")
+    os.chmod(path, 0o750)
+    write_atomic(str(path), ["new"])
+    assert path.read_text() == "new"
+    assert _mode(path) == 0o750
+
+
+def test_chunks_newline_and_bom(tmp_path):
+    path = tmp_path / "crlf.txt"
+    write_atomic(str(path), ["x\ny", "\nz"], encoding="utf-8", newline="\r\n", bom=True)
+    assert path.read_bytes() == b"\xef\xbb\xbfx\r\ny\r\nz"
+
+
+def test_failed_write_keeps_original(tmp_path):
+    path = tmp_path / "keep.txt"
+    path.write_text("original")
+
+    def chunks():
+        yield "partial"
+        raise RuntimeError("disk full")
+
+    with pytest.raises(RuntimeError):
+        write_atomic(str(path), chunks())
+    assert path.read_text() == "original"
+    assert os.listdir(tmp_path) == ["keep.txt"]
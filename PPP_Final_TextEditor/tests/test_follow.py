@@ -0,0 +1,92 @@
+import os
+import random
+
+import pytest
+
+from core import TextBuffer
+from follow import FileFollower
+from textio import read_document, read_document_sized
+
+
+class Tail:
+    # what the editor does: read the file once, then append every poll
+    def __init__(self, path):
+        self.path = path
+        lines, self.fmt, size = read_document_sized(str(path))
+        self.buf = TextBuffer()
+        self.buf.set_lines(lines, self.fmt)
+        self.follower = FileFollower(str(path), self.fmt, size)
+
+    def poll(self, max_bytes=1 << 20):
+        text, restarted = self.follower.poll(max_bytes)
+        if restarted:
+            self.buf.set_lines([""])
+        self.buf.append_text(text)
+        return text, restarted
+
+    def check(self):
+        # same lines as reading the whole file again
+        assert self.buf.lines == read_document(str(self.path))[0]
+
+
+def _append(path, data: bytes):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+@pytest.mark.parametrize("head,tail", [
+    (b"one\r", b"\ntwo\r\n"),       # CRLF split between the open and the first poll
+    (b"one\r\n", b"two\r\n"),
+    (b"one", b"\r\ntwo"),
+    (b"", b"\r\n\r\n"),
+    (b"one\r", b"\rtwo"),           # two bare CRs are two breaks
+])
+def test_crlf_split_at_open(tmp_path, head, tail):
+    path = tmp_path / "log.txt"
+    path.write_bytes(head)
+    t = Tail(path)
+    t.check()
+    _append(path, tail)
+    t.poll()
+    t.check()
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "cp949", "utf-16-le"])
+@pytest.mark.parametrize("seed", range(5))
+def test_random_appends_match_full_read(tmp_path, encoding, seed):
+    rng = random.Random(seed)
+    path = tmp_path / "log.txt"
+    bom = b"\xff\xfe" if encoding == "utf-16-le" else b""
+    path.write_bytes(bom + "시작\r\n".encode(encoding))
+    t = Tail(path)
+    for _ in range(40):
+        piece = "".join(rng.choice(["a", "한", "\r", "\n", "\r\n", " "]) for _ in range(rng.randrange(1, 8)))
+        data = piece.encode(encoding)
+        # cut anywhere, even inside a character or a \r\n
+        cut = rng.randint(0, len(data))
+        _append(path, data[:cut])
+        t.poll(max_bytes=rng.randint(1, 8))
+        _append(path, data[cut:])
+        t.poll(max_bytes=rng.randint(1, 8))
+        while t.follower.pending:
+            t.poll(max_bytes=rng.randint(1, 8))
+        t.check()
+
+
+def test_truncate_restarts(tmp_path):
+    path = tmp_path / "log.txt"
+    path.write_bytes(b"old line\r")
+    t = Tail(path)
+    path.write_bytes(b"\nnew")
+    text, restarted = t.poll()
+    assert restarted
+    t.check()
+
+
+def test_missing_file_raises(tmp_path):
+    path = tmp_path / "log.txt"
+    path.write_bytes(b"x")
+    t = Tail(path)
+    os.unlink(path)
+    with pytest.raises(OSError):
+        t.poll()
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from core import Cursor, TextBuffer
+from highlight import CLikeLexer, Highlighter, Lexer, PythonLexer, lexer_for_path
+
+
+PIECES = {
+    PythonLexer: ["x = 1", '"""', "'''", "# c", "def f():", "'s'", '"""doc"""', "pass"],
+    CLikeLexer: ["int x;", "/*", "*/", "// c", '"s"', "/* a */", "return 0;"],
+}
+
+
+def _full_states(lexer, lines):
+    # end state of every line, lexing from the top
+    states = []
+    state = 0
+    for line in lines:
+        state = lexer.lex_line(line, state)[1]
+        states.append(state)
+    return states
+
+
+def _line(rng, lexer_type):
+    return " ".join(rng.choice(PIECES[lexer_type]) for _ in range(rng.randrange(3)))
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+@pytest.mark.parametrize("lexer_type", [PythonLexer, CLikeLexer])
+@pytest.mark.parametrize("seed", range(6))
+def test_incremental_states_match_full_lex(backend, lexer_type, seed):
+    rng = random.Random(seed)
+    buf = TextBuffer("\n".join(_line(rng, lexer_type) for _ in range(120)), backend=backend)
+    hl = Highlighter(buf, lexer_type())
+    for _ in range(60):
+        row = rng.randrange(len(buf.lines))
+        if rng.random() < 0.6:
+            col = rng.randint(0, len(buf.lines[row]))
+            text = rng.choice(PIECES[lexer_type] + ["\n", "\n" + _line(rng, lexer_type)])
+            buf.insert_text_at(Cursor(row, col), text)
+        else:
+            end_row = min(len(buf.lines) - 1, row + rng.randrange(3))
+            buf.delete_range(Cursor(row, 0), Cursor(end_row, len(buf.lines[end_row])))
+        # only part of the document is looked at, like a viewport
+        upto = rng.randrange(len(buf.lines))
+        hl.ensure(upto)
+        expected = _full_states(hl.lexer, buf.lines)
+        assert list(hl._states[:upto + 1]) == expected[:upto + 1]
+        for r in range(max(0, upto - 5), upto + 1):
+            start = expected[r - 1] if r else 0
+            assert hl.tokens(r, buf.lines[r]) == hl.lexer.lex_line(buf.lines[r], start)[0]
+
+
+def test_ensure_reports_changed_rows():
+    buf = TextBuffer("a = 1\nb = 2\nc = 3")
+    hl = Highlighter(buf, PythonLexer())
+    hl.ensure(2)
+    buf.insert_text_at(Cursor(0, 0), '"""')
+    # rows below now sit inside the string
+    assert hl.ensure(2) == 2
+    assert list(hl._states) == [1, 1, 1]
+
+
+def test_stateless_lexer_keeps_no_state():
+    buf = TextBuffer("\n".join(["line"] * 1000))
+    hl = Highlighter(buf)
+    assert len(hl._states) == 0 and not hl._listening
+    buf.insert_text_at(Cursor(0, 0), "x\n")
+    assert hl.ensure(500) == -1 and len(hl._states) == 0
+
+    hl.set_lexer(PythonLexer())
+    assert hl._listening and len(hl._states) == len(buf.lines)
+    hl.set_lexer(Lexer())
+    assert not hl._listening and len(hl._states) == 0
+    hl.detach()
+
+
+def test_lexer_for_path():
+    assert isinstance(lexer_for_path("a.PY"), PythonLexer)
+    assert isinstance(lexer_for_path("a.cs"), CLikeLexer)
+    assert type(lexer_for_path("a.txt")) is Lexer
+    assert type(lexer_for_path(None)) is Lexer
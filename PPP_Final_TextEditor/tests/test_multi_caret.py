@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from core import BatchCommand, Cursor, TextBuffer, UndoStack, command_from_record, is_insertable
+
+
+def _offset(text: str, c: Cursor) -> int:
+    lines = text.split("\n")
+    return sum(len(line) + 1 for line in lines[:c.row]) + c.col
+
+
+def _cursor(text: str, offset: int) -> Cursor:
+    before = text[:offset].split("\n")
+    return Cursor(len(before) - 1, len(before[-1]))
+
+
+def _reference(text: str, edits):
+    # apply on the plain string from the last edit back; carets at each edit's end
+    spans = [(_offset(text, s), _offset(text, e), t) for s, e, t in edits]
+    for a, b, t in reversed(spans):
+        text = text[:a] + t + text[b:]
+    carets = []
+    shift = 0
+    for a, b, t in spans:
+        shift += len(t) - (b - a)
+        carets.append(b + shift)
+    return text, [_cursor(text, off) for off in carets]
+
+
+def _random_edits(rng: random.Random, text: str):
+    # sorted, non-overlapping (start, end, text) in pre-edit coordinates
+    points = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randrange(2, 12))))
+    edits = []
+    i = 0
+    while i < len(points):
+        a = points[i]
+        b = a
+        if i + 1 < len(points) and rng.random() < 0.4:
+            b = points[i + 1]
+            i += 1
+        new = rng.choice(["", "x", "\t", "ab", "\n", "q\nr"])
+        if a != b or new:
+            edits.append((_cursor(text, a), _cursor(text, b), new))
+        i += 1
+    return edits
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+@pytest.mark.parametrize("seed", range(15))
+def test_batch_matches_sequential_edits(backend, seed):
+    rng = random.Random(seed)
+    text = "\n".join("".join(rng.choice("abc ") for _ in range(rng.randrange(8))) for _ in range(6))
+    buf = TextBuffer(text, backend=backend)
+    undo = UndoStack()
+    edits = _random_edits(rng, text)
+    expected, carets = _reference(text, edits)
+
+    cmd = BatchCommand(edits)
+    undo.push_and_do(cmd, buf, Cursor(0, 0))
+    assert buf.get_text() == expected
+    assert cmd.carets == carets
+
+    undo.undo(buf, Cursor(0, 0))
+    assert buf.get_text() == text
+    undo.redo(buf, Cursor(0, 0))
+    assert buf.get_text() == expected
+
+    # a restored command undoes the same way
+    restored = command_from_record(cmd.to_record())
+    restored.undo(buf, Cursor(0, 0))
+    assert buf.get_text() == text
+
+
+def test_one_key_at_every_caret_undoes_together():
+    buf = TextBuffer("a\nb\nc")
+    undo = UndoStack()
+    carets = [Cursor(0, 1), Cursor(1, 1), Cursor(2, 1)]
+    for ch in "xyz":
+        cmd = BatchCommand([(c, c, ch) for c in carets])
+        undo.push_and_do(cmd, buf, carets[-1])
+        carets = cmd.carets
+        undo.seal()
+    assert buf.get_text() == "axyz\nbxyz\ncxyz"
+    undo.undo(buf, Cursor(0, 0))
+    assert buf.get_text() == "axy\nbxy\ncxy"
+
+
+@pytest.mark.parametrize("text,ok", [
+    ("a", True), ("한", True), ("\t", True), (" ", True), ("ab", True),
+    ("", False), ("\n", False), ("\r", False), ("\x1b", False), ("\x7f", False), ("\b", False),
+])
+def test_is_insertable(text, ok):
+    assert is_insertable(text) is ok
@@ -0,0 +1,138 @@
+import random
+
+import pytest
+
+from core import Cursor, ReplaceLinesCommand, TextBuffer
+from patterns import LITERAL, MULTILINE_WINDOW, SearchOptions, compile_pattern, is_multiline
+
+
+WORDS = ("ab", "AB", "abc", "x", "b", "a_b", "a.b", "xab")
+
+QUERIES = [
+    ("ab", LITERAL),
+    ("a.b", LITERAL),                               # escaped, not a regex
+    ("ab", SearchOptions(case_sensitive=False)),
+    ("ab", SearchOptions(whole_word=True)),
+    ("AB", SearchOptions(case_sensitive=False, whole_word=True)),
+    (r"a\w", SearchOptions(regex=True)),
+    (r"^x", SearchOptions(regex=True)),
+    (r"b$", SearchOptions(regex=True)),
+    (r"b?", SearchOptions(regex=True)),             # empty matches are skipped
+    # spanning lines
+    ("b\nab", LITERAL),
+    ("x\nAB", SearchOptions(case_sensitive=False)),
+    ("b\nx", SearchOptions(whole_word=True)),
+    (r"b\n\w+", SearchOptions(regex=True)),
+    (r"x$\n^a", SearchOptions(regex=True)),
+]
+
+
+def _text(rng: random.Random, lines: int) -> str:
+    return "\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randrange(4))) for _ in range(lines))
+
+
+def _offset(text: str, c: Cursor) -> int:
+    before = text.split("\n")[:c.row]
+    return sum(len(line) + 1 for line in before) + c.col
+
+
+def _cursor(text: str, offset: int) -> Cursor:
+    before = text[:offset].split("\n")
+    return Cursor(len(before) - 1, len(before[-1]))
+
+
+def _first_match(pattern, text: str, pos: int):
+    # reference: first non-empty match at/after pos in the joined text
+    for m in pattern.finditer(text, pos):
+        if m.end() > m.start():
+            return m
+    return None
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+@pytest.mark.parametrize("query,opts", QUERIES)
+def test_find_match_matches_re(backend, query, opts):
+    rng = random.Random(f"{query} {opts}")
+    text = _text(rng, MULTILINE_WINDOW * 3)
+    buf = TextBuffer(text, backend=backend)
+    pattern = compile_pattern(query, opts)
+    for _ in range(40):
+        start = _cursor(text, rng.randint(0, len(text)))
+        m = _first_match(pattern, text, _offset(text, start))
+        expected = None if m is None else (_cursor(text, m.start()), _cursor(text, m.end()))
+        assert buf.find_match(query, start, opts) == expected
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+@pytest.mark.parametrize("query,opts", QUERIES)
+def test_find_walks_every_match(backend, query, opts):
+    rng = random.Random(f"walk {query} {opts}")
+    text = _text(rng, MULTILINE_WINDOW * 3)
+    buf = TextBuffer(text, backend=backend)
+    expected = [(_cursor(text, m.start()), _cursor(text, m.end()))
+                for m in compile_pattern(query, opts).finditer(text) if m.end() > m.start()]
+    found = []
+    pos = Cursor(0, 0)
+    while True:
+        hit = buf.find_match(query, pos, opts)
+        if hit is None:
+            break
+        found.append(hit)
+        pos = hit[1]
+    assert found == expected
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+@pytest.mark.parametrize("query,repl", [
+    ("b\nab", "Z"),
+    (r"(b)\n(\w+)", r"\2\n\1"),
+    (r"x$\n^a", ""),
+])
+def test_multiline_replace_all_matches_re_sub(backend, query, repl):
+    opts = SearchOptions(regex="\\" in query or "$" in query)
+    rng = random.Random(f"{query} {repl}")
+    text = _text(rng, MULTILINE_WINDOW * 3)
+    buf = TextBuffer(text, backend=backend)
+    pattern = compile_pattern(query, opts)
+    expected, n = pattern.subn(repl if opts.regex else (lambda m: repl), text)
+
+    edits, count = buf.plan_replace_all(query, repl, opts)
+    assert count == n
+    ReplaceLinesCommand(edits).do(buf, Cursor(0, 0))
+    assert buf.get_text() == expected
+
+
+def test_next_replacement_expands_templates():
+    buf = TextBuffer("x\nkey=1\nkey=2")
+    opts = SearchOptions(regex=True)
+    assert buf.next_replacement(Cursor(0, 0), r"(\w+)=(\d)", r"\2=\1", opts) == \
+        (Cursor(1, 0), Cursor(1, 5), "1=key")
+    assert buf.next_replacement(Cursor(0, 0), r"x\n(\w+)", r"[\1]", opts) == \
+        (Cursor(0, 0), Cursor(1, 3), "[key]")
+    # literal replacement is not a template
+    assert buf.next_replacement(Cursor(1, 1), "key", r"\1", LITERAL) == (Cursor(2, 0), Cursor(2, 3), r"\1")
+
+
+def test_replace_at_needs_a_match_at_the_cursor():
+    buf = TextBuffer("cat catalog")
+    opts = SearchOptions(whole_word=True)
+    assert not buf.replace_at(Cursor(0, 4), "cat", "dog", opts)
+    assert buf.replace_at(Cursor(0, 0), "cat", "dog", opts)
+    assert buf.get_text() == "dog catalog"
+
+
+def test_compiled_pattern_cached():
+    opts = SearchOptions(regex=True, case_sensitive=False)
+    assert compile_pattern("a+b", opts) is compile_pattern("a+b", SearchOptions(regex=True, case_sensitive=False))
+    assert compile_pattern("a+b", opts) is not compile_pattern("a+b", LITERAL)
+    assert compile_pattern("a+b", LITERAL).search("a+b")
+
+
+@pytest.mark.parametrize("query,opts,multi", [
+    ("a\nb", LITERAL, True),
+    (r"a\nb", LITERAL, False),
+    (r"a\nb", SearchOptions(regex=True), True),
+    ("ab", SearchOptions(regex=True), False),
+])
+def test_is_multiline(query, opts, multi):
+    assert is_multiline(query, opts) is multi
@@ -0,0 +1,137 @@
+import random
+from itertools import accumulate
+
+import pytest
+
+import prefix_sum
+from core import Cursor, TextBuffer
+from line_index import LineIndex
+from prefix_sum import Fenwick, PrefixSumTree
+
+
+def _find(values, target):
+    # largest i with sum(values[:i]) <= target, and what is left of target
+    sums = [0] + list(accumulate(values))
+    i = max(k for k, s in enumerate(sums) if s <= target)
+    return i, target - sums[i]
+
+
+def _check(tree: PrefixSumTree, values, rng: random.Random):
+    assert list(tree) == values
+    assert len(tree) == len(values) and tree.total == sum(values)
+    sums = [0] + list(accumulate(values))
+    for i in range(len(values) + 1):
+        assert tree.prefix(i) == sums[i]
+    for _ in range(20):
+        target = rng.randrange(sum(values) + 5)
+        assert tree.find(target) == _find(values, target)
+
+
+@pytest.mark.parametrize("block", [2, 3, 8, 512])
+@pytest.mark.parametrize("seed", range(4))
+def test_tree_matches_list(monkeypatch, block, seed):
+    # small blocks so splices cross, split and merge blocks
+    monkeypatch.setattr(prefix_sum, "BLOCK", block)
+    rng = random.Random(seed)
+    values = [rng.randrange(4) for _ in range(rng.randrange(0, 40))]
+    tree = PrefixSumTree(values)
+    _check(tree, values, rng)
+    span = min(3 * block, 24)
+    for _ in range(200):
+        if values and rng.random() < 0.3:
+            i = rng.randrange(len(values))
+            v = rng.randrange(5)
+            tree.set(i, v)
+            values[i] = v
+        else:
+            start = rng.randint(0, len(values))
+            removed = rng.randint(0, min(len(values) - start, span))
+            new = [rng.randrange(4) for _ in range(rng.randrange(0, span))]
+            if not values and not new:
+                continue
+            tree.splice(start, removed, new)
+            values[start:start + removed] = new
+        _check(tree, values, rng)
+        if values:
+            i = rng.randrange(len(values))
+            assert tree.get(i) == values[i]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_fenwick_matches_list(seed):
+    rng = random.Random(seed)
+    values = [rng.randrange(5) for _ in range(rng.randrange(1, 70))]
+    tree = Fenwick(values)
+    for _ in range(100):
+        i = rng.randrange(len(values))
+        delta = rng.randrange(-values[i], 5)
+        tree.add(i, delta)
+        values[i] += delta
+        k = rng.randint(0, len(values))
+        assert tree.prefix(k) == sum(values[:k])
+        target = rng.randrange(sum(values) + 3)
+        assert tree.search(target) == _find(values, target)
+
+
+def _line(rng: random.Random) -> str:
+    return " ".join(rng.choice(["ab", "한글", "", "x"]) for _ in range(rng.randrange(5)))
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+@pytest.mark.parametrize("seed", range(5))
+def test_line_index_incremental_matches_build(backend, seed):
+    rng = random.Random(seed)
+    buf = TextBuffer("\n".join(_line(rng) for _ in range(100)), backend=backend)
+    index = LineIndex(buf)
+    index.build()
+    for _ in range(150):
+        row = rng.randrange(len(buf.lines))
+        pos = Cursor(row, rng.randint(0, len(buf.lines[row])))
+        op = rng.randrange(3)
+        if op == 0:
+            buf.insert_text_at(pos, "\n".join(_line(rng) for _ in range(rng.randrange(1, 4))))
+        elif op == 1:
+            end_row = min(len(buf.lines) - 1, row + rng.randrange(3))
+            buf.delete_range(Cursor(row, 0), Cursor(end_row, len(buf.lines[end_row])))
+        else:
+            buf.append_text("\n" + _line(rng))
+        fresh = LineIndex(buf, listen=False)
+        fresh.build()
+        assert list(index._lens) == list(fresh._lens)
+        assert list(index._words) == list(fresh._words)
+
+    text = buf.get_text()
+    assert index.line_count == len(buf.lines)
+    assert index.char_count == len(text)
+    assert index.word_count == len(text.split())
+    index.detach()
+
+
+def test_offset_cursor_round_trip():
+    rng = random.Random(7)
+    buf = TextBuffer("\n".join(_line(rng) for _ in range(50)))
+    index = LineIndex(buf)
+    index.build()
+    text = buf.get_text()
+    offset = 0
+    for row, line in enumerate(buf.lines):
+        assert index.line_start(row) == offset
+        assert index.words_before(row) == len(text[:offset].split())
+        for col in range(len(line) + 1):
+            assert index.offset(Cursor(row, col)) == offset + col
+            assert index.cursor_at(offset + col) == Cursor(row, col)
+        offset += len(line) + 1
+    last = len(buf.lines) - 1
+    assert index.cursor_at(len(text) + 10) == Cursor(last, len(buf.lines[last]))
+    assert index.cursor_at(-3) == Cursor(0, 0)
+
+
+def test_changes_before_build_ignored():
+    buf = TextBuffer("a b\nc")
+    index = LineIndex(buf)
+    buf.insert_text_at(Cursor(0, 0), "x\n")
+    assert not index.ready and index.line_count == 0
+    index.build()
+    assert (index.line_count, index.word_count) == (3, 4)
+    index.reset()
+    assert not index.ready
@@ -0,0 +1,194 @@
+import random
+
+import pytest
+
+from core import BatchCommand, Cursor, DeleteCommand, InsertCommand, ReplaceLinesCommand, TextBuffer, UndoStack
+from recovery import (OP_DO, OP_MERGE, OP_UNDO, RecoveryLog, decode_record, encode_record,
+                      pending_paths, read_header, read_records, replay)
+from undo_journal import text_hash
+
+
+BASE = "first line\nsecond line\nthird"
+
+
+def _random_record(rng: random.Random, depth: int = 0):
+    kind = rng.randrange(3 if depth < 3 else 2)
+    if kind == 0:
+        return rng.choice([0, 1, -1, 127, 128, -129, 2**40, -2**63, rng.randint(-10**6, 10**6)])
+    if kind == 1:
+        return "".join(rng.choice("ab\n한\U0001F600\ud800") for _ in range(rng.randrange(6)))
+    return [_random_record(rng, depth + 1) for _ in range(rng.randrange(4))]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_record_codec_round_trip(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        rec = _random_record(rng)
+        out = bytearray()
+        encode_record(rec, out)
+        assert decode_record(bytes(out)) == (rec, len(out))
+
+
+def test_decode_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_record(b"\x00\x01")
+    out = bytearray()
+    encode_record("hello", out)
+    with pytest.raises(ValueError):
+        decode_record(bytes(out[:-1]))
+
+
+class Session:
+    # an editing session over BASE with a recovery log in `folder`
+    def __init__(self, folder, path, text=BASE):
+        self.buf = TextBuffer(text)
+        self.undo = UndoStack()
+        self.log, self.records = RecoveryLog.open(str(folder), str(path), text_hash(self.buf.iter_chunks()))
+        self.cursor = Cursor(0, 0)
+
+    def start(self):
+        if self.records:
+            self.cursor = replay(self.buf, self.undo, self.records)
+        self.undo.attach_recovery(self.log)
+        return self
+
+    def type(self, row, col, text):
+        self.cursor = Cursor(row, col)
+        for ch in text:
+            self.cursor = self.undo.push_and_do(InsertCommand(self.cursor, ch), self.buf, self.cursor)
+
+    def backspace(self, row, col, n):
+        self.cursor = Cursor(row, col)
+        for _ in range(n):
+            end = self.cursor
+            start = Cursor(end.row, end.col - 1)
+            deleted = self.buf.lines[end.row][start.col:end.col]
+            self.cursor = self.undo.push_and_do(DeleteCommand(start, end, deleted), self.buf, self.cursor)
+
+    def text(self):
+        return self.buf.get_text()
+
+    def history(self):
+        return [cmd.to_record() for cmd in self.undo.history()]
+
+
+def _edit(s: Session):
+    s.type(0, 5, "XYZ")             # merges into one step
+    s.undo.seal()
+    s.type(1, 0, "ab")
+    s.backspace(2, 5, 3)            # one backspace step
+    s.undo.seal()
+    s.cursor = s.undo.undo(s.buf, s.cursor)
+    s.cursor = s.undo.undo(s.buf, s.cursor)
+    s.cursor = s.undo.redo(s.buf, s.cursor)
+    s.undo.seal()
+    s.cursor = s.undo.push_and_do(ReplaceLinesCommand([(0, 1, ["replaced"])]), s.buf, s.cursor)
+    s.cursor = s.undo.push_and_do(BatchCommand([(Cursor(1, 0), Cursor(1, 0), "#"),
+                                                (Cursor(2, 0), Cursor(2, 0), "#")]), s.buf, s.cursor)
+    s.cursor = s.undo.undo(s.buf, s.cursor)     # leaves a redo step
+
+
+def test_replay_restores_text_and_undo_steps(tmp_path):
+    doc = tmp_path / "doc.txt"
+    crashed = Session(tmp_path / "rec", doc).start()
+    _edit(crashed)
+    crashed.log.close()         # "crash": nothing else is written
+
+    ops = [op for op, _, _ in _read_log(crashed.log.path)]
+    assert {OP_DO, OP_MERGE, OP_UNDO} <= set(ops)
+
+    recovered = Session(tmp_path / "rec", doc)
+    assert recovered.records
+    recovered.start()
+    assert recovered.text() == crashed.text()
+    assert recovered.history() == crashed.history()
+    assert recovered.undo.peek_redo().to_record() == crashed.undo.peek_redo().to_record()
+    # undo steps match the crashed session one for one
+    while crashed.undo.can_undo():
+        crashed.cursor = crashed.undo.undo(crashed.buf, crashed.cursor)
+        recovered.cursor = recovered.undo.undo(recovered.buf, recovered.cursor)
+        assert recovered.text() == crashed.text()
+    assert not recovered.undo.can_undo()
+    assert recovered.text() == BASE
+
+
+def _read_log(path):
+    with open(path, "rb") as f:
+        assert read_header(f) is not None
+        return list(read_records(f))
+
+
+def test_replay_is_not_logged_twice(tmp_path):
+    doc = tmp_path / "doc.txt"
+    first = Session(tmp_path / "rec", doc).start()
+    first.type(0, 0, "abc")
+    first.log.close()
+    second = Session(tmp_path / "rec", doc).start()
+    second.type(0, 3, "d")
+    second.log.close()
+    assert [op for op, _, _ in _read_log(second.log.path)] == [OP_DO, OP_MERGE, OP_MERGE, OP_DO]
+    third = Session(tmp_path / "rec", doc).start()
+    assert third.text() == "abcd" + BASE
+
+
+def test_replay_past_known_history_keeps_text(tmp_path):
+    # the log was rebased at a save: it undoes a step this session never had
+    buf = TextBuffer("abcX")
+    undo = UndoStack()
+    cmd = InsertCommand(Cursor(0, 3), "X")
+    cmd._after = (0 << 32) | 4
+    cursor = replay(buf, undo, [(OP_UNDO, cmd), (OP_DO, InsertCommand(Cursor(0, 0), "!"))])
+    assert buf.get_text() == "!abc"
+    assert cursor == Cursor(0, 1)
+    assert len(undo.history()) == 1
+
+
+def test_torn_and_corrupt_tails_are_dropped(tmp_path):
+    doc = tmp_path / "doc.txt"
+    s = Session(tmp_path / "rec", doc).start()
+    s.type(0, 0, "ab")
+    s.undo.seal()
+    s.type(1, 0, "cd")
+    path = s.log.path
+    s.log.close()
+    data = open(path, "rb").read()
+
+    # torn last record: the three complete ones survive
+    open(path, "wb").write(data[:-2])
+    assert len(Session(tmp_path / "rec", doc).records) == 3
+    # flipped byte in the second record's payload: only the first survives
+    open(path, "wb").write(data)
+    ends = [end for _, _, end in _read_log(path)]
+    bad = bytearray(data)
+    bad[ends[1] - 1] ^= 0xFF
+    open(path, "wb").write(bytes(bad))
+    assert len(Session(tmp_path / "rec", doc).records) == 1
+
+
+def test_log_for_other_content_is_discarded(tmp_path):
+    doc = tmp_path / "doc.txt"
+    doc.write_text(BASE)
+    s = Session(tmp_path / "rec", doc).start()
+    s.type(0, 0, "x")
+    s.log.sync()
+    assert pending_paths(str(tmp_path / "rec")) == [str(doc)]
+    s.log.close()
+    other = Session(tmp_path / "rec", doc, text="changed on disk")
+    assert other.records == []
+    assert pending_paths(str(tmp_path / "rec")) == []
+
+
+def test_rebase_keeps_only_edits_after_the_save(tmp_path):
+    doc = tmp_path / "doc.txt"
+    s = Session(tmp_path / "rec", doc).start()
+    s.type(0, 0, "saved ")
+    mark = s.log.size
+    saved = s.text()
+    s.undo.seal()
+    s.type(1, 0, "later ")
+    s.log.rebase(str(doc), text_hash([saved]), mark)
+    s.log.close()
+
+    recovered = Session(tmp_path / "rec", doc, text=saved).start()
+    assert recovered.text() == s.text()
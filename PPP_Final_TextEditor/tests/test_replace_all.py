@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from core import Cursor, ReplaceLinesCommand, TextBuffer, UndoStack, command_from_record
+from patterns import LITERAL, SearchOptions, compile_pattern
+
+
+WORDS = ("ab", "aba", "Ab", "abc", "x", "b", "ab_1", "a-b")
+
+CASES = [
+    ("ab", "Z", LITERAL),
+    ("ab", "", LITERAL),
+    ("ab", "1\n2", LITERAL),                        # replacement adds lines
+    ("ab", r"\1", LITERAL),                         # literal text, not a template
+    ("ab", "Z", SearchOptions(case_sensitive=False)),
+    ("ab", "Z", SearchOptions(whole_word=True)),
+    (r"(a)(b)", r"\2\1", SearchOptions(regex=True)),
+    (r"a\w*", "<\\g<0>>\n", SearchOptions(regex=True)),
+]
+
+
+def _text(rng: random.Random, lines: int) -> str:
+    return "\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randrange(5))) for _ in range(lines))
+
+
+def _reference(text: str, query: str, repl: str, opts: SearchOptions):
+    # re.subn over the whole joined text
+    pattern = compile_pattern(query, opts)
+    return pattern.subn(repl if opts.regex else (lambda m: repl), text)
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+@pytest.mark.parametrize("query,repl,opts", CASES)
+def test_plan_matches_re_sub(backend, query, repl, opts):
+    rng = random.Random(f"{query} {repl} {opts}")
+    text = _text(rng, 300)
+    buf = TextBuffer(text, backend=backend)
+    expected, n = _reference(text, query, repl, opts)
+
+    edits, count = buf.plan_replace_all(query, repl, opts)
+    assert count == n
+    # planning leaves the buffer alone
+    assert buf.get_text() == text
+
+    undo = UndoStack()
+    undo.push_and_do(ReplaceLinesCommand(edits), buf, Cursor(0, 0))
+    assert buf.get_text() == expected
+    assert len(undo.history()) == 1
+
+    undo.undo(buf, Cursor(0, 0))
+    assert buf.get_text() == text
+    undo.redo(buf, Cursor(0, 0))
+    assert buf.get_text() == expected
+
+
+def test_one_listener_change_per_replace():
+    buf = TextBuffer("ab\nx\nab\nab")
+    calls = []
+    buf.add_listener(lambda row, removed, added: calls.append((row, removed, added)))
+    edits, _ = buf.plan_replace_all("ab", "1\n2", LITERAL)
+    ReplaceLinesCommand(edits).do(buf, Cursor(0, 0))
+    assert calls == [(0, 4, 7)]
+
+
+def test_record_round_trip():
+    buf = TextBuffer("ab x\nab\ny")
+    edits, _ = buf.plan_replace_all("ab", "c\nd", LITERAL)
+    cmd = ReplaceLinesCommand(edits)
+    cmd.do(buf, Cursor(0, 0))
+    restored = command_from_record(cmd.to_record())
+    restored.undo(buf, Cursor(0, 0))
+    assert buf.get_text() == "ab x\nab\ny"
+
+
+def test_tick_can_abort():
+    buf = TextBuffer("ab\n" * 10000)
+
+    class Stop(Exception):
+        pass
+
+    def tick(row):
+        if row:
+            raise Stop
+
+    with pytest.raises(Stop):
+        buf.plan_replace_all("ab", "x", LITERAL, tick=tick)
+    assert buf.get_text() == "ab\n" * 10000
+
+
+def test_empty_query_plans_nothing():
+    buf = TextBuffer("ab")
+    assert buf.plan_replace_all("", "x") == ([], 0)
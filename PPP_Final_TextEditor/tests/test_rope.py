@@ -0,0 +1,187 @@
+import random
+from itertools import islice
+
+import pytest
+
+from core import TextBuffer
+from rope import LEAF_MAX, LineRope, _Leaf, _SourceLeaf
+
+
+class FakeSource:
+    # stands in for a mapped file: line i is "src<i>", reads are counted
+    def __init__(self, count: int):
+        self.count = count
+        self.reads = 0
+
+    def line(self, i: int) -> str:
+        assert 0 <= i < self.count
+        self.reads += 1
+        return f"src{i}"
+
+    def iter_lines(self, start: int, stop: int):
+        assert 0 <= start <= stop <= self.count
+        for i in range(start, stop):
+            self.reads += 1
+            yield f"src{i}"
+
+
+def _check_tree(t) -> None:
+    # cached sizes/heights match the children, no empty leaves
+    if t is None:
+        return
+    if t.height == 0:
+        assert t.size > 0
+        if type(t) is _Leaf:
+            assert t.size == len(t.items) <= LEAF_MAX
+        return
+    _check_tree(t.left)
+    _check_tree(t.right)
+    assert t.size == t.left.size + t.right.size
+    assert t.height == max(t.left.height, t.right.height) + 1
+    assert t.leaves == t.left.leaves + t.right.leaves
+
+
+def _check(rope: LineRope, ref: list) -> None:
+    _check_tree(rope._root)
+    assert len(rope) == len(ref)
+    assert list(rope) == ref
+
+
+def _lines(rng: random.Random, tag: str, n: int) -> list:
+    return [f"{tag}{rng.randrange(1000)}" for _ in range(n)]
+
+
+def _bounds(rng: random.Random, n: int):
+    # slice bounds including negative, reversed and out-of-range ones
+    a = rng.randint(-n - 3, n + 3)
+    b = rng.randint(-n - 3, n + 3)
+    return a, b
+
+
+def _random_edit(rng: random.Random, rope: LineRope, ref: list, step: int) -> None:
+    n = len(ref)
+    op = rng.randrange(8)
+    if op == 0:
+        a, b = _bounds(rng, n)
+        new = _lines(rng, f"s{step}.", rng.randrange(LEAF_MAX * 3))
+        rope[a:b] = new
+        ref[a:b] = new
+    elif op == 1:
+        a, b = _bounds(rng, n)
+        del rope[a:b]
+        del ref[a:b]
+    elif op == 2:
+        i = rng.randint(-n - 3, n + 3)
+        rope.insert(i, f"i{step}")
+        ref.insert(i, f"i{step}")
+    elif op == 3:
+        rope.append(f"a{step}")
+        ref.append(f"a{step}")
+    elif op == 4:
+        new = _lines(rng, f"e{step}.", rng.randrange(LEAF_MAX * 2))
+        rope.extend(iter(new))
+        ref.extend(new)
+    elif op == 5 and n:
+        i = rng.randrange(-n, n)
+        rope[i] = f"w{step}"
+        ref[i] = f"w{step}"
+    elif op == 6 and n:
+        i = rng.randrange(-n, n)
+        del rope[i]
+        del ref[i]
+    elif op == 7:
+        a, b = _bounds(rng, n)
+        assert rope[a:b] == ref[a:b]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_edits_match_list(seed):
+    rng = random.Random(seed)
+    ref = _lines(rng, "l", rng.randrange(LEAF_MAX * 8))
+    rope = LineRope(ref)
+    for step in range(150):
+        _random_edit(rng, rope, ref, step)
+        _check(rope, ref)
+    for i in range(-len(ref), len(ref)):
+        assert rope[i] == ref[i]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_source_backed_edits_match_list(seed):
+    rng = random.Random(1000 + seed)
+    n = rng.randrange(1, LEAF_MAX * 20)
+    source = FakeSource(n)
+    rope = LineRope.from_source(source, n)
+    ref = [f"src{i}" for i in range(n)]
+    assert type(rope._root) is _SourceLeaf
+    for step in range(100):
+        _random_edit(rng, rope, ref, step)
+        _check(rope, ref)
+
+
+def test_source_lines_read_lazily():
+    source = FakeSource(100_000)
+    rope = LineRope.from_source(source, 100_000)
+    assert len(rope) == 100_000 and source.reads == 0
+    rope[50_000] = "edited"
+    rope.insert(10, "new")
+    del rope[70_000:80_000]
+    assert source.reads == 0
+    assert rope[50_001] == "edited" and rope[10] == "new"
+    assert list(islice(rope.iter_from(50_000), 3)) == ["src49999", "edited", "src50001"]
+    assert source.reads < 100
+
+
+def test_iter_from_matches_slice():
+    rng = random.Random(7)
+    ref = _lines(rng, "l", LEAF_MAX * 10 + 3)
+    rope = LineRope(ref)
+    for i in range(0, len(ref), LEAF_MAX // 2 - 1):
+        rope.insert(i, f"x{i}")
+        ref.insert(i, f"x{i}")
+    for start in list(range(-2, len(ref) + 3, 5)) + [len(ref) - 1, len(ref)]:
+        assert list(rope.iter_from(start)) == ref[max(0, start):]
+
+
+def test_copy_is_independent():
+    rng = random.Random(3)
+    ref = _lines(rng, "l", LEAF_MAX * 5)
+    rope = LineRope(ref)
+    copy = rope.copy()
+    frozen = list(ref)
+    for step in range(50):
+        _random_edit(rng, rope, ref, step)
+    _check(rope, ref)
+    _check(copy, frozen)
+
+
+def test_fragmentation():
+    rope = LineRope(str(i) for i in range(LEAF_MAX * 10))
+    assert rope.leaf_count() == 10 and rope.fragmentation() == 1.0
+    for i in range(0, LEAF_MAX * 10, 7):
+        rope[i:i + 1] = ["a", "b"]
+    assert rope.fragmentation() > 1.0
+    before = list(rope)
+    rope.compact()
+    assert list(rope) == before and rope.fragmentation() == 1.0
+    assert LineRope().fragmentation() == 1.0
+
+
+def test_extended_slices_rejected():
+    rope = LineRope(["a", "b", "c"])
+    with pytest.raises(ValueError):
+        rope[::2]
+    with pytest.raises(IndexError):
+        rope[3]
+    with pytest.raises(IndexError):
+        rope[-4] = "x"
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+def test_buffer_iter_lines(backend):
+    text = "\n".join(f"line {i}" for i in range(LEAF_MAX * 4))
+    buf = TextBuffer(text, backend=backend)
+    lines = text.split("\n")
+    for start in (0, 1, LEAF_MAX, len(lines) - 1, len(lines), len(lines) + 5):
+        assert list(buf.iter_lines(start)) == lines[start:]
+    assert list(buf.snapshot().iter_lines(LEAF_MAX)) == lines[LEAF_MAX:]
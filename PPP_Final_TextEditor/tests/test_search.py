@@ -0,0 +1,120 @@
+import random
+import re
+
+import pytest
+
+from core import Cursor, TextBuffer
+from patterns import LITERAL, SearchOptions, compile_pattern
+from search import SearchIndex
+
+
+WORDS = ("ab", "aba", "abab", "x", "AB", "b", "", "a b")
+
+QUERIES = [
+    ("ab", LITERAL),
+    ("aba", LITERAL),
+    ("ab", SearchOptions(case_sensitive=False)),
+    ("ab", SearchOptions(whole_word=True)),
+    (r"a\w*", SearchOptions(regex=True)),
+    (r"b?", SearchOptions(regex=True)),        # empty matches are skipped
+]
+
+
+def _line(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randrange(6)))
+
+
+def _expected(buf: TextBuffer, query: str, opts: SearchOptions):
+    # every match from re on each line, the reference for the index
+    pattern = compile_pattern(query, opts) if not opts.literal else re.compile(re.escape(query))
+    return [(r, m.start(), m.end()) for r, line in enumerate(buf.lines)
+            for m in pattern.finditer(line) if m.end() > m.start()]
+
+
+def _random_edit(rng: random.Random, buf: TextBuffer) -> None:
+    n = len(buf.lines)
+    op = rng.randrange(5)
+    row = rng.randrange(n)
+    col = rng.randint(0, len(buf.lines[row]))
+    if op == 0:
+        text = "\n".join(_line(rng) for _ in range(rng.randrange(1, 4)))
+        buf.insert_text_at(Cursor(row, col), text)
+    elif op == 1:
+        end_row = min(n - 1, row + rng.randrange(3))
+        end = Cursor(end_row, rng.randint(0, len(buf.lines[end_row])))
+        start = Cursor(row, col)
+        if (end.row, end.col) < (start.row, start.col):
+            start, end = end, start
+        buf.delete_range(start, end)
+    elif op == 2:
+        buf.insert_text_at(Cursor(row, col), rng.choice(("a", "b", " ", "ab")))
+    elif op == 3:
+        count = min(n - row, rng.randrange(1, 4))
+        buf.apply_line_edits([(row, count, [_line(rng) for _ in range(rng.randrange(0, 4))] or [""])])
+    else:
+        buf.append_text("\n" + _line(rng))
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+@pytest.mark.parametrize("query,opts", QUERIES)
+def test_incremental_matches_rebuild(backend, query, opts):
+    rng = random.Random(f"{backend} {query} {opts}")
+    buf = TextBuffer("\n".join(_line(rng) for _ in range(150)), backend=backend)
+    index = SearchIndex(buf)
+    index.set_query(query, opts)
+    for _ in range(100):
+        _random_edit(rng, buf)
+        expected = _expected(buf, query, opts)
+        assert list(index.matches()) == expected
+        assert index.count == len(expected)
+
+    fresh = SearchIndex(buf, listen=False)
+    fresh.set_query(query, opts)
+    assert list(fresh._counts) == list(index._counts)
+
+
+@pytest.mark.parametrize("query,opts", QUERIES)
+def test_next_prev_match_linear_scan(query, opts):
+    rng = random.Random(5)
+    buf = TextBuffer("\n".join(_line(rng) for _ in range(200)))
+    index = SearchIndex(buf)
+    index.set_query(query, opts)
+    expected = _expected(buf, query, opts)
+    for _ in range(300):
+        row = rng.randrange(len(buf.lines) + 1)
+        col = rng.randint(0, len(buf.lines[row]) if row < len(buf.lines) else 3)
+        key = (row, col)
+        after = [m for m in expected if (m[0], m[1]) >= key]
+        before = [m for m in expected if (m[0], m[1]) < key]
+        assert index.next_after(Cursor(row, col)) == (after[0] if after else None)
+        assert index.prev_before(Cursor(row, col)) == (before[-1] if before else None)
+
+
+def test_matches_in_row_range():
+    rng = random.Random(9)
+    buf = TextBuffer("\n".join(_line(rng) for _ in range(100)))
+    index = SearchIndex(buf)
+    index.set_query("ab")
+    expected = _expected(buf, "ab", LITERAL)
+    for first, last in [(0, 0), (10, 20), (50, 49), (95, 200)]:
+        assert list(index.matches(first, last)) == [m for m in expected if first <= m[0] <= last]
+
+
+def test_adopt_from_snapshot():
+    buf = TextBuffer("ab ab\nx\nab")
+    built = SearchIndex(buf.snapshot(), listen=False)
+    built.set_query("ab")
+    index = SearchIndex(buf)
+    index.adopt(built)
+    assert index.count == 3
+    buf.insert_text_at(Cursor(1, 0), "ab\n")
+    assert list(index.matches()) == [(0, 0, 2), (0, 3, 5), (1, 0, 2), (3, 0, 2)]
+
+
+def test_multiline_query_not_indexed():
+    buf = TextBuffer("ab\nab")
+    index = SearchIndex(buf)
+    index.set_query("ab\nab")
+    assert not index.indexed and index.count == 0
+    buf.insert_text_at(Cursor(0, 0), "x")
+    assert list(index.matches()) == []
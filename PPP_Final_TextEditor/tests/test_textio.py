@@ -0,0 +1,124 @@
+import codecs
+import random
+import re
+
+import pytest
+
+import textio
+from core import iter_text_chunks
+from fileio import write_atomic
+from textio import (TextFormat, detect_encoding, detect_newline, normalize_newlines, read_document,
+                    read_document_sized, sniff_format, split_lines)
+
+
+ALPHABET = {
+    "utf-8": ["a", "한", "é", " ", "\r", "\n", "\r\n"],
+    "cp949": ["a", "한", "글", " ", "\r", "\n", "\r\n"],
+    "utf-16-le": ["a", "한", "😀", " ", "\r", "\n", "\r\n"],
+    "utf-16-be": ["a", "한", " ", "\r", "\n", "\r\n"],
+    "utf-32-le": ["a", "한", " ", "\r", "\n", "\r\n"],
+}
+
+BOMS = {
+    "utf-16-le": codecs.BOM_UTF16_LE,
+    "utf-16-be": codecs.BOM_UTF16_BE,
+    "utf-32-le": codecs.BOM_UTF32_LE,
+}
+
+
+def _expected(text: str):
+    # the whole text decoded at once, split on every kind of line break
+    return re.split(r"\r\n|\r|\n", text)
+
+
+@pytest.mark.parametrize("encoding", list(ALPHABET))
+@pytest.mark.parametrize("block", [1, 2, 3, 7, 64])
+def test_block_reads_match_whole_decode(tmp_path, monkeypatch, encoding, block):
+    # tiny blocks cut through characters, BOMs and \r\n pairs
+    monkeypatch.setattr(textio, "READ_BLOCK", block)
+    rng = random.Random(f"{encoding} {block}")
+    path = tmp_path / "doc.txt"
+    for _ in range(10):
+        text = "한" + "".join(rng.choice(ALPHABET[encoding]) for _ in range(rng.randrange(60)))
+        data = BOMS.get(encoding, b"") + text.encode(encoding)
+        path.write_bytes(data)
+        lines, fmt, size = read_document_sized(str(path))
+        assert lines == _expected(text)
+        assert fmt.encoding == encoding and fmt.bom == (encoding in BOMS)
+        assert size == len(data)
+
+
+@pytest.mark.parametrize("encoding,bom", [
+    ("utf-8", codecs.BOM_UTF8),
+    ("utf-16-le", codecs.BOM_UTF16_LE),
+    ("utf-16-be", codecs.BOM_UTF16_BE),
+    ("utf-32-le", codecs.BOM_UTF32_LE),
+    ("utf-32-be", codecs.BOM_UTF32_BE),
+])
+def test_bom_detected_and_stripped(tmp_path, encoding, bom):
+    path = tmp_path / "doc.txt"
+    path.write_bytes(bom + "x\r\ny".encode(encoding))
+    assert detect_encoding(path.read_bytes()[:8]) == (encoding, len(bom))
+    lines, fmt = read_document(str(path))
+    assert lines == ["x", "y"]
+    assert fmt == TextFormat(encoding, "\r\n", True)
+
+
+def test_fallback_after_the_sample(tmp_path, monkeypatch):
+    # the sample is plain ASCII, the cp949 bytes only show up later
+    monkeypatch.setattr(textio, "SAMPLE_BYTES", 16)
+    monkeypatch.setattr(textio, "READ_BLOCK", 16)
+    path = tmp_path / "doc.txt"
+    text = "ascii only\n" * 10 + "한글\n"
+    path.write_bytes(text.encode("cp949"))
+    lines, fmt = read_document(str(path))
+    assert lines == _expected(text)
+    assert fmt.encoding == "cp949"
+
+
+def test_latin1_last_resort(tmp_path):
+    path = tmp_path / "doc.bin"
+    path.write_bytes(b"a\x80\xff\nb")
+    lines, fmt = read_document(str(path))
+    assert lines == ["a\x80\xff", "b"]
+    assert fmt.encoding == "latin-1"
+
+
+@pytest.mark.parametrize("sample,newline", [
+    ("", "\n"),
+    ("a\nb", "\n"),
+    ("a\r\nb\r\nc\n", "\r\n"),
+    ("a\rb\rc\r\n", "\r"),
+    ("a\r\nb\n", "\r\n"),           # ties go to \r\n
+    ("a\rb\n", "\n"),
+])
+def test_detect_newline(sample, newline):
+    assert detect_newline(sample) == newline
+
+
+@pytest.mark.parametrize("encoding,newline,bom", [
+    ("utf-8", "\n", False),
+    ("utf-8", "\r\n", True),
+    ("cp949", "\r\n", False),
+    ("utf-16-le", "\r\n", True),
+    ("utf-16-be", "\r", True),
+])
+def test_read_write_round_trip(tmp_path, encoding, newline, bom):
+    path = tmp_path / "doc.txt"
+    fmt = TextFormat(encoding, newline, bom)
+    lines = ["첫 줄", "", "second line", "끝"]
+    write_atomic(str(path), iter_text_chunks(lines), encoding=encoding, newline=newline, bom=bom)
+    data = path.read_bytes()
+
+    read, got = read_document(str(path))
+    assert (read, got) == (lines, fmt)
+    assert sniff_format(str(path))[0] == fmt
+    write_atomic(str(path), iter_text_chunks(read), encoding=got.encoding, newline=got.newline, bom=got.bom)
+    assert path.read_bytes() == data
+
+
+def test_newline_helpers_skip_copies():
+    text = "a\nb"
+    assert normalize_newlines(text) is text
+    assert normalize_newlines("a\r\nb\rc") == "a\nb\nc"
+    assert split_lines("a\r\n\rb\n") == ["a", "", "b", ""]
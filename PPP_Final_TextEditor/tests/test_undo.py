@@ -0,0 +1,162 @@
+import random
+
+import pytest
+
+import core
+from core import COMMAND_OVERHEAD, Cursor, DeleteCommand, InsertCommand, TextBuffer, UndoStack
+
+
+def _type(buf, undo, cursor, text):
+    # one InsertCommand per key, like the editor
+    for ch in text:
+        cursor = undo.push_and_do(InsertCommand(cursor, ch), buf, cursor)
+    return cursor
+
+
+def _backspace(buf, undo, cursor, times):
+    for _ in range(times):
+        start = buf.move_left(cursor)
+        cmd = DeleteCommand(start, cursor, buf.get_range(start, cursor))
+        cursor = undo.push_and_do(cmd, buf, cursor)
+    return cursor
+
+
+def _accounted(undo):
+    return sum(c.size() for c in undo._undo) + sum(c.size() for c in undo._redo)
+
+
+def test_typing_coalesces_into_one_step():
+    buf = TextBuffer("x")
+    undo = UndoStack()
+    _type(buf, undo, Cursor(0, 1), "hello")
+    assert len(undo.history()) == 1
+    undo.undo(buf, Cursor(0, 6))
+    assert buf.get_text() == "x"
+    undo.redo(buf, Cursor(0, 0))
+    assert buf.get_text() == "xhello"
+
+
+def test_backspace_chain_coalesces():
+    buf = TextBuffer("hello world")
+    undo = UndoStack()
+    _backspace(buf, undo, Cursor(0, 11), 5)
+    assert buf.get_text() == "hello "
+    assert len(undo.history()) == 1
+    undo.undo(buf, Cursor(0, 6))
+    assert buf.get_text() == "hello world"
+
+
+@pytest.mark.parametrize("split", ["seal", "newline", "pause", "jump", "kind"])
+def test_coalescing_breaks(split, monkeypatch):
+    buf = TextBuffer("")
+    undo = UndoStack()
+    now = [100.0]
+    monkeypatch.setattr(core.time, "monotonic", lambda: now[0])
+    c = _type(buf, undo, Cursor(0, 0), "ab")
+    if split == "seal":
+        undo.seal()
+    elif split == "newline":
+        c = _type(buf, undo, c, "\n")
+    elif split == "pause":
+        now[0] += core.COALESCE_SECONDS + 0.5
+    elif split == "jump":
+        c = Cursor(0, 0)
+    elif split == "kind":
+        c = _backspace(buf, undo, c, 1)
+    _type(buf, undo, c, "cd")
+    assert len(undo.history()) >= 2
+    before = buf.get_text()
+    undo.undo(buf, Cursor(0, 0))
+    assert buf.get_text() == before.replace("cd", "", 1)
+
+
+class Recorder(UndoStack):
+    # text at every undo step boundary, kept in step with pushes
+    def __init__(self, buf):
+        super().__init__()
+        self.states = [buf.get_text()]
+
+    def push_and_do(self, cmd, buf, cursor):
+        depth = len(self._undo)
+        cursor = super().push_and_do(cmd, buf, cursor)
+        if len(self._undo) > depth:
+            self.states.append(buf.get_text())
+        else:
+            self.states[-1] = buf.get_text()
+        return cursor
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+@pytest.mark.parametrize("seed", range(8))
+def test_undo_redo_restore_each_step(backend, seed):
+    rng = random.Random(seed)
+    buf = TextBuffer("start\nof\ntext", backend=backend)
+    undo = Recorder(buf)
+    cursor = Cursor(0, 0)
+    for _ in range(200):
+        op = rng.randrange(4)
+        if op == 0:
+            cursor = _type(buf, undo, cursor, rng.choice(["a", "bc", "\n", "x y"]))
+        elif op == 1:
+            cursor = _backspace(buf, undo, cursor, rng.randrange(1, 3))
+        elif op == 2:
+            undo.seal()
+            cursor = buf.clamp_cursor(Cursor(rng.randrange(len(buf.lines)), rng.randrange(10)))
+        elif undo.can_undo():
+            cursor = undo.undo(buf, cursor)
+            undo.states.pop()
+            assert buf.get_text() == undo.states[-1]
+        assert undo.memory_usage() == _accounted(undo)
+
+    final = buf.get_text()
+    while undo.can_undo():
+        undo.undo(buf, cursor)
+        undo.states.pop()
+        assert buf.get_text() == undo.states[-1]
+    assert len(undo.states) == 1
+    while undo.peek_redo() is not None:
+        undo.redo(buf, cursor)
+    assert buf.get_text() == final
+
+
+def test_max_entries_evicts_oldest():
+    buf = TextBuffer("")
+    undo = UndoStack(max_entries=3)
+    cursor = Cursor(0, 0)
+    for ch in "abcde":
+        cursor = _type(buf, undo, cursor, ch)
+        undo.seal()
+    assert [c.text for c in undo.history()] == ["c", "d", "e"]
+    while undo.can_undo():
+        cursor = undo.undo(buf, cursor)
+    # history before the window is gone, the rest undid cleanly
+    assert buf.get_text() == "ab"
+    assert undo.memory_usage() == _accounted(undo)
+
+
+def test_max_bytes_evicts_but_keeps_newest():
+    buf = TextBuffer("")
+    undo = UndoStack(max_bytes=3 * (COMMAND_OVERHEAD + 10))
+    cursor = Cursor(0, 0)
+    for i in range(6):
+        cursor = _type(buf, undo, cursor, str(i) * 10)
+        undo.seal()
+    assert len(undo.history()) == 3
+    assert undo.memory_usage() <= undo.max_bytes
+
+    # a single step over the budget still stays undoable
+    cursor = undo.push_and_do(InsertCommand(cursor, "z" * 1000), buf, cursor)
+    assert len(undo.history()) == 1
+    undo.undo(buf, cursor)
+    assert buf.get_text() == "".join(str(i) * 10 for i in range(6))
+
+
+def test_push_clears_redo_and_its_bytes():
+    buf = TextBuffer("")
+    undo = UndoStack()
+    cursor = _type(buf, undo, Cursor(0, 0), "abc")
+    undo.undo(buf, cursor)
+    assert undo.peek_redo() is not None
+    _type(buf, undo, Cursor(0, 0), "x")
+    assert undo.peek_redo() is None
+    assert undo.memory_usage() == _accounted(undo)
@@ -0,0 +1,140 @@
+import os
+import random
+
+import pytest
+
+from core import Cursor, DeleteCommand, InsertCommand, TextBuffer, UndoStack
+from undo_journal import UndoJournal, journal_path, text_hash
+
+
+def _edit(rng: random.Random, buf: TextBuffer, undo: UndoStack) -> None:
+    # one sealed step: insert or delete somewhere
+    row = rng.randrange(len(buf.lines))
+    pos = Cursor(row, rng.randint(0, len(buf.lines[row])))
+    if rng.random() < 0.6 or buf.get_text() == "":
+        undo.push_and_do(InsertCommand(pos, rng.choice(["a", "bc", "\n", "x\ny"])), buf, pos)
+    else:
+        end = buf.move_right(buf.move_right(pos))
+        undo.push_and_do(DeleteCommand(pos, end, buf.get_range(pos, end)), buf, pos)
+    undo.seal()
+
+
+def _steps(rng, buf, undo, n):
+    # text after every step, oldest first
+    states = []
+    for _ in range(n):
+        _edit(rng, buf, undo)
+        states.append(buf.get_text())
+    return states
+
+
+def _undo_all(buf, undo, states, initial):
+    # walks back through states to initial, disk steps included
+    for expected in reversed([initial] + states[:-1]):
+        assert undo.can_undo()
+        undo.undo(buf, Cursor(0, 0))
+        assert buf.get_text() == expected
+    assert not undo.can_undo()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_spill_and_pop_walk_the_whole_history(tmp_path, seed):
+    rng = random.Random(seed)
+    doc = str(tmp_path / "doc.txt")
+    initial = "one\ntwo\nthree"
+    buf = TextBuffer(initial)
+    undo = UndoStack(max_entries=4)
+    undo.attach_journal(UndoJournal.create(doc))
+    states = _steps(rng, buf, undo, 40)
+    assert len(undo.history()) == 4 and undo.journal.has_history()
+
+    # half way back and forth: popped steps spill again without new records
+    for _ in range(15):
+        undo.undo(buf, Cursor(0, 0))
+    size = os.path.getsize(journal_path(doc))
+    for _ in range(15):
+        undo.redo(buf, Cursor(0, 0))
+    assert buf.get_text() == states[-1]
+    assert os.path.getsize(journal_path(doc)) == size
+
+    _undo_all(buf, undo, states, initial)
+    undo.clear()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_checkpoint_and_reopen(tmp_path, seed):
+    rng = random.Random(seed)
+    doc = str(tmp_path / "doc.txt")
+    initial = "hello\nworld"
+    buf = TextBuffer(initial)
+    undo = UndoStack(max_entries=5)
+    undo.attach_journal(UndoJournal.create(doc))
+    states = _steps(rng, buf, undo, 12)
+    undo.checkpoint(text_hash(buf.iter_chunks()))
+    # saved twice: the second checkpoint reuses records already written
+    states += _steps(rng, buf, undo, 12)
+    undo.checkpoint(text_hash(buf.iter_chunks()))
+    saved = buf.get_text()
+    undo.clear()
+
+    # next session: same content, history continues from disk
+    buf = TextBuffer(saved)
+    undo = UndoStack()
+    undo.attach_journal(UndoJournal.open(doc, text_hash(buf.iter_chunks())))
+    assert not undo.history()
+    _undo_all(buf, undo, states, initial)
+    undo.clear()
+
+
+def test_reopen_with_changed_content_starts_over(tmp_path):
+    doc = str(tmp_path / "doc.txt")
+    buf = TextBuffer("abc")
+    undo = UndoStack()
+    undo.attach_journal(UndoJournal.create(doc))
+    _steps(random.Random(1), buf, undo, 3)
+    undo.checkpoint(text_hash(buf.iter_chunks()))
+    undo.clear()
+
+    journal = UndoJournal.open(doc, text_hash(["edited elsewhere"]))
+    assert not journal.has_history()
+    assert os.path.getsize(journal_path(doc)) == 0
+    journal.close()
+
+
+def test_last_save_record_wins(tmp_path):
+    doc = str(tmp_path / "doc.txt")
+    buf = TextBuffer("abc")
+    undo = UndoStack()
+    undo.attach_journal(UndoJournal.create(doc))
+    _steps(random.Random(2), buf, undo, 2)
+    first = text_hash(buf.iter_chunks())
+    undo.checkpoint(first)
+    _steps(random.Random(3), buf, undo, 2)
+    undo.checkpoint(text_hash(buf.iter_chunks()))
+    undo.clear()
+
+    # the file went back to the first save's content: that history is no longer on top
+    journal = UndoJournal.open(doc, first)
+    assert not journal.has_history()
+    journal.close()
+
+
+def test_unreadable_save_record_skipped(tmp_path):
+    doc = str(tmp_path / "doc.txt")
+    buf = TextBuffer("abc")
+    undo = UndoStack()
+    undo.attach_journal(UndoJournal.create(doc))
+    _steps(random.Random(4), buf, undo, 3)
+    h = text_hash(buf.iter_chunks())
+    undo.checkpoint(h)
+    undo.clear()
+    with open(journal_path(doc), "ab") as f:
+        f.write(b'{"h":"torn')
+
+    journal = UndoJournal.open(doc, h)
+    assert journal.has_history()
+    journal.close()
+
+
+def test_journal_path_is_hidden_sibling(tmp_path):
+    assert journal_path(str(tmp_path / "a.txt")) == str(tmp_path / ".a.txt.undo")
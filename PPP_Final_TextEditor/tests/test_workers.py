@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+QtCore = pytest.importorskip("PyQt6.QtCore")
+
+from workers import CancelToken, Cancelled, WorkerPool
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def pool(app):
+    pool = WorkerPool(max_workers=2)
+    yield pool
+    pool.shutdown()
+
+
+def _pump(app, done, timeout=5.0):
+    # deliver queued signals until done() or timeout
+    end = time.monotonic() + timeout
+    while not done():
+        assert time.monotonic() < end, "timed out"
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def _blocked(gate):
+    # job that waits for gate, checking its token meanwhile
+    def run(report, token):
+        while not gate.wait(0.01):
+            token.check()
+        return "ran"
+    return run
+
+
+def test_result_and_progress_on_ui_thread(app, pool):
+    ui = threading.get_ident()
+    seen = []
+    results = []
+
+    def work(report, token, n):
+        for i in range(n):
+            report(i + 1, n)
+        return threading.get_ident()
+
+    pool.submit("count", work, 3,
+                on_progress=lambda done, total: seen.append((done, total, threading.get_ident())),
+                on_done=lambda result, error: results.append((result, error, threading.get_ident())))
+    _pump(app, lambda: results)
+    worker, error, caller = results[0]
+    assert error == "" and worker != ui and caller == ui
+    assert [(d, t) for d, t, _ in seen] == [(1, 3), (2, 3), (3, 3)]
+    assert all(t == ui for _, _, t in seen)
+    assert not pool.running()
+
+
+def test_error_message_reported(app, pool):
+    results = []
+
+    def fail(report, token):
+        raise ValueError("bad input")
+
+    pool.submit("x", fail, on_done=lambda result, error: results.append((result, error)))
+    _pump(app, lambda: results)
+    assert results == [(None, "bad input")]
+
+
+def test_cancel_by_owner(app, pool):
+    gate = threading.Event()
+    a, b = object(), object()
+    results = {}
+    pool.submit("search", _blocked(gate), owner=a, on_done=lambda r, e: results.__setitem__("a", (r, e)))
+    pool.submit("search", _blocked(gate), owner=b, on_done=lambda r, e: results.__setitem__("b", (r, e)))
+    pool.cancel("search", owner=a)
+    gate.set()
+    _pump(app, lambda: len(results) == 2)
+    assert results == {"a": (None, "cancelled"), "b": ("ran", "")}
+
+
+def test_cancel_by_kind(app, pool):
+    gate = threading.Event()
+    results = {}
+    pool.submit("search", _blocked(gate), on_done=lambda r, e: results.__setitem__("search", e))
+    pool.submit("replace", _blocked(gate), on_done=lambda r, e: results.__setitem__("replace", e))
+    assert pool.running("search") and pool.running("replace")
+    pool.cancel("replace")
+    gate.set()
+    _pump(app, lambda: len(results) == 2)
+    assert results == {"search": "", "replace": "cancelled"}
+
+
+def test_wait_only_for_matching_owner(app, pool):
+    gate = threading.Event()
+    a, b = object(), object()
+    results = {}
+    pool.submit("save", lambda report, token: "saved", owner=a,
+                on_done=lambda r, e: results.__setitem__("a", r))
+    job_b = pool.submit("search", _blocked(gate), owner=b,
+                        on_done=lambda r, e: results.__setitem__("b", r))
+    # returns although b's job is still blocked
+    pool.wait(owner=a)
+    assert not job_b.future.done()
+    gate.set()
+    pool.wait(owner=b)
+    _pump(app, lambda: len(results) == 2)
+    assert results == {"a": "saved", "b": "ran"}
+
+
+def test_cancel_after_finish_drops_result(app, pool):
+    results = []
+    job = pool.submit("x", lambda report, token: 42, on_done=lambda r, e: results.append((r, e)))
+    job.future.result(timeout=5)
+    # finished on the worker, callback still queued: cancel wins
+    job.cancel()
+    _pump(app, lambda: results)
+    assert results == [(None, "cancelled")]
+
+
+def test_cancelled_token_raises():
+    token = CancelToken()
+    token.check()
+    token.cancel()
+    with pytest.raises(Cancelled):
+        token.check()
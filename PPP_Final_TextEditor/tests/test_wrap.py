@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from core import Cursor, TextBuffer
+from text_metrics import AdvanceCache
+from wrap import WrapLayout
+
+
+def _measure(ch: str) -> int:
+    # Hangul is two cells wide
+    return 2 if "가" <= ch <= "힣" else 1
+
+
+def _advances(monospace: bool) -> AdvanceCache:
+    return AdvanceCache(_measure, 1, monospace)
+
+
+def _line(rng: random.Random) -> str:
+    return "".join(rng.choice("ab 한") for _ in range(rng.randrange(0, 40)))
+
+
+def _edit(rng: random.Random, buf: TextBuffer) -> None:
+    row = rng.randrange(len(buf.lines))
+    col = rng.randint(0, len(buf.lines[row]))
+    op = rng.randrange(4)
+    if op == 0:
+        buf.insert_text_at(Cursor(row, col), rng.choice(["x", "한글", "a" * 30]))
+    elif op == 1:
+        buf.insert_text_at(Cursor(row, col), "\n".join(_line(rng) for _ in range(rng.randrange(1, 4))))
+    elif op == 2:
+        end_row = min(len(buf.lines) - 1, row + rng.randrange(3))
+        buf.delete_range(Cursor(row, 0), Cursor(end_row, rng.randint(0, len(buf.lines[end_row]))))
+    else:
+        buf.append_text("\n" + _line(rng))
+
+
+@pytest.mark.parametrize("backend", ["list", "rope"])
+@pytest.mark.parametrize("monospace", [True, False])
+@pytest.mark.parametrize("seed", range(4))
+def test_incremental_matches_rebuild(backend, monospace, seed):
+    rng = random.Random(seed)
+    buf = TextBuffer("\n".join(_line(rng) for _ in range(100)), backend=backend)
+    advances = _advances(monospace)
+    wrap = WrapLayout(buf, advances, 12)
+    calls = []
+
+    def listener(row, removed, added):
+        calls.append((removed, added, wrap.invalidate(row, removed, added)))
+
+    buf.add_listener(listener)
+    for _ in range(100):
+        _edit(rng, buf)
+        if rng.random() < 0.05:
+            wrap.set_width(rng.randrange(1, 30))
+        fresh = WrapLayout(buf, _advances(monospace), wrap.width)
+        assert list(wrap._rows) == list(fresh._rows)
+        assert wrap.total == fresh.total
+    # False only when nothing below the edit moved
+    assert all(removed == added for removed, added, shifted in calls if not shifted)
+    assert any(not shifted for *_, shifted in calls)
+
+
+@pytest.mark.parametrize("monospace", [True, False])
+def test_locate_inverts_visual_row(monospace):
+    rng = random.Random(3)
+    buf = TextBuffer("\n".join(_line(rng) for _ in range(80)))
+    wrap = WrapLayout(buf, _advances(monospace), 10)
+    vrow = 0
+    for row, line in enumerate(buf.lines):
+        assert wrap.visual_row(row) == vrow
+        assert wrap.row_count(row) == len(wrap.breaks(row, line))
+        for sub in range(wrap.row_count(row)):
+            assert wrap.locate(vrow + sub) == (row, sub)
+        vrow += wrap.row_count(row)
+    assert wrap.total == vrow == wrap.visual_row(len(buf.lines))
+
+
+@pytest.mark.parametrize("monospace", [True, False])
+def test_cursor_round_trip(monospace):
+    rng = random.Random(4)
+    buf = TextBuffer("\n".join(_line(rng) for _ in range(30)))
+    wrap = WrapLayout(buf, _advances(monospace), 9)
+    for row, line in enumerate(buf.lines):
+        for col in range(len(line) + 1):
+            c = Cursor(row, col)
+            vrow, x = wrap.cursor_visual(c, line)
+            assert wrap.locate(vrow)[1] == wrap.sub_row(row, line, col)
+            assert wrap.cursor_at(vrow, x) == c
+
+
+def test_rows_never_wider_than_the_width():
+    buf = TextBuffer("한글" * 20 + "\nabc\n" + "x" * 50)
+    wrap = WrapLayout(buf, _advances(False), 7)
+    for row, line in enumerate(buf.lines):
+        starts = wrap.breaks(row, line) + [len(line)]
+        for a, b in zip(starts, starts[1:]):
+            width = sum(_measure(ch) for ch in line[a:b])
+            assert width <= 7 or b - a == 1
+
+
+def test_set_width_reports_change():
+    buf = TextBuffer("x" * 30)
+    wrap = WrapLayout(buf, _advances(True), 10)
+    assert wrap.total == 3
+    assert not wrap.set_width(10)
+    assert wrap.set_width(15) and wrap.total == 2
@@ -0,0 +1,109 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Callable, Dict, List, Tuple
+
+
+class AdvanceCache:
+    """
+        줄별 prefix advance 캐시 (커서/하이라이트 x 좌표)
+        - 고정폭 글꼴의 ASCII 줄: col * char_w, 캐시 없이 O(1)
+        - 그 외: 글자 폭 누적 배열을 줄마다 한 번 만들고 재사용
+        - TextBuffer 변경 알림으로 바뀐 줄부터 무효화 (invalidate)
+    """
+    MAX_ROWS = 1024
+
+    def __init__(self, measure: Callable[[str], int], char_w: int, monospace: bool):
+        self.measure = measure
+        self.char_w = char_w
+        self.monospace = monospace
+        self._glyph: Dict[str, int] = {}                      # char -> advance
+        self._rows: Dict[int, Tuple[str, List[int]]] = {}     # row -> (line, prefix advances)
+
+    def clear(self) -> None:
+        self._rows.clear()
+        self._glyph.clear()
+
+    def invalidate(self, row: int, removed: int, added: int) -> None:
+        # same signature as TextBuffer listeners
+        rows = self._rows
+        if removed == added:
+            for r in range(row, row + added):
+                rows.pop(r, None)
+        else:
+            # rows below shifted: drop them too (the dict only holds rows painted recently)
+            for r in [r for r in rows if r >= row]:
+                del rows[r]
+
+    def _prefix(self, row: int, line: str) -> List[int]:
+        entry = self._rows.get(row)
+        if entry is not None and entry[0] is line:
+            return entry[1]
+        prefix = self._measure_line(line)
+        if len(self._rows) >= self.MAX_ROWS:
+            self._rows.clear()
+        self._rows[row] = (line, prefix)
+        return prefix
+
+    def _measure_line(self, line: str) -> List[int]:
+        glyph = self._glyph
+        widths = []
+        for ch in line:
+            w = glyph.get(ch)
+            if w is None:
+                w = glyph[ch] = self.measure(ch)
+            widths.append(w)
+        prefix = [0]
+        prefix.extend(accumulate(widths))
+        return prefix
+
+    def x(self, row: int, line: str, col: int) -> int:
+        # advance of line[:col]
+        col = max(0, min(col, len(line)))
+        if self.monospace and line.isascii():
+            return col * self.char_w
+        return self._prefix(row, line)[col]
+
+    def width(self, row: int, line: str, start: int, end: int) -> int:
+        # advance of line[start:end]
+        return self.x(row, line, end) - self.x(row, line, start)
+
+    def col_at(self, row: int, line: str, x: int) -> int:
+        # column whose left edge is nearest to x
+        if x <= 0:
+            return 0
+        if self.monospace and line.isascii():
+            return min(len(line), (x + self.char_w // 2) // self.char_w)
+        prefix = self._prefix(row, line)
+        col = bisect_left(prefix, x)
+        if col > len(line):
+            return len(line)
+        if col and x - prefix[col - 1] < prefix[col] - x:
+            col -= 1
+        return col
+
+    # soft wrap
+    def breaks(self, row: int, line: str, wrap_w: int) -> List[int]:
+        # start columns of the visual rows of line, [0] if it fits in wrap_w
+        if self.monospace and line.isascii():
+            return list(range(0, max(1, len(line)), max(1, wrap_w // self.char_w)))
+        return self._breaks(self._prefix(row, line), wrap_w)
+
+    def wrap_count(self, line: str, wrap_w: int) -> int:
+        # number of visual rows, without touching the per-row cache (whole-document layout)
+        if self.monospace and line.isascii():
+            cols = max(1, wrap_w // self.char_w)
+            return max(1, -(-len(line) // cols))
+        return len(self._breaks(self._measure_line(line), wrap_w))
+
+    @staticmethod
+    def _breaks(prefix: List[int], wrap_w: int) -> List[int]:
+        starts = [0]
+        end = len(prefix) - 1
+        start = 0
+        while prefix[end] - prefix[start] > wrap_w:
+            # last column that still fits, at least one character per row
+            nxt = max(start + 1, bisect_right(prefix, prefix[start] + wrap_w) - 1)
+            starts.append(nxt)
+            start = nxt
+        return starts
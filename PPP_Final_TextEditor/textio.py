@@ -0,0 +1,159 @@
+from __future__ import annotations
+import codecs
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+
+# bytes per read in read_document, and the prefix used for detection
+READ_BLOCK = 4 * 1024 * 1024
+SAMPLE_BYTES = 64 * 1024
+
+# tried in order when there is no BOM
+FALLBACK_ENCODINGS = ("utf-8", "cp949")
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),     # before UTF-16 LE: same first two bytes
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+_NEWLINE = re.compile(r"\r\n|\r|\n")
+
+
+@dataclass(frozen=True)
+class TextFormat:
+    # how a document is stored on disk; the buffer itself always uses "\n"
+    encoding: str = "utf-8"
+    newline: str = "\n"
+    bom: bool = False
+
+    @property
+    def ascii_compatible(self) -> bool:
+        # b"\n" bytes are newlines (memory-mapped line scanning works)
+        return not self.encoding.startswith(("utf-16", "utf-32"))
+
+
+DEFAULT_FORMAT = TextFormat()
+
+
+def detect_encoding(prefix: bytes) -> Tuple[str, int]:
+    # (codec name, BOM length) from the first bytes of a file
+    for bom, name in _BOMS:
+        if prefix.startswith(bom):
+            return name, len(bom)
+    for name in FALLBACK_ENCODINGS:
+        try:
+            # final=False: a multi-byte char cut at the sample edge is fine
+            codecs.getincrementaldecoder(name)().decode(prefix, final=False)
+        except UnicodeDecodeError:
+            continue
+        return name, 0
+    return "latin-1", 0
+
+
+def detect_newline(sample: str) -> str:
+    # dominant line ending in sample, "\n" if there is none
+    crlf = sample.count("\r\n")
+    cr = sample.count("\r") - crlf
+    lf = sample.count("\n") - crlf
+    if crlf == cr == lf == 0:
+        return "\n"
+    if crlf >= lf and crlf >= cr:
+        return "\r\n"
+    return "\r" if cr > lf else "\n"
+
+
+def split_lines(text: str) -> List[str]:
+    # split on \r\n, \r or \n in one pass; plain str.split when there is no \r
+    if "\r" in text:
+        return _NEWLINE.split(text)
+    return text.split("\n")
+
+
+def normalize_newlines(text: str) -> str:
+    # "\n" line endings; no copy when there is nothing to change
+    if "\r" in text:
+        return _NEWLINE.sub("\n", text)
+    return text
+
+
+def sniff_format(path: str) -> Tuple[TextFormat, int]:
+    # (format, BOM length) from the start of a file, without reading it all
+    with open(path, "rb") as f:
+        head = f.read(SAMPLE_BYTES)
+    encoding, skip = detect_encoding(head)
+    sample = codecs.getincrementaldecoder(encoding)(errors="replace").decode(head[skip:])
+    return TextFormat(encoding, detect_newline(sample), skip > 0), skip
+
+
+def read_document(path: str, progress: Optional[Callable[[int], None]] = None) -> Tuple[List[str], TextFormat]:
+    """
+        파일을 블록 단위로 디코딩하면서 바로 줄로 나눔 (전체 텍스트 문자열을 만들지 않음)
+        - 앞부분 샘플로 인코딩/BOM과 주 줄바꿈을 판별
+        - 샘플 뒤에서 디코딩이 실패하면 다음 후보 인코딩으로 다시 읽음 (마지막은 latin-1)
+        - 섞인 줄바꿈은 모두 "\\n"으로 읽고, 저장할 때는 주 줄바꿈 하나로 씀
+        - progress(n): 지금까지 읽은 바이트 수
+    """
+    with open(path, "rb") as f:
+        head = f.read(SAMPLE_BYTES)
+        encoding, skip = detect_encoding(head)
+        candidates = [encoding]
+        if not skip:
+            candidates += [e for e in FALLBACK_ENCODINGS if e != encoding] + ["latin-1"]
+        for i, encoding in enumerate(candidates):
+            f.seek(skip)
+            try:
+                lines, sample = _decode_lines(f, encoding, progress)
+            except UnicodeDecodeError:
+                if i == len(candidates) - 1:
+                    raise
+                continue
+            return lines, TextFormat(encoding, detect_newline(sample), skip > 0)
+
+
+def read_document_sized(path: str, progress: Optional[Callable[[int], None]] = None) -> Tuple[List[str], TextFormat, int]:
+    # read_document plus the number of bytes consumed (where appended data starts)
+    size = 0
+
+    def seen(done: int) -> None:
+        nonlocal size
+        size = done
+        if progress is not None:
+            progress(done)
+
+    lines, fmt = read_document(path, seen)
+    return lines, fmt, size
+
+
+def _decode_lines(f, encoding: str, progress) -> Tuple[List[str], str]:
+    # (lines, first decoded block for newline detection)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    lines: List[str] = []
+    sample = None
+    carry = ""
+    done = f.tell()
+    while True:
+        block = f.read(READ_BLOCK)
+        done += len(block)
+        text = decoder.decode(block, final=not block)
+        if sample is None:
+            sample = text[:SAMPLE_BYTES]
+        text = carry + text
+        if block and text.endswith("\r"):
+            # may be the first half of \r\n
+            text, carry = text[:-1], "\r"
+        else:
+            carry = ""
+        parts = split_lines(text)
+        if lines:
+            lines[-1] += parts[0]
+            lines.extend(parts[1:])
+        else:
+            lines = parts
+        if progress is not None:
+            progress(done)
+        if not block:
+            return lines, sample
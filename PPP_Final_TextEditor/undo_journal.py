@@ -0,0 +1,132 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from core import Command, command_from_record
+
+
+def hashed_chunks(chunks: Iterable[str], h) -> Iterator[str]:
+    # pass chunks through while feeding them to hashlib object h
+    for chunk in chunks:
+        h.update(chunk.encode("utf-8"))
+        yield chunk
+
+
+def text_hash(chunks: Iterable[str]) -> str:
+    h = hashlib.sha1()
+    for _ in hashed_chunks(chunks, h):
+        pass
+    return h.hexdigest()
+
+
+def journal_path(doc_path: str) -> str:
+    # hidden file next to the document
+    doc_path = os.path.abspath(doc_path)
+    folder, name = os.path.split(doc_path)
+    return os.path.join(folder, "." + name + ".undo")
+
+
+class UndoJournal:
+    """
+        문서 옆에 두는 append-only undo 기록 (JSON lines)
+        - 명령 레코드 {"p": 이전 레코드 오프셋, "c": 명령}: 오프셋으로 연결된 스택
+        - 저장 레코드 {"h": 내용 해시, "top": 스택 꼭대기}: 다시 열 때 해시가 같으면 이어서 사용
+        - 메모리에서 밀려난 명령만 쓰고, undo할 때 필요한 만큼만 읽음
+    """
+    def __init__(self, doc_path: str, top: int = -1):
+        self.doc_path = os.path.abspath(doc_path)
+        self.path = journal_path(doc_path)
+        self.top = top      # offset of the newest command on disk, -1 if none
+        self._f = open(self.path, "ab+")
+        # in-memory commands already written: (cmd, offset), oldest first
+        self._persisted: List[Tuple[Command, int]] = []
+
+    @classmethod
+    def create(cls, doc_path: str) -> "UndoJournal":
+        # start a fresh journal for this document
+        with open(journal_path(doc_path), "wb"):
+            pass
+        return cls(doc_path)
+
+    @classmethod
+    def open(cls, doc_path: str, content_hash: str) -> "UndoJournal":
+        # reuse the history if the last save record matches the file, else start over
+        path = journal_path(doc_path)
+        top = None
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    if line.startswith(b'{"h"'):
+                        try:
+                            rec = json.loads(line)
+                        except ValueError:
+                            continue
+                        top = rec["top"] if rec["h"] == content_hash else None
+        if top is None:
+            return cls.create(doc_path)
+        return cls(doc_path, top)
+
+    def close(self) -> None:
+        self._f.close()
+
+    def has_history(self) -> bool:
+        return self.top >= 0
+
+    # records
+    def _append(self, rec: dict) -> int:
+        f = self._f
+        f.seek(0, os.SEEK_END)
+        off = f.tell()
+        f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+        return off
+
+    def _read(self, off: int) -> dict:
+        self._f.flush()
+        self._f.seek(off)
+        return json.loads(self._f.readline())
+
+    # stack operations
+    def spill(self, cmd: Command) -> None:
+        # cmd is the oldest in-memory command and becomes the new disk top
+        if self._persisted and self._persisted[0][0] is cmd:
+            self.top = self._persisted.pop(0)[1]
+            return
+        self.top = self._append({"p": self.top, "c": cmd.to_record()})
+        self._persisted.clear()
+        self._f.flush()
+
+    def peek(self) -> Optional[Command]:
+        # newest command on disk, left there
+        if self.top < 0:
+            return None
+        return command_from_record(self._read(self.top)["c"])
+
+    def pop(self) -> Optional[Command]:
+        # newest command on disk, moved back into memory
+        if self.top < 0:
+            return None
+        off = self.top
+        rec = self._read(off)
+        cmd = command_from_record(rec["c"])
+        self.top = rec["p"]
+        self._persisted.insert(0, (cmd, off))
+        return cmd
+
+    def checkpoint(self, content_hash: str, history: List[Command]) -> None:
+        # write the in-memory history (oldest first) not on disk yet, then a save record
+        keep = 0
+        for (cmd, _), live in zip(self._persisted, history):
+            if cmd is not live:
+                break
+            keep += 1
+        persisted = self._persisted[:keep]
+        prev = persisted[-1][1] if persisted else self.top
+        for cmd in history[keep:]:
+            prev = self._append({"p": prev, "c": cmd.to_record()})
+            persisted.append((cmd, prev))
+        self._persisted = persisted
+        self._append({"h": content_hash, "top": prev})
+        self._f.flush()
+        os.fsync(self._f.fileno())
@@ -0,0 +1,121 @@
+from __future__ import annotations
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+
+class Cancelled(Exception):
+    pass
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    def check(self) -> None:
+        # called by jobs at safe points
+        if self._event.is_set():
+            raise Cancelled()
+
+
+class Job:
+    def __init__(self, job_id: int, kind: str, owner=None):
+        self.id = job_id
+        self.kind = kind
+        self.owner = owner      # e.g. the document whose snapshot the job reads
+        self.token = CancelToken()
+        self.future: Optional[Future] = None
+
+    def cancel(self) -> None:
+        self.token.cancel()
+
+
+class WorkerPool(QObject):
+    """
+        백그라운드 작업 스레드 풀 + UI 스레드로 결과를 넘기는 시그널 브리지
+        - fn(report, token, *args)을 워커 스레드에서 실행
+          report(done, total)로 진행률, token.check()로 취소 확인
+        - on_progress / on_done 콜백은 항상 UI 스레드에서 호출
+          on_done(result, error): error는 "" (성공), "cancelled", 또는 예외 메시지
+        - 작업은 편집 중인 버퍼가 아니라 스냅샷만 읽어야 함
+    """
+    # queued across threads: (job id, done, total) / (job id, result, error)
+    _progress = pyqtSignal(int, int, int)
+    _finished = pyqtSignal(int, object, str)
+
+    def __init__(self, max_workers: int = 2, parent=None):
+        super().__init__(parent)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="editor-worker")
+        self._ids = itertools.count(1)
+        self._jobs: Dict[int, Tuple[Job, Optional[Callable], Optional[Callable]]] = {}
+        self._progress.connect(self._on_progress)
+        self._finished.connect(self._on_finished)
+
+    def submit(self, kind: str, fn: Callable, *args,
+               on_done: Optional[Callable[[object, str], None]] = None,
+               on_progress: Optional[Callable[[int, int], None]] = None, owner=None) -> Job:
+        job = Job(next(self._ids), kind, owner)
+        self._jobs[job.id] = (job, on_done, on_progress)
+        job.future = self._pool.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job: Job, fn: Callable, args) -> None:
+        # worker thread: only signals may cross back to the UI
+        def report(done: int, total: int) -> None:
+            job.token.check()
+            self._progress.emit(job.id, done, total)
+
+        try:
+            job.token.check()
+            result = fn(report, job.token, *args)
+        except Cancelled:
+            self._finished.emit(job.id, None, "cancelled")
+        except Exception as e:
+            self._finished.emit(job.id, None, str(e) or type(e).__name__)
+        else:
+            self._finished.emit(job.id, result, "")
+
+    def _on_progress(self, job_id: int, done: int, total: int) -> None:
+        entry = self._jobs.get(job_id)
+        if entry is not None and entry[2] is not None and not entry[0].token.cancelled:
+            entry[2](done, total)
+
+    def _on_finished(self, job_id: int, result, error: str) -> None:
+        entry = self._jobs.pop(job_id, None)
+        if entry is None:
+            return
+        job, on_done, _ = entry
+        if job.token.cancelled:
+            error, result = "cancelled", None
+        if on_done is not None:
+            on_done(result, error)
+
+    # queries / cancellation
+    def running(self, kind: Optional[str] = None) -> bool:
+        return any(kind is None or job.kind == kind for job, _, _ in self._jobs.values())
+
+    def _matching(self, kind: Optional[str], owner) -> List[Job]:
+        return [job for job, _, _ in list(self._jobs.values())
+                if (kind is None or job.kind == kind) and (owner is None or job.owner is owner)]
+
+    def cancel(self, kind: Optional[str] = None, owner=None) -> None:
+        for job in self._matching(kind, owner):
+            job.cancel()
+
+    def wait(self, kind: Optional[str] = None, owner=None) -> None:
+        # block until matching jobs have left their worker (callbacks may still be queued)
+        wait_futures([job.future for job in self._matching(kind, owner)])
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.cancel()
+        self._pool.shutdown(wait=wait)
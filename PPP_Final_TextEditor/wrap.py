@@ -0,0 +1,89 @@
+from __future__ import annotations
+from bisect import bisect_right
+from itertools import islice
+from typing import List, Tuple
+
+from core import TextBuffer, Cursor
+from prefix_sum import PrefixSumTree
+from text_metrics import AdvanceCache
+
+
+class WrapLayout:
+    """
+        소프트 랩 배치: 논리 줄 <-> 화면 줄(visual row)
+        - 줄마다 화면 줄 수를 PrefixSumTree에 저장, 변환은 O(log n)
+        - TextBuffer 변경 알림(invalidate)으로 바뀐 줄만 다시 셈
+        - 폭이 바뀌면(resize) 전체를 다시 셈 (글자 수 기반이라 고정폭 ASCII는 빠름)
+        - 줄 안의 랩 위치(breaks)는 화면에 그리는 줄만 AdvanceCache로 계산
+    """
+    def __init__(self, buf: TextBuffer, advances: AdvanceCache, width: int):
+        self.buf = buf
+        self.advances = advances
+        self.width = max(1, width)
+        self._rows = PrefixSumTree(self._counts(buf.iter_lines()))
+
+    def _counts(self, lines) -> List[int]:
+        count = self.advances.wrap_count
+        w = self.width
+        return [count(line, w) for line in lines]
+
+    def set_width(self, width: int) -> bool:
+        # True if the layout changed
+        width = max(1, width)
+        if width == self.width:
+            return False
+        self.width = width
+        self._rows = PrefixSumTree(self._counts(self.buf.iter_lines()))
+        return True
+
+    def invalidate(self, row: int, removed: int, added: int) -> bool:
+        # same signature as TextBuffer listeners; True if rows below moved
+        old = self._rows.prefix(row + removed) - self._rows.prefix(row)
+        counts = self._counts(islice(self.buf.iter_lines(row), added))
+        self._rows.splice(row, removed, counts)
+        return removed != added or sum(counts) != old
+
+    # row <-> visual row
+    @property
+    def total(self) -> int:
+        return self._rows.total
+
+    def visual_row(self, row: int) -> int:
+        # first visual row of logical row (== total for row == line count)
+        return self._rows.prefix(row)
+
+    def locate(self, vrow: int) -> Tuple[int, int]:
+        # (logical row, wrapped sub-row) shown at visual row vrow
+        vrow = max(0, min(vrow, self._rows.total - 1))
+        return self._rows.find(vrow)
+
+    def row_count(self, row: int) -> int:
+        return self._rows.get(row)
+
+    # within a line
+    def breaks(self, row: int, line: str) -> List[int]:
+        return self.advances.breaks(row, line, self.width)
+
+    def sub_row(self, row: int, line: str, col: int) -> int:
+        # wrapped sub-row holding col; a col on a break shows at the start of the next row
+        return bisect_right(self.breaks(row, line), col) - 1
+
+    def cursor_visual(self, c: Cursor, line: str) -> Tuple[int, int]:
+        # (visual row, x within the row) of cursor c on line
+        starts = self.breaks(c.row, line)
+        sub = bisect_right(starts, c.col) - 1
+        x = self.advances.width(c.row, line, starts[sub], c.col)
+        return self.visual_row(c.row) + sub, x
+
+    def cursor_at(self, vrow: int, x: int) -> Cursor:
+        # cursor nearest to x on visual row vrow
+        row, sub = self.locate(vrow)
+        line = self.buf.lines[row]
+        starts = self.breaks(row, line)
+        sub = min(sub, len(starts) - 1)
+        start = starts[sub]
+        col = self.advances.col_at(row, line, self.advances.x(row, line, start) + x)
+        if sub + 1 < len(starts):
+            # stay on this visual row: its last position is just before the next break
+            col = min(col, starts[sub + 1] - 1)
+        return Cursor(row, max(start, col))